@@ -4,12 +4,12 @@ Streamlit app for blind evaluation of taglines.
 """
 
 import os
-import csv
-import pandas as pd
+import sys
 import streamlit as st
-import numpy as np
 from pathlib import Path
-from scipy import stats
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+from db import open_db
 
 # Set page config
 st.set_page_config(
@@ -20,44 +20,32 @@ st.set_page_config(
 
 # Paths
 DATA_DIR = Path(__file__).parent.parent / "data"
-EVALUATION_FILE = DATA_DIR / "evaluation.csv"
-RESULTS_FILE = DATA_DIR / "evaluation_results.csv"
 
 def load_data():
-    """Load evaluation data."""
-    if not EVALUATION_FILE.exists():
-        st.error(f"Evaluation file not found at {EVALUATION_FILE}")
+    """Load evaluation pairs for the current fine-tuned model."""
+    import pandas as pd
+
+    with open_db(data_dir=DATA_DIR) as db:
+        pairs = db.evaluation_pairs()
+    
+    if not pairs:
+        st.error(f"No evaluation pairs found in {db.path}; run evaluate_models.py first")
         st.stop()
     
-    return pd.read_csv(EVALUATION_FILE)
+    return pd.DataFrame(pairs)
 
 def save_results(results):
-    """Save evaluation results to CSV file."""
-    with open(RESULTS_FILE, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            "brief_id", 
-            "brief", 
-            "baseline_tagline", 
-            "finetuned_tagline", 
-            "preferred_tagline", 
-            "preferred_model"
-        ])
-        
-        for brief_id, data in results.items():
-            writer.writerow([
-                brief_id,
-                data["brief"],
-                data["baseline_tagline"],
-                data["finetuned_tagline"],
-                data["preferred_tagline"],
-                data["preferred_model"]
-            ])
+    """Record the preferred model for each brief in the database."""
+    with open_db(data_dir=DATA_DIR) as db:
+        db.save_judgments({brief_id: data["preferred_model"] for brief_id, data in results.items()})
+        results_csv = db.export_csv("results")
     
-    return RESULTS_FILE
+    return db.path, results_csv
 
 def calculate_statistics(results):
     """Calculate statistics for the evaluation results."""
+    from scipy import stats
+
     if not results:
         return {}
     
@@ -72,7 +60,7 @@ def calculate_statistics(results):
     
     # Binomial test
     if total_count > 0:
-        p_value = stats.binom_test(finetuned_count, total_count, p=0.5, alternative='greater')
+        p_value = stats.binomtest(finetuned_count, total_count, p=0.5, alternative='greater').pvalue
     else:
         p_value = 1.0
     
@@ -156,7 +144,7 @@ def main():
     if st.button("Submit Evaluation", type="primary"):
         try:
             # Save results
-            results_file = save_results(st.session_state.results)
+            results_file, results_csv = save_results(st.session_state.results)
             st.success(f"Evaluation results saved to {results_file}")
             
             # Calculate statistics
@@ -181,13 +169,12 @@ def main():
                 st.info("The difference between models is not statistically significant.")
             
             # Show download button
-            with open(results_file, "r") as f:
-                st.download_button(
-                    label="Download Results CSV",
-                    data=f,
-                    file_name="evaluation_results.csv",
-                    mime="text/csv"
-                )
+            st.download_button(
+                label="Download Results CSV",
+                data=results_csv,
+                file_name="evaluation_results.csv",
+                mime="text/csv"
+            )
         except Exception as e:
             st.error(f"Error saving results: {e}")
 
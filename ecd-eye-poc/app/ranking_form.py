@@ -1,15 +1,23 @@
 #!/usr/bin/env python3
 """
 Streamlit app for ECD to rank taglines.
+
+When a local scorer is trained (see scripts/scorer.py), each brief's
+taglines are shown best-predicted first with the predicted ranks preselected.
+Only briefs the ECD re-ranked or ticked as confirmed are saved, so untouched
+predictions never become training data.
 """
 
 import os
-import csv
-import json
-import pandas as pd
+import sys
 import streamlit as st
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+from db import open_db
+from retrieval import update_index
+from scorer import get_scorer
+
 # Set page config
 st.set_page_config(
     page_title="ECD-Eye Tagline Ranking",
@@ -19,38 +27,41 @@ st.set_page_config(
 
 # Paths
 DATA_DIR = Path(__file__).parent.parent / "data"
-BRIEFS_FILE = DATA_DIR / "briefs.json"
-BASELINE_FILE = DATA_DIR / "baseline.csv"
-RANKINGS_FILE = DATA_DIR / "rankings.csv"
 
 def load_data():
-    """Load briefs and baseline taglines."""
-    # Load briefs
-    with open(BRIEFS_FILE, "r") as f:
-        briefs_data = json.load(f)
+    """Load training briefs and their baseline taglines."""
+    with open_db(data_dir=DATA_DIR) as db:
+        training_briefs = []
+        taglines = {}
+        for brief_id, brief, brief_taglines in db.generations("train"):
+            training_briefs.append({"id": brief_id, "brief": brief})
+            taglines[brief_id] = brief_taglines
     
-    # Load baseline taglines
-    baseline_df = pd.read_csv(BASELINE_FILE)
+    return training_briefs, taglines
+
+def predicted_orders(taglines):
+    """Each brief's tagline slots, best predicted first; the raw order without a trained scorer."""
+    scorer = get_scorer(DATA_DIR / "scorer.npz")
+    if scorer is None:
+        return {brief_id: list(range(len(lines))) for brief_id, lines in taglines.items()}
     
-    return briefs_data, baseline_df
+    # Score every brief's taglines in one batch
+    scores = scorer.score([tagline for lines in taglines.values() for tagline in lines])
+    orders = {}
+    start = 0
+    for brief_id, lines in taglines.items():
+        brief_scores = scores[start:start + len(lines)]
+        orders[brief_id] = sorted(range(len(lines)), key=lambda slot: -brief_scores[slot])
+        start += len(lines)
+    return orders
 
 def save_rankings(rankings):
-    """Save rankings to CSV file."""
-    with open(RANKINGS_FILE, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["brief_id", "brief", "rank_1", "rank_2", "rank_3", "rank_4", "rank_5"])
-        for brief_id, data in rankings.items():
-            writer.writerow([
-                brief_id,
-                data["brief"],
-                data["rankings"][0],
-                data["rankings"][1],
-                data["rankings"][2],
-                data["rankings"][3],
-                data["rankings"][4]
-            ])
+    """Save rankings to the database in one transaction."""
+    with open_db(data_dir=DATA_DIR) as db:
+        db.save_rankings({brief_id: data["rankings"] for brief_id, data in rankings.items()})
+        rankings_csv = db.export_csv("rankings")
     
-    return RANKINGS_FILE
+    return db.path, rankings_csv
 
 def main():
     st.title("🏆 ECD-Eye Tagline Ranking")
@@ -59,33 +70,46 @@ def main():
     
     For each brief, rank the taglines from best (1) to worst (5) by dragging them into order.
     
+    Taglines are pre-sorted by the local scorer's prediction, with its ranks preselected:
+    change any you disagree with, or tick "Ranking confirmed" if it is already right.
+    Only briefs you re-ranked or confirmed are saved.
+    
     When you're done, click the 'Save Rankings' button at the bottom of the page.
     """)
     
     # Load data
-    briefs_data, baseline_df = load_data()
-    training_briefs = briefs_data["training_briefs"]
+    training_briefs, baseline_taglines = load_data()
     
-    # Initialize session state for rankings
+    # Initialize session state for rankings, adding briefs ingested since the page was opened
     if "rankings" not in st.session_state:
         st.session_state.rankings = {}
+    new_taglines = {
+        brief_id: taglines for brief_id, taglines in baseline_taglines.items()
+        if brief_id not in st.session_state.rankings
+    }
+    if new_taglines:
+        orders = predicted_orders(new_taglines)
         for brief in training_briefs:
             brief_id = brief["id"]
-            brief_row = baseline_df[baseline_df["brief_id"] == brief_id].iloc[0]
+            if brief_id not in new_taglines:
+                continue
             
             # Get taglines for this brief
-            taglines = [
-                brief_row["tagline_1"],
-                brief_row["tagline_2"],
-                brief_row["tagline_3"],
-                brief_row["tagline_4"],
-                brief_row["tagline_5"]
-            ]
+            taglines = baseline_taglines[brief_id]
+            
+            # Default ranking: the predicted one, so slot order[k] gets rank k + 1
+            order = orders[brief_id]
+            rankings = [0] * len(order)
+            for position, slot in enumerate(order):
+                rankings[slot] = position + 1
             
             st.session_state.rankings[brief_id] = {
                 "brief": brief["brief"],
                 "taglines": taglines,
-                "rankings": list(range(1, 6))  # Default ranking: 1, 2, 3, 4, 5
+                "order": order,
+                "predicted": list(rankings),
+                "rankings": rankings,
+                "judged": False
             }
     
     # Display briefs and taglines for ranking
@@ -96,49 +120,63 @@ def main():
         st.markdown(f"### Brief {brief_id}")
         st.markdown(f"**{brief_text}**")
         
-        # Get taglines for this brief
+        # Get taglines for this brief, best predicted first
         taglines = st.session_state.rankings[brief_id]["taglines"]
+        order = st.session_state.rankings[brief_id]["order"]
         
         # Create columns for taglines
         cols = st.columns(5)
         
-        # Display taglines with rank selection
-        for i, (col, tagline) in enumerate(zip(cols, taglines)):
+        # Display taglines with rank selection; ranks are stored by original slot
+        for position, (col, i) in enumerate(zip(cols, order)):
             with col:
                 st.markdown(f"**Tagline {i+1}**")
-                st.markdown(f"_{tagline}_")
+                st.markdown(f"_{taglines[i]}_")
                 rank = st.selectbox(
                     f"Rank for Tagline {i+1}",
                     options=[1, 2, 3, 4, 5],
                     key=f"rank_{brief_id}_{i}",
-                    index=i  # Default to sequential ranking
+                    index=position  # Default to the predicted ranking
                 )
                 st.session_state.rankings[brief_id]["rankings"][i] = rank
         
+        # Saved only once the ECD has changed the preselected ranks or confirmed them
+        data = st.session_state.rankings[brief_id]
+        confirmed = st.checkbox("Ranking confirmed", key=f"confirmed_{brief_id}")
+        data["judged"] = confirmed or data["rankings"] != data["predicted"]
+        
         st.markdown("---")
     
     # Save rankings button
     if st.button("Save Rankings", type="primary"):
         try:
+            judged = {brief_id: data for brief_id, data in st.session_state.rankings.items() if data["judged"]}
+            if not judged:
+                st.warning("No rankings to save: re-rank a brief or tick 'Ranking confirmed' first.")
+                return
+            
             # Validate rankings
-            for brief_id, data in st.session_state.rankings.items():
+            for brief_id, data in judged.items():
                 rankings = data["rankings"]
                 if sorted(rankings) != [1, 2, 3, 4, 5]:
                     st.error(f"Invalid ranking for Brief {brief_id}. Each tagline must have a unique rank from 1 to 5.")
                     return
             
             # Save rankings
-            rankings_file = save_rankings(st.session_state.rankings)
-            st.success(f"Rankings saved to {rankings_file}")
+            rankings_file, rankings_csv = save_rankings(judged)
+            st.success(f"Rankings for {len(judged)} briefs saved to {rankings_file}")
+            
+            # Index the new rankings for few-shot retrieval
+            n_indexed = update_index(DATA_DIR)
+            st.info(f"Added {n_indexed} briefs to the retrieval index")
             
             # Show download button
-            with open(rankings_file, "r") as f:
-                st.download_button(
-                    label="Download Rankings CSV",
-                    data=f,
-                    file_name="rankings.csv",
-                    mime="text/csv"
-                )
+            st.download_button(
+                label="Download Rankings CSV",
+                data=rankings_csv,
+                file_name="rankings.csv",
+                mime="text/csv"
+            )
         except Exception as e:
             st.error(f"Error saving rankings: {e}")
 
@@ -24,13 +24,28 @@ pkill -f "streamlit run app/ranking_form.py"
 echo "Step 3: Preparing fine-tuning data..."
 python scripts/prepare_finetune.py
 
-# Step 4: Submit fine-tuning job
+# Step 4: Submit fine-tuning job, generating the baseline side of the
+# evaluation while it trains
 echo "Step 4: Submitting fine-tuning job..."
-python scripts/submit_finetune.py
+python scripts/submit_finetune.py &
+FINETUNE_PID=$!
+echo "Evaluating the baseline model while fine-tuning runs..."
+python scripts/evaluate_models.py --baseline-only
+BASELINE_STATUS=$?
+wait $FINETUNE_PID
+FINETUNE_STATUS=$?
+if [ $FINETUNE_STATUS -ne 0 ]; then
+    echo "Error: fine-tuning failed (exit status $FINETUNE_STATUS); the staged baseline is kept for the next run."
+    exit $FINETUNE_STATUS
+fi
+if [ $BASELINE_STATUS -ne 0 ]; then
+    echo "Error: baseline evaluation failed (exit status $BASELINE_STATUS)."
+    exit $BASELINE_STATUS
+fi
 
-# Step 5: Evaluate models
+# Step 5: Evaluate models; only the fine-tuned side is left to generate
 echo "Step 5: Evaluating models..."
-python scripts/evaluate_models.py
+python scripts/evaluate_models.py || exit $?
 
 # Step 6: Blind evaluation
 echo "Step 6: Conducting blind evaluation..."
@@ -0,0 +1,295 @@
+"""
+Generation backends.
+
+Scripts ask a backend for chat completions instead of calling the OpenAI
+client directly, so dry runs, tests and large exploratory sweeps can run
+offline. ``GENERATION_BACKEND`` (in .env, or ``--backend`` on the scripts)
+picks one:
+
+    openai   the hosted API (default)
+    ngram    deterministic word n-gram stub; no network, key or extra packages
+    local    a small causal LM run in-process on CPU (``LOCAL_MODEL``;
+             needs ``transformers`` and ``torch``)
+
+Every backend takes ``chat.completions.create`` keyword arguments and
+returns OpenAI-shaped responses (``choices[i].message.content``, ``usage``),
+so callers don't care which one answered. ``create_many`` completes a list of
+requests: the hosted API one call at a time, the in-process backends in
+batches of ``LOCAL_BATCH_SIZE`` prompts per forward pass, spread over
+``LOCAL_WORKERS`` threads. The in-process backends ignore the requested model
+name: every model is answered by the same local one.
+"""
+
+import itertools
+import math
+import random
+import re
+import threading
+from collections import namedtuple
+
+import config
+
+DEFAULT_LOCAL_MODEL = "HuggingFaceTB/SmolLM2-135M-Instruct"
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_WORKERS = 2
+
+MAX_WORDS = 7
+
+# "[n] text": brief n of a batch prompt (see prompts.py), or one of its taglines in the answer
+BATCH_LINE = re.compile(r"^\s*\[(\d+)\]\s*(.*)$", re.MULTILINE)
+
+Usage = namedtuple("Usage", "prompt_tokens completion_tokens total_tokens")
+Message = namedtuple("Message", "role content")
+Choice = namedtuple("Choice", "index message finish_reason")
+Response = namedtuple("Response", "model choices usage")
+
+
+def approx_tokens(text):
+    """Rough token count (about four characters per token)."""
+    return max(1, math.ceil(len(text) / 4))
+
+
+def answer_prompt(prompt, tagline):
+    """Answer one of the pipeline's tagline prompts in the shape it asks for.
+
+    ``tagline()`` returns one tagline. Batch prompts get five ``[n]`` lines
+    per numbered brief, single-brief prompts five bullets and anything else
+    (the evaluation prompt) a single tagline. Used by the n-gram stub and the
+    mock API server.
+    """
+    numbers = [number for number, _ in BATCH_LINE.findall(prompt)]
+    if numbers:
+        return "\n".join(f"[{number}] {tagline()}" for number in numbers for _ in range(5))
+    if "Write five" in prompt:
+        return "\n".join(f"• {tagline()}" for _ in range(5))
+    return tagline()
+
+
+def user_prompt(request):
+    return next(message["content"] for message in reversed(request["messages"]) if message["role"] == "user")
+
+
+class OpenAIBackend:
+    """The hosted API. Retries are left to the caller (see resilience.py)."""
+
+    name = "openai"
+    remote = True
+    batched = False
+    prefetch = 1
+
+    def __init__(self):
+        # Import openai and build its client up front, outside the first request's network span
+        config.openai_api(max_retries=0).chat.completions
+
+    def create(self, **request):
+        return config.openai_api(max_retries=0).chat.completions.create(**request)
+
+    def create_many(self, requests):
+        return [self.create(**request) for request in requests]
+
+
+class InProcessBackend:
+    """Base for backends running in this process.
+
+    Subclasses implement ``complete_batch(prompts)``, returning
+    ``(text, prompt_tokens, completion_tokens)`` for each ``(request,
+    sample)`` prompt; requests asking for ``n`` samples become ``n`` prompts.
+    """
+
+    remote = False
+    batched = True
+
+    def __init__(self, batch_size=None, workers=None):
+        self.batch_size = batch_size or int(config.get("LOCAL_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+        self.workers = workers or int(config.get("LOCAL_WORKERS", DEFAULT_WORKERS))
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def prefetch(self):
+        """Requests worth collecting before calling ``create_many``."""
+        return self.batch_size * self.workers
+
+    def _executor(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+            return self._pool
+
+    def create(self, **request):
+        return self.create_many([request])[0]
+
+    def create_many(self, requests):
+        prompts = [
+            (index, sample, request)
+            for index, request in enumerate(requests)
+            for sample in range(request.get("n") or 1)
+        ]
+        # A batch shares one temperature
+        prompts.sort(key=lambda prompt: prompt[2].get("temperature", 1.0))
+        batches = []
+        for _, group in itertools.groupby(prompts, key=lambda prompt: prompt[2].get("temperature", 1.0)):
+            group = list(group)
+            batches += [group[start:start + self.batch_size] for start in range(0, len(group), self.batch_size)]
+        if len(batches) > 1 and self.workers > 1:
+            outputs = list(self._executor().map(self.complete_batch, batches))
+        else:
+            outputs = [self.complete_batch(batch) for batch in batches]
+
+        texts = [[] for _ in requests]
+        usage = [[0, 0] for _ in requests]
+        for batch, results in zip(batches, outputs):
+            for (index, sample, _), (text, prompt_tokens, completion_tokens) in zip(batch, results):
+                texts[index].append((sample, text))
+                # Like the API, the prompt is counted once however many samples
+                usage[index][0] = prompt_tokens
+                usage[index][1] += completion_tokens
+        return [
+            Response(
+                request.get("model"),
+                [Choice(k, Message("assistant", text), "stop") for k, (_, text) in enumerate(sorted(samples))],
+                Usage(prompt_tokens, completion_tokens, prompt_tokens + completion_tokens),
+            )
+            for request, samples, (prompt_tokens, completion_tokens) in zip(requests, texts, usage)
+        ]
+
+
+class NgramBackend(InProcessBackend):
+    """Deterministic word n-gram stub.
+
+    Trained on ``NGRAM_CORPUS`` (a text file, one tagline per line) or a fixed
+    synthetic corpus (see synthetic_data.py). Each sample is seeded by the
+    model, prompt and sample number, so runs repeat exactly; temperature 0
+    takes the most frequent next word.
+    """
+
+    name = "ngram"
+    START, END = "<s>", "</s>"
+
+    def __init__(self, corpus=None, order=3, seed=0, **kwargs):
+        super().__init__(**kwargs)
+        self.order = order
+        self.seed = seed
+        corpus = corpus or config.get("NGRAM_CORPUS")
+        if corpus:
+            with open(corpus) as f:
+                lines = [line.strip() for line in f if line.strip()]
+        else:
+            from synthetic_data import make_tagline
+
+            lines = [make_tagline(random.Random(f"ngram:{i}"))[0] for i in range(2000)]
+        self.transitions = {}
+        for line in lines:
+            words = [self.START] * (order - 1) + line.split() + [self.END]
+            for end in range(order - 1, len(words)):
+                self.transitions.setdefault(tuple(words[end - order + 1:end]), []).append(words[end])
+
+    def tagline(self, rng, temperature):
+        context = (self.START,) * (self.order - 1)
+        words = []
+        while len(words) < MAX_WORDS:
+            options = self.transitions[context]
+            word = rng.choice(options) if temperature > 0 else max(options, key=options.count)
+            if word == self.END:
+                break
+            words.append(word)
+            context = context[1:] + (word,)
+        return " ".join(words)
+
+    def complete_batch(self, prompts):
+        results = []
+        for _, sample, request in prompts:
+            prompt = user_prompt(request)
+            rng = random.Random(f"{self.seed}:{request.get('model')}:{sample}:{prompt}")
+            temperature = request.get("temperature", 1.0)
+            text = answer_prompt(prompt, lambda: self.tagline(rng, temperature))
+            results.append((text, sum(approx_tokens(m["content"]) for m in request["messages"]), approx_tokens(text)))
+        return results
+
+
+class LocalLMBackend(InProcessBackend):
+    """A small causal LM from Hugging Face, run on CPU with transformers.
+
+    Each batch is one left-padded ``generate`` call. Sampling is not seeded,
+    so unlike the n-gram stub, runs differ.
+    """
+
+    name = "local"
+
+    def __init__(self, model_name=None, max_new_tokens=64, **kwargs):
+        super().__init__(**kwargs)
+        try:
+            import torch
+            from transformers import AutoModelForCausalLM, AutoTokenizer
+        except ImportError as e:
+            raise RuntimeError("the local backend needs transformers and torch: pip install transformers torch") from e
+
+        import os
+
+        self.model_name = model_name or config.get("LOCAL_MODEL", DEFAULT_LOCAL_MODEL)
+        self.max_new_tokens = max_new_tokens
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name, padding_side="left")
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.model = AutoModelForCausalLM.from_pretrained(self.model_name)
+        self.model.eval()
+        # Workers share the cores instead of each using all of them
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // self.workers))
+
+    def prompt_text(self, messages):
+        if getattr(self.tokenizer, "chat_template", None):
+            return self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        return "\n\n".join(message["content"] for message in messages) + "\n\n"
+
+    def complete_batch(self, prompts):
+        import torch
+
+        requests = [request for _, _, request in prompts]
+        temperature = requests[0].get("temperature", 1.0)
+        max_new_tokens = max(request.get("max_tokens") or self.max_new_tokens for request in requests)
+        inputs = self.tokenizer(
+            [self.prompt_text(request["messages"]) for request in requests],
+            return_tensors="pt", padding=True, add_special_tokens=False,
+        )
+        sampling = {"do_sample": True, "temperature": temperature} if temperature > 0 else {"do_sample": False}
+        with torch.no_grad():
+            output = self.model.generate(
+                **inputs, max_new_tokens=max_new_tokens, pad_token_id=self.tokenizer.pad_token_id, **sampling
+            )
+        completions = output[:, inputs["input_ids"].shape[1]:]
+        prompt_lengths = inputs["attention_mask"].sum(dim=1).tolist()
+        return [
+            (
+                self.tokenizer.decode(tokens, skip_special_tokens=True).strip(),
+                prompt_tokens,
+                int((tokens != self.tokenizer.pad_token_id).sum()),
+            )
+            for tokens, prompt_tokens in zip(completions, prompt_lengths)
+        ]
+
+
+BACKENDS = {
+    "openai": OpenAIBackend,
+    "ngram": NgramBackend,
+    "local": LocalLMBackend,
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name=None):
+    """Return the shared backend called ``name`` (default ``GENERATION_BACKEND``).
+
+    Raises ValueError for an unknown name and RuntimeError when a backend's
+    packages are missing.
+    """
+    name = name or config.generation_backend()
+    if name not in BACKENDS:
+        raise ValueError(f"unknown generation backend {name!r}; expected one of {', '.join(BACKENDS)}")
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = BACKENDS[name]()
+        return _backends[name]
@@ -0,0 +1,182 @@
+"""
+Request coalescing and micro-batching for tagline generation.
+
+A ``Generator`` sits between many concurrent callers and the chat API:
+
+- Identical in-flight requests (same brief and model) are coalesced: later
+  callers await the first caller's upstream call and get the same taglines.
+- Distinct briefs for a model that arrive within ``window`` seconds go out as
+  one multi-brief prompt of up to ``max_batch`` briefs. Briefs the answer
+  skips or cuts short are asked for on their own, and a single-brief answer
+  that comes back short is asked for once more. If it is still short, the
+  caller gets fewer taglines rather than blank ones.
+- Each model has its own queue, bounded at ``queue_size`` briefs; a full
+  queue raises ``Overloaded`` instead of growing. At most ``concurrency``
+  upstream calls run at once, shared by all models. Batches that wait for a
+  free call absorb whatever queued meanwhile, so batches grow as load rises.
+
+Requests go to the async OpenAI ``client`` or, for the offline backends, to
+a ``backend`` from backends.py run in a worker thread. Used by
+tagline_service.py.
+"""
+
+import asyncio
+
+from backends import BATCH_LINE
+from generate_baseline import parse_lines
+from prompts import messages, record_usage
+from resilience import call_with_retry_async
+
+N_TAGLINES = 5
+
+
+class Overloaded(Exception):
+    """Raised when a model's queue is full."""
+
+
+def parse_batch(content, n_briefs):
+    """Return a list of tagline lists, one per brief, from a batched answer."""
+    taglines = [[] for _ in range(n_briefs)]
+    for line in content.split("\n"):
+        match = BATCH_LINE.match(line)
+        if match and 1 <= int(match.group(1)) <= n_briefs:
+            taglines[int(match.group(1)) - 1] += parse_lines(match.group(2))
+    return taglines
+
+
+class Generator:
+    """Coalesce, micro-batch and rate-limit tagline requests."""
+
+    def __init__(self, window=0.02, max_batch=8, queue_size=256, concurrency=4, client=None, backend=None,
+                 breaker=None):
+        self.window = window
+        self.max_batch = max_batch
+        self.queue_size = queue_size
+        self.client = client
+        self.backend = backend
+        self.breaker = breaker
+        self.stats = {
+            "requests": 0,
+            "coalesced": 0,
+            "rejected": 0,
+            "batches": 0,
+            "batched_briefs": 0,
+            "upstream_calls": 0,
+            "fallbacks": 0,
+            "errors": 0,
+        }
+        self._slots = asyncio.Semaphore(concurrency)
+        self._queues = {}
+        self._inflight = {}
+        self._tasks = set()
+
+    def _spawn(self, coroutine):
+        # Keep a reference so running tasks are not garbage-collected
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _queue(self, model):
+        queue = self._queues.get(model)
+        if queue is None:
+            queue = self._queues[model] = asyncio.Queue(self.queue_size)
+            self._spawn(self._batcher(model, queue))
+        return queue
+
+    async def generate(self, brief, model):
+        """Return ``(taglines, batch_size, coalesced)`` for a brief."""
+        self.stats["requests"] += 1
+        key = (model, brief)
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            taglines, batch_size = await asyncio.shield(future)
+            return taglines, batch_size, True
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue(model).put_nowait((brief, future))
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            raise Overloaded(f"queue for {model} is full")
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded so a disconnecting caller does not cancel it for coalesced ones
+        taglines, batch_size = await asyncio.shield(future)
+        return taglines, batch_size, False
+
+    async def _batcher(self, model, queue):
+        while True:
+            batch = [await queue.get()]
+            if self.window and queue.qsize() < self.max_batch - 1:
+                await asyncio.sleep(self.window)
+            await self._slots.acquire()
+            # Whatever queued while waiting for the window or a free slot joins the batch
+            while len(batch) < self.max_batch and not queue.empty():
+                batch.append(queue.get_nowait())
+            self._spawn(self._dispatch(model, batch))
+
+    async def _dispatch(self, model, batch):
+        self.stats["batches"] += 1
+        self.stats["batched_briefs"] += len(batch)
+        try:
+            briefs = [brief for brief, _ in batch]
+            if len(batch) == 1:
+                results = [await self._complete(model, briefs[0])]
+            else:
+                results = await self._complete_batch(model, briefs)
+        except Exception as e:
+            results = [e] * len(batch)
+        finally:
+            self._slots.release()
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                self.stats["errors"] += 1
+                future.set_exception(result)
+            else:
+                future.set_result((result, len(batch)))
+
+    async def _request(self, model, task, brief):
+        """Send the ``task`` prompt (see prompts.py) for ``brief``; return the answer text."""
+        self.stats["upstream_calls"] += 1
+        request = {"model": model, "messages": messages(task, brief), "temperature": 0.9}
+        if self.backend is not None:
+            response = await asyncio.to_thread(self.backend.create, **request)
+        else:
+            response = await call_with_retry_async(
+                lambda: self.client.chat.completions.create(**request), self.breaker
+            )
+        record_usage(task, response.usage)
+        return response.choices[0].message.content
+
+    async def _complete(self, model, brief):
+        lines = list(dict.fromkeys(parse_lines(await self._request(model, "taglines", brief))))
+        if len(lines) < N_TAGLINES:
+            # Asked once more, like briefs a batched answer skips, instead of padding with blanks
+            self.stats["fallbacks"] += 1
+            lines = list(dict.fromkeys(lines + parse_lines(await self._request(model, "taglines", brief))))
+        return lines[:N_TAGLINES]
+
+    async def _complete_batch(self, model, briefs):
+        taglines = parse_batch(await self._request(model, "batch", briefs), len(briefs))
+        # Briefs the batched answer skipped or cut short are asked for on their own
+        missing = [index for index, lines in enumerate(taglines) if len(lines) < N_TAGLINES]
+        self.stats["fallbacks"] += len(missing)
+        retried = await asyncio.gather(
+            *(self._complete(model, briefs[index]) for index in missing), return_exceptions=True
+        )
+        for index, result in zip(missing, retried):
+            taglines[index] = result
+        return [lines if isinstance(lines, Exception) else lines[:N_TAGLINES] for lines in taglines]
+
+    def health(self):
+        return {
+            "status": "ok",
+            "queued": {model: queue.qsize() for model, queue in self._queues.items()},
+            "in_flight": len(self._inflight),
+            **self.stats,
+        }
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Benchmark history and regression detection.
+
+benchmark.py and load_test.py append every run to
+``data/benchmarks/history.jsonl``: one line per run with the suite
+(``pipeline``, ``loadtest-rank``, ...), git commit, settings and, for each
+benchmark and size, its tracked metrics (throughput, p95 latency, peak RSS,
+tokens per brief, ...). Older result files can be added with ``record``.
+
+``compare`` checks the latest run of each suite against a rolling baseline:
+the previous ``--window`` runs with the same settings, benchmark and size. A
+metric regresses when the new value falls outside the one-sided
+``1 - --alpha`` prediction interval of the baseline (Student's t) and is at
+least ``--min-change`` worse than the baseline mean. A benchmark that failed
+in the latest run, or that the baseline runs had but the latest run lacks,
+also counts as a regression. Regressions exit non-zero, so the check can gate
+CI.
+"""
+
+import argparse
+import json
+import math
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+HISTORY_FILE = DATA_DIR / "benchmarks" / "history.jsonl"
+
+# Tracked metric -> True if higher is better
+METRICS = {
+    "throughput": True,
+    "latency_p95_s": False,
+    "peak_rss_mb": False,
+    "tokens_per_item": False,
+    "wall_s": False,
+    "reruns_per_s": True,
+    "rerun_p95_s": False,
+    "cpu_ms_per_rerun": False,
+    "rss_mb_per_session": False,
+}
+
+MIN_SAMPLES = 3
+
+
+def git_commit(path=Path(__file__).parent):
+    """Return ``(commit, dirty)`` for the checkout, or ``(None, None)`` outside git."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=path, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=path,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+
+def config_id(settings):
+    """Short stable hash of a run's settings; only like runs are compared."""
+    import hashlib
+
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:10]
+
+
+def record(suite, settings, results, timestamp=None, path=HISTORY_FILE):
+    """Append a run to the history; ``results`` are dicts with name, size, ok and metrics."""
+    timestamp = timestamp or datetime.now(timezone.utc).isoformat(timespec="seconds")
+    commit, dirty = git_commit()
+    run = {
+        "run_id": f"{suite}-{timestamp}",
+        "timestamp": timestamp,
+        "suite": suite,
+        "commit": commit,
+        "dirty": dirty,
+        "config_id": config_id(settings),
+        "settings": settings,
+        "results": [
+            {
+                "name": result["name"],
+                "size": result["size"],
+                "ok": result.get("ok", True),
+                "metrics": {
+                    metric: result[metric] for metric in METRICS if result.get(metric) is not None
+                },
+            }
+            for result in results
+        ],
+    }
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps(run) + "\n")
+    return run
+
+
+def load(path=HISTORY_FILE):
+    """Return every recorded run, oldest first."""
+    if not Path(path).exists():
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def import_result_file(result_file, path=HISTORY_FILE):
+    """Record a benchmark.py or load_test.py JSON result file."""
+    with open(result_file) as f:
+        data = json.load(f)
+    if "levels" in data:
+        suite = f"loadtest-{data['app']}"
+        results = [dict(level, name="judges", size=level["judges"]) for level in data["levels"]]
+    else:
+        suite = "pipeline"
+        results = [dict(row, name=row["stage"]) for row in data["results"]]
+    return record(suite, data["settings"], results, data["timestamp"], path)
+
+
+def check_metric(value, baseline, higher_is_better, alpha, min_change):
+    """Return ``(regressed, change, p_value)`` for a value against baseline samples."""
+    from scipy import stats
+
+    n = len(baseline)
+    mean = sum(baseline) / n
+    change = (value - mean) / mean if mean else 0.0
+    worse_by = -change if higher_is_better else change
+    sd = math.sqrt(sum((x - mean) ** 2 for x in baseline) / (n - 1))
+    if sd == 0:
+        p_value = 0.0 if worse_by > 0 else 1.0
+    else:
+        # One-sided test of the new value against the baseline's prediction interval
+        t = (value - mean) / (sd * math.sqrt(1 + 1 / n))
+        p_value = float(stats.t.sf(-t if higher_is_better else t, n - 1))
+    return p_value < alpha and worse_by >= min_change, change, p_value
+
+
+def compare(runs, run=None, window=10, alpha=0.01, min_change=0.05):
+    """Compare ``run`` (default: the latest) against earlier runs like it.
+
+    Returns a list of rows: name, size, metric, value, baseline mean, n,
+    change, p-value and whether it regressed. Failed benchmarks and ones
+    missing from ``run`` get a single regressed row with ``problem`` set.
+    """
+    run = run or runs[-1]
+    earlier = [
+        other for other in runs[:runs.index(run)]
+        if other["suite"] == run["suite"] and other["config_id"] == run["config_id"]
+    ]
+    rows = []
+
+    def problem_row(name, size, problem):
+        return {"name": name, "size": size, "metric": None, "value": None, "n": 0, "mean": None,
+                "change": None, "p_value": None, "regressed": True, "problem": problem}
+
+    present = {(result["name"], result["size"]) for result in run["results"]}
+    expected = {
+        (result["name"], result["size"]): None for other in earlier[-window:] for result in other["results"]
+    }
+    for name, size in expected:
+        if (name, size) not in present:
+            rows.append(problem_row(name, size, "missing from this run"))
+
+    for result in run["results"]:
+        if not result["ok"]:
+            rows.append(problem_row(result["name"], result["size"], "failed"))
+            continue
+        for metric, value in result["metrics"].items():
+            baseline = [
+                other_result["metrics"][metric]
+                for other in earlier
+                for other_result in other["results"]
+                if other_result["ok"] and other_result["name"] == result["name"]
+                and other_result["size"] == result["size"] and metric in other_result["metrics"]
+            ][-window:]
+            row = {"name": result["name"], "size": result["size"], "metric": metric, "value": value,
+                   "n": len(baseline), "mean": None, "change": None, "p_value": None, "regressed": False,
+                   "problem": None}
+            if len(baseline) >= MIN_SAMPLES:
+                row["mean"] = sum(baseline) / len(baseline)
+                row["regressed"], row["change"], row["p_value"] = check_metric(
+                    value, baseline, METRICS[metric], alpha, min_change
+                )
+            rows.append(row)
+    return rows
+
+
+def print_comparison(run, rows):
+    commit = (run["commit"] or "unknown")[:10] + ("+dirty" if run["dirty"] else "")
+    print(f"{run['suite']} run {run['timestamp']} (commit {commit})")
+    print(f"  {'benchmark':<10} {'size':>6} {'metric':<18} {'value':>10} {'baseline':>10} {'n':>3} "
+          f"{'change':>8} {'p':>7}")
+    for row in rows:
+        if row["problem"]:
+            print(f"  {row['name']:<10} {row['size']:>6} {row['problem'].upper()}  REGRESSION")
+            continue
+        if row["mean"] is None:
+            print(f"  {row['name']:<10} {row['size']:>6} {row['metric']:<18} {row['value']:>10.4g} "
+                  f"{'-':>10} {row['n']:>3}  (too few earlier runs)")
+            continue
+        print(f"  {row['name']:<10} {row['size']:>6} {row['metric']:<18} {row['value']:>10.4g} "
+              f"{row['mean']:>10.4g} {row['n']:>3} {row['change']:>+8.1%} {row['p_value']:>7.3f}"
+              f"{'  REGRESSION' if row['regressed'] else ''}")
+
+
+def check(suites=None, window=10, alpha=0.01, min_change=0.05, path=HISTORY_FILE):
+    """Compare the latest run of each suite; return 1 if anything regressed."""
+    runs = load(path)
+    if not runs:
+        print(f"No benchmark history in {path}")
+        return 0
+    latest = {}
+    for run in runs:
+        latest[run["suite"]] = run
+    regressions = 0
+    for suite, run in latest.items():
+        if suites and suite not in suites:
+            continue
+        rows = compare(runs, run, window, alpha, min_change)
+        print_comparison(run, rows)
+        regressions += sum(row["regressed"] for row in rows)
+    if regressions:
+        print(f"\n{regressions} significant regressions")
+        return 1
+    print("\nNo significant regressions")
+    return 0
+
+
+def add_compare_arguments(parser):
+    """Add the rolling-baseline options shared with benchmark.py and load_test.py."""
+    parser.add_argument("--window", type=int, default=10, help="earlier runs in the rolling baseline (default: 10)")
+    parser.add_argument("--alpha", type=float, default=0.01, help="significance level (default: 0.01)")
+    parser.add_argument("--min-change", type=float, default=0.05,
+                        help="smallest relative slowdown to flag, e.g. 0.05 for 5%% (default: 0.05)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", default=str(HISTORY_FILE), help="history file (default: data/benchmarks/history.jsonl)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="add benchmark or load test result files to the history")
+    record_parser.add_argument("files", nargs="+", help="benchmark-*.json or loadtest-*.json files")
+
+    compare_parser = subparsers.add_parser("compare", help="flag regressions in the latest run of each suite")
+    compare_parser.add_argument("--suite", action="append", help="only this suite; may be repeated")
+    add_compare_arguments(compare_parser)
+
+    show_parser = subparsers.add_parser("show", help="list recorded runs")
+    show_parser.add_argument("--suite", help="only this suite")
+    show_parser.add_argument("--limit", type=int, default=20, help="most recent runs to list (default: 20)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        for result_file in args.files:
+            run = import_result_file(result_file, args.history)
+            print(f"Recorded {result_file} as {run['run_id']}")
+    elif args.command == "compare":
+        return check(args.suite, args.window, args.alpha, args.min_change, args.history)
+    elif args.command == "show":
+        runs = [run for run in load(args.history) if not args.suite or run["suite"] == args.suite]
+        for run in runs[-args.limit:]:
+            commit = (run["commit"] or "unknown")[:10] + ("+dirty" if run["dirty"] else "")
+            failed = sum(not result["ok"] for result in run["results"])
+            print(f"{run['timestamp']}  {run['suite']:<16} {commit:<16} config {run['config_id']}  "
+                  f"{len(run['results'])} results{f', {failed} failed' if failed else ''}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
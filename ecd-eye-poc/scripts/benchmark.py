@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+End-to-end pipeline benchmarks against the local mock API.
+
+Each stage runs the real script (``generate_baseline.py``,
+``prepare_finetune.py``, ``submit_finetune.py``, ``evaluate_models.py``) as a
+subprocess with ``--profile``, at each of the fixed dataset sizes. Every run
+gets a fresh copy of the scripts and of a synthetic dataset (see
+synthetic_data.py) in a scratch directory, so ``data/`` is never touched, and
+talks to an in-process mock_openai.py server, so no API key or spend is
+needed.
+
+Reported per stage and size: wall time, throughput, upstream requests,
+request latency percentiles (from the ``network`` trace spans), time spent
+sleeping between requests, the script's peak RSS, API tokens per item, the
+share of prompt tokens served from the mock's prompt cache and the 429/5xx
+responses the mock injected. Results are written as JSON to
+``data/benchmarks/`` and appended to the benchmark history; ``--compare``
+then checks them for regressions (see bench_history.py).
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import bench_history
+import config
+import mock_openai
+import prompts
+import synthetic_data
+from synthetic_data import parse_size
+
+SCRIPTS_DIR = Path(__file__).parent
+DATA_DIR = SCRIPTS_DIR.parent / "data"
+DEFAULT_OUTPUT_DIR = DATA_DIR / "benchmarks"
+
+# Stage -> (script, what its throughput counts, scripts run untimed first)
+STAGES = {
+    "generate": ("generate_baseline", "briefs", []),
+    "prepare": ("prepare_finetune", "examples", []),
+    "finetune": ("submit_finetune", "examples", ["prepare_finetune"]),
+    "evaluate": ("evaluate_models", "briefs", []),
+}
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else None
+
+
+def trace_spans(profile_dir):
+    """Return ``{span name: [durations in seconds]}`` from a run's trace file."""
+    spans = {}
+    for trace_file in Path(profile_dir).glob("*.trace.json"):
+        with open(trace_file) as f:
+            for event in json.load(f)["traceEvents"]:
+                if event.get("ph") == "X":
+                    spans.setdefault(event["name"], []).append(event["dur"] / 1e6)
+    return spans
+
+
+def make_dataset(path, size, seed):
+    """Write and load a synthetic dataset of ``size`` training and eval briefs."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        synthetic_data.run(path, briefs=size, eval_briefs=size, raters=1, seed=seed, load=True)
+
+
+def run_stage(stage, size, dataset_dir, work_dir, env):
+    """Run one stage on a fresh copy of the dataset; return its result row."""
+    script, unit, setup = STAGES[stage]
+    root = work_dir / f"{stage}-{size}"
+    shutil.copytree(SCRIPTS_DIR, root / "scripts", ignore=shutil.ignore_patterns("__pycache__"))
+    shutil.copytree(dataset_dir, root / "data")
+    profile_dir = root / "profiles"
+    log_file = root / "output.log"
+
+    for name in setup:
+        subprocess.run([sys.executable, str(root / "scripts" / f"{name}.py")], cwd=root, env=env,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT, check=True)
+
+    command = [sys.executable, str(root / "scripts" / f"{script}.py"), "--profile", str(profile_dir)]
+    start = time.perf_counter()
+    with open(log_file, "w") as log:
+        process = subprocess.Popen(command, cwd=root, env=env, stdout=log, stderr=subprocess.STDOUT)
+        # wait4 reports the peak RSS of this child alone (in KiB on Linux)
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = returncode = os.waitstatus_to_exitcode(status)
+    wall = time.perf_counter() - start
+
+    # Scripts report most failures by printing "Error: ..." and exiting normally
+    with open(log_file) as f:
+        failed = returncode != 0 or any(line.startswith("Error:") for line in f)
+
+    spans = trace_spans(profile_dir)
+    latencies = sorted(spans.get("network", []))
+    return {
+        "stage": stage,
+        "size": size,
+        "unit": unit,
+        "ok": not failed,
+        "wall_s": round(wall, 3),
+        "throughput": round(size / wall, 2),
+        "requests": len(latencies),
+        "latency_p50_s": percentile(latencies, 0.5),
+        "latency_p95_s": percentile(latencies, 0.95),
+        "latency_p99_s": percentile(latencies, 0.99),
+        "sleep_s": round(sum(spans.get("sleep", [])), 3),
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),
+        "log": str(log_file),
+    }
+
+
+def format_ms(seconds):
+    return f"{seconds * 1000:.1f}" if seconds is not None else "-"
+
+
+def print_table(results):
+    print(f"{'stage':<10} {'size':>7} {'wall s':>8} {'items/s':>9} {'requests':>9} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'sleep s':>8} {'rss MB':>7} {'tok/item':>8} "
+          f"{'cached':>7} {'errors':>7}  status")
+    for row in results:
+        print(f"{row['stage']:<10} {row['size']:>7} {row['wall_s']:>8.2f} {row['throughput']:>9.1f} "
+              f"{row['requests']:>9} {format_ms(row['latency_p50_s']):>8} {format_ms(row['latency_p95_s']):>8} "
+              f"{format_ms(row['latency_p99_s']):>8} {row['sleep_s']:>8.2f} {row['peak_rss_mb']:>7.1f} "
+              f"{row['tokens_per_item']:>8.1f} {row['cached_share']:>7.1%} {row['mock_errors']:>7}  "
+              f"{'ok' if row['ok'] else 'FAILED (see ' + row['log'] + ')'}")
+
+
+def mock_totals(server):
+    """Return ``(injected errors, tokens, prompt tokens, cached prompt tokens)`` served by the mock so far."""
+    counts = dict(server.state.counts)
+    return (
+        counts.get("injected", 0) + counts.get("rate_limited", 0),
+        counts.get("prompt_tokens", 0) + counts.get("completion_tokens", 0),
+        counts.get("prompt_tokens", 0),
+        counts.get("cached_tokens", 0),
+    )
+
+
+def run(sizes, stages, mock, request_interval=0.0, output_dir=DEFAULT_OUTPUT_DIR, keep=False, compare=None):
+    server = mock_openai.start(**mock)
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY="mock",
+        OPENAI_BASE_URL=mock_openai.base_url(server),
+        REQUEST_INTERVAL=str(request_interval),
+    )
+    work_dir = Path(tempfile.mkdtemp(prefix="ecd-eye-bench-"))
+    print(f"Mock API on {env['OPENAI_BASE_URL']}; working in {work_dir}")
+
+    results = []
+    try:
+        for size in sizes:
+            dataset_dir = work_dir / f"dataset-{size}"
+            start = time.perf_counter()
+            make_dataset(dataset_dir, size, mock.get("seed", 0))
+            print(f"Built a dataset of {size} briefs in {time.perf_counter() - start:.1f}s")
+            for stage in stages:
+                before = mock_totals(server)
+                row = run_stage(stage, size, dataset_dir, work_dir, env)
+                errors, tokens, prompt_tokens, cached = (
+                    after - earlier for after, earlier in zip(mock_totals(server), before)
+                )
+                row["mock_errors"] = errors
+                row["tokens_per_item"] = round(tokens / size, 1)
+                row["cached_share"] = round(cached / prompt_tokens, 3) if prompt_tokens else 0.0
+                results.append(row)
+                print(f"  {stage:<10} {row['wall_s']:>8.2f}s  {'ok' if row['ok'] else 'FAILED'}")
+    finally:
+        server.shutdown()
+        if not keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print()
+    print_table(results)
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    now = datetime.now(timezone.utc)
+    output_file = output_dir / f"benchmark-{now.strftime('%Y%m%d-%H%M%S')}.json"
+    timestamp = now.isoformat(timespec="seconds")
+    settings = {"request_interval": request_interval, **mock}
+    if config.prompt_version() != prompts.DEFAULT_VERSION:
+        # Runs with other prompts have their own baseline in the history
+        settings["prompt_version"] = config.prompt_version()
+    with open(output_file, "w") as f:
+        json.dump({"timestamp": timestamp, "settings": settings, "results": results}, f, indent=2)
+    print(f"\nResults saved to {output_file}")
+    history_file = output_dir / bench_history.HISTORY_FILE.name
+    bench_history.record("pipeline", settings, [dict(row, name=row["stage"]) for row in results], timestamp,
+                         history_file)
+    print(f"Recorded in {history_file}")
+    if keep:
+        print(f"Run directories kept in {work_dir}")
+
+    status = 0 if all(row["ok"] for row in results) else 1
+    if compare:
+        print()
+        status = max(status, bench_history.check(["pipeline"], path=history_file, **compare))
+    return status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="50,200",
+                        help="comma-separated dataset sizes in briefs, e.g. 100,1k (default: 50,200)")
+    parser.add_argument("--stages", default=",".join(STAGES),
+                        help=f"comma-separated stages to run (default: {','.join(STAGES)})")
+    parser.add_argument("--request-interval", type=float, default=0.0,
+                        help="REQUEST_INTERVAL for the scripts, in seconds (default: 0)")
+    parser.add_argument("--output", default=str(DEFAULT_OUTPUT_DIR),
+                        help="directory for the results JSON (default: data/benchmarks)")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch run directories and logs")
+    parser.add_argument("--compare", action="store_true",
+                        help="check the run against the benchmark history; exit 1 on regressions")
+    bench_history.add_compare_arguments(parser)
+    mock_openai.add_mock_arguments(parser)
+    args = parser.parse_args(argv)
+
+    try:
+        sizes = [parse_size(size) for size in args.sizes.split(",")]
+    except (argparse.ArgumentTypeError, ValueError) as e:
+        parser.error(f"--sizes: {e}")
+    stages = args.stages.split(",")
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(unknown)}")
+
+    mock = mock_openai.mock_settings(args)
+    compare = None
+    if args.compare:
+        compare = {"window": args.window, "alpha": args.alpha, "min_change": args.min_change}
+    return run(sizes, stages, mock, args.request_interval, args.output, args.keep, compare)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Static blind evaluation page.
+
+Builds ``data/blind_evaluation.html`` from ``evaluation.csv``: a single
+self-contained file that judges open in a browser, with no server. Pairs are
+embedded as compact JSON arrays split into ``--chunk-size`` chunks; a chunk is
+only parsed and rendered when the judge scrolls near it, so thousands of pairs
+open instantly. Each choice is saved in the browser's localStorage as it is
+made (keyed by a hash of the pairs, so pages for different evaluations don't
+mix), and the page exports the judgments as ``evaluation_results.csv``.
+Copying that file into ``data/`` imports it into the database (see db.py).
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import sys
+from pathlib import Path
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+DEFAULT_INPUT = DATA_DIR / "evaluation.csv"
+DEFAULT_OUTPUT = DATA_DIR / "blind_evaluation.html"
+
+CHUNK_SIZE = 50
+
+STYLE = """
+body{font-family:Arial,sans-serif;max-width:800px;margin:0 auto;padding:0 20px 40px;color:#222}
+header{position:sticky;top:0;background:#fff;padding:10px 0;border-bottom:1px solid #ddd;z-index:1}
+h1{color:#2c3e50;text-align:center;margin:10px 0}
+.controls{display:flex;gap:10px;align-items:center;flex-wrap:wrap}
+#progress{flex:1;font-weight:bold}
+button{background:#3498db;color:#fff;border:none;padding:8px 12px;border-radius:5px;cursor:pointer}
+button:hover{background:#2980b9}
+button.secondary{background:#95a5a6}
+.pair{background:#f8f9fa;padding:15px;margin:20px 0;border-radius:5px;border-left:5px solid #3498db}
+.pair.judged{border-left-color:#27ae60}
+.pair h3{margin:0 0 5px}
+.options{display:flex;gap:20px}
+.option{flex:1;display:block;text-align:left;background:#fff;color:#222;border:2px solid #ddd;padding:15px}
+.option:hover{background:#fff;border-color:#3498db}
+.option.selected{border-color:#27ae60;background:#eafaf1}
+.option .label{display:block;font-weight:bold;margin-bottom:5px}
+.option .text{font-style:italic}
+#summary,#warning{margin:8px 0 0}
+#warning{color:#c0392b}
+#more{text-align:center;color:#888;padding:20px}
+"""
+
+BODY = """<header>
+<h1>\U0001F50D ECD-Eye Blind Evaluation</h1>
+<p>For each brief, click the tagline you prefer. Choices are saved in this browser as you go;
+export them when you are done.</p>
+<div class="controls">
+<span id="progress"></span>
+<button id="next">Next unjudged</button>
+<button id="export">Export results CSV</button>
+<button id="reset" class="secondary">Clear choices</button>
+</div>
+<p id="summary" hidden></p>
+<p id="warning" hidden></p>
+</header>
+<main id="pairs"></main>
+<div id="more">Loading more pairs…</div>
+<template id="pair-template"><section class="pair">
+<h3 class="brief-id"></h3>
+<p><strong class="brief"></strong></p>
+<div class="options">
+<button class="option" data-option="A"><span class="label">Option A</span><span class="text"></span></button>
+<button class="option" data-option="B"><span class="label">Option B</span><span class="text"></span></button>
+</div>
+</section></template>
+"""
+
+# Pairs are [brief_id, brief, tagline A, tagline B, 1 if A is the baseline]
+SCRIPT = """
+(function () {
+  var meta = JSON.parse(document.getElementById("meta").textContent);
+  var storageKey = "ecd-eye-blind:" + meta.key;
+  var header = ["brief_id", "brief", "baseline_tagline", "finetuned_tagline", "preferred_tagline", "preferred_model"];
+  var container = document.getElementById("pairs");
+  var template = document.getElementById("pair-template");
+  var more = document.getElementById("more");
+  var chunks = [];
+  var rendered = 0;
+  var choices = {};
+
+  function warn(message) {
+    var warning = document.getElementById("warning");
+    warning.textContent = message;
+    warning.hidden = false;
+  }
+
+  try {
+    choices = JSON.parse(localStorage.getItem(storageKey)) || {};
+  } catch (e) {
+    warn("Choices can't be saved in this browser; export them before closing the page.");
+  }
+
+  // Chunks stay unparsed JSON in the page until needed
+  function chunk(index) {
+    if (!chunks[index]) {
+      var element = document.getElementById("chunk-" + index);
+      chunks[index] = JSON.parse(element.textContent);
+      element.remove();
+    }
+    return chunks[index];
+  }
+
+  function mark(node, option) {
+    node.classList.toggle("judged", Boolean(option));
+    node.querySelectorAll(".option").forEach(function (button) {
+      button.classList.toggle("selected", button.dataset.option === option);
+    });
+  }
+
+  function renderChunk() {
+    if (rendered >= meta.chunks) {
+      return false;
+    }
+    var fragment = document.createDocumentFragment();
+    chunk(rendered).forEach(function (pair) {
+      var node = template.content.firstElementChild.cloneNode(true);
+      node.dataset.id = pair[0];
+      node.querySelector(".brief-id").textContent = "Brief " + pair[0];
+      node.querySelector(".brief").textContent = pair[1];
+      node.querySelector('[data-option="A"] .text').textContent = pair[2];
+      node.querySelector('[data-option="B"] .text').textContent = pair[3];
+      mark(node, choices[pair[0]]);
+      fragment.appendChild(node);
+    });
+    container.appendChild(fragment);
+    rendered += 1;
+    if (rendered >= meta.chunks) {
+      more.hidden = true;
+    }
+    return true;
+  }
+
+  function updateProgress() {
+    document.getElementById("progress").textContent =
+      "Judged " + Object.keys(choices).length + " of " + meta.count;
+  }
+
+  function save() {
+    try {
+      localStorage.setItem(storageKey, JSON.stringify(choices));
+    } catch (e) {
+      warn("Choices could not be saved in this browser; export them before closing the page.");
+    }
+    updateProgress();
+  }
+
+  container.addEventListener("click", function (event) {
+    var button = event.target.closest(".option");
+    if (!button) {
+      return;
+    }
+    var node = button.closest(".pair");
+    choices[node.dataset.id] = button.dataset.option;
+    mark(node, button.dataset.option);
+    save();
+  });
+
+  document.getElementById("next").addEventListener("click", function () {
+    for (var index = 0; index < meta.chunks; index++) {
+      var pair = chunk(index).find(function (pair) { return !choices[pair[0]]; });
+      if (pair) {
+        while (rendered <= index) {
+          renderChunk();
+        }
+        container.querySelector('[data-id="' + pair[0] + '"]').scrollIntoView({block: "center"});
+        return;
+      }
+    }
+    alert("Every pair has been judged.");
+  });
+
+  function csvField(value) {
+    value = String(value);
+    return /[",\\r\\n]/.test(value) ? '"' + value.replace(/"/g, '""') + '"' : value;
+  }
+
+  document.getElementById("export").addEventListener("click", function () {
+    var rows = [header];
+    var baselineCount = 0;
+    for (var index = 0; index < meta.chunks; index++) {
+      chunk(index).forEach(function (pair) {
+        var option = choices[pair[0]];
+        if (!option) {
+          return;
+        }
+        var baseline = pair[4] ? pair[2] : pair[3];
+        var finetuned = pair[4] ? pair[3] : pair[2];
+        var preferredModel = (option === "A") === Boolean(pair[4]) ? "baseline" : "finetuned";
+        baselineCount += preferredModel === "baseline" ? 1 : 0;
+        rows.push([pair[0], pair[1], baseline, finetuned,
+                   preferredModel === "baseline" ? baseline : finetuned, preferredModel]);
+      });
+    }
+    var total = rows.length - 1;
+    if (!total) {
+      alert("No pairs have been judged yet.");
+      return;
+    }
+    var text = rows.map(function (row) { return row.map(csvField).join(","); }).join("\\r\\n") + "\\r\\n";
+    var link = document.createElement("a");
+    link.href = URL.createObjectURL(new Blob([text], {type: "text/csv"}));
+    link.download = "evaluation_results.csv";
+    link.click();
+    URL.revokeObjectURL(link.href);
+
+    var summary = document.getElementById("summary");
+    summary.textContent = "Baseline preferred: " + baselineCount + "/" + total +
+      " (" + (baselineCount / total * 100).toFixed(1) + "%), fine-tuned preferred: " +
+      (total - baselineCount) + "/" + total + " (" + ((total - baselineCount) / total * 100).toFixed(1) + "%)";
+    summary.hidden = false;
+  });
+
+  document.getElementById("reset").addEventListener("click", function () {
+    if (!confirm("Clear every choice saved in this browser for these pairs?")) {
+      return;
+    }
+    choices = {};
+    container.querySelectorAll(".pair").forEach(function (node) { mark(node, undefined); });
+    save();
+  });
+
+  updateProgress();
+  renderChunk();
+  if ("IntersectionObserver" in window) {
+    var observer = new IntersectionObserver(function (entries) {
+      if (entries[0].isIntersecting && !renderChunk()) {
+        observer.disconnect();
+      }
+    }, {rootMargin: "800px"});
+    observer.observe(more);
+  } else {
+    while (renderChunk()) {}
+  }
+})();
+"""
+
+
+def load_pairs(csv_file):
+    """Read evaluation pairs from an ``evaluation.csv`` export."""
+    with open(csv_file, "r", newline="") as f:
+        return [
+            [
+                int(row["brief_id"]), row["brief"], row["randomized_a"], row["randomized_b"],
+                int(row["is_a_baseline"] == "True"),
+            ]
+            for row in csv.DictReader(f)
+        ]
+
+
+def script_json(value):
+    """JSON that is safe inside a ``<script>`` element."""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).replace("<", "\\u003c")
+
+
+def build_page(pairs, chunk_size=CHUNK_SIZE):
+    """Return the page HTML for ``pairs`` (see load_pairs)."""
+    chunks = [pairs[start:start + chunk_size] for start in range(0, len(pairs), chunk_size)]
+    key = hashlib.sha1(script_json(pairs).encode()).hexdigest()[:12]
+    meta = {"key": key, "count": len(pairs), "chunks": len(chunks)}
+    data = "\n".join(
+        [f'<script type="application/json" id="meta">{script_json(meta)}</script>']
+        + [
+            f'<script type="application/json" id="chunk-{index}">{script_json(chunk)}</script>'
+            for index, chunk in enumerate(chunks)
+        ]
+    )
+    return (
+        "<!DOCTYPE html>\n<html lang=\"en\"><head><meta charset=\"utf-8\">"
+        "<meta name=\"viewport\" content=\"width=device-width, initial-scale=1\">"
+        f"<title>ECD-Eye Blind Evaluation</title><style>{STYLE}</style></head><body>\n"
+        f"{BODY}{data}\n<script>{SCRIPT}</script>\n</body></html>\n"
+    )
+
+
+def write_page(pairs, path=DEFAULT_OUTPUT, chunk_size=CHUNK_SIZE):
+    path = Path(path)
+    path.write_text(build_page(pairs, chunk_size), encoding="utf-8")
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", default=str(DEFAULT_INPUT), help="evaluation pairs CSV (default: data/evaluation.csv)")
+    parser.add_argument("--output", default=str(DEFAULT_OUTPUT),
+                        help="page to write (default: data/blind_evaluation.html)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help=f"pairs rendered at a time as the judge scrolls (default: {CHUNK_SIZE})")
+    args = parser.parse_args(argv)
+
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+    if not Path(args.input).exists():
+        print(f"Error: {args.input} not found; run evaluate_models.py first")
+        return 1
+
+    pairs = load_pairs(args.input)
+    path = write_page(pairs, args.output, args.chunk_size)
+    print(f"Blind evaluation page with {len(pairs)} pairs saved to {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
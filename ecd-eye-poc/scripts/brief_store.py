@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+SQLite-backed brief store.
+
+Briefs are kept in the ``briefs`` table of the pipeline database
+(``data/ecd_eye.db``, see db.py) with an id primary key and a split tag
+(train, eval or holdout). Reads stream from a cursor, lookups by id use the
+primary key, and new briefs are appended without rewriting the store.
+``data/briefs.json`` is still supported as a read-only import format: it is
+imported automatically whenever it is newer than the last import.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import db
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+DEFAULT_STORE_FILE = db.DEFAULT_DB_FILE
+DEFAULT_JSON_FILE = DATA_DIR / "briefs.json"
+
+SPLITS = ("train", "eval", "holdout")
+
+# briefs.json section -> split tag
+JSON_SECTIONS = {
+    "training_briefs": "train",
+    "evaluation_briefs": "eval",
+    "holdout_briefs": "holdout",
+}
+
+class BriefStore:
+    """Append-only store of briefs with streaming reads and id lookup."""
+
+    def __init__(self, path=DEFAULT_STORE_FILE):
+        self.path = Path(path)
+        self.conn = db.connect(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def __iter__(self):
+        return self.iter_briefs()
+
+    def __len__(self):
+        return self.count()
+
+    def iter_briefs(self, split=None):
+        """Yield briefs as ``{"id", "brief", "split"}`` dicts in id order."""
+        if split is None:
+            cursor = self.conn.execute("SELECT id, brief, split FROM briefs ORDER BY id")
+        else:
+            cursor = self.conn.execute(
+                "SELECT id, brief, split FROM briefs WHERE split = ? ORDER BY id", (split,)
+            )
+        for row in cursor:
+            yield dict(row)
+
+    def get(self, brief_id):
+        """Return the brief with the given id, or None."""
+        row = self.conn.execute(
+            "SELECT id, brief, split FROM briefs WHERE id = ?", (int(brief_id),)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def count(self, split=None):
+        if split is None:
+            return self.conn.execute("SELECT COUNT(*) FROM briefs").fetchone()[0]
+        return self.conn.execute("SELECT COUNT(*) FROM briefs WHERE split = ?", (split,)).fetchone()[0]
+
+    def append(self, brief, split="train", brief_id=None):
+        """Add one brief and return its id. Ids are assigned if not given."""
+        return self.append_many([{"id": brief_id, "brief": brief}], split)[0]
+
+    def append_many(self, briefs, split="train"):
+        """Add briefs (dicts with "brief" and optional "id") in one transaction."""
+        if split not in SPLITS:
+            raise ValueError(f"Unknown split {split!r}; expected one of {', '.join(SPLITS)}")
+
+        ids = []
+        with self.conn:
+            for item in briefs:
+                text = item["brief"].strip()
+                if not text:
+                    raise ValueError("Brief text must not be empty")
+                cursor = self.conn.execute(
+                    "INSERT INTO briefs (id, brief, split) VALUES (?, ?, ?)",
+                    (item.get("id"), text, split),
+                )
+                ids.append(cursor.lastrowid)
+        return ids
+
+    def import_json(self, json_file=DEFAULT_JSON_FILE, force=False):
+        """Import a briefs.json document; return the number of new briefs.
+
+        Briefs whose id already exists are left untouched, so importing is
+        idempotent. The import is skipped if the file hasn't changed since
+        the last one, unless ``force`` is set.
+        """
+        json_file = Path(json_file)
+        row = self.conn.execute(
+            "SELECT value FROM store_meta WHERE key = ?", (f"imported:{json_file.resolve()}",)
+        ).fetchone()
+        if row and row[0] == str(json_file.stat().st_mtime_ns) and not force:
+            return 0
+
+        with open(json_file, "r") as f:
+            briefs_data = json.load(f)
+
+        added = 0
+        with self.conn:
+            for section, split in JSON_SECTIONS.items():
+                for item in briefs_data.get(section, []):
+                    cursor = self.conn.execute(
+                        "INSERT OR IGNORE INTO briefs (id, brief, split) VALUES (?, ?, ?)",
+                        (int(item["id"]), item["brief"], split),
+                    )
+                    added += cursor.rowcount
+            self._mark_imported(json_file)
+        return added
+
+    def _mark_imported(self, json_file):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO store_meta (key, value) VALUES (?, ?)",
+            (f"imported:{Path(json_file).resolve()}", str(Path(json_file).stat().st_mtime_ns)),
+        )
+
+    def mark_imported(self, json_file):
+        """Record a briefs.json whose briefs are already in the store as imported."""
+        with self.conn:
+            self._mark_imported(json_file)
+
+
+def open_store(path=DEFAULT_STORE_FILE, json_file=DEFAULT_JSON_FILE):
+    """Open the brief store, importing briefs.json first if it has changed."""
+    store = BriefStore(path)
+    if json_file and Path(json_file).exists():
+        store.import_json(json_file)
+    return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the ECD-Eye brief store.")
+    parser.add_argument("--store", default=str(DEFAULT_STORE_FILE), help="path to the SQLite store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="import a briefs.json file")
+    import_parser.add_argument("json_file", nargs="?", default=str(DEFAULT_JSON_FILE))
+
+    add_parser = subparsers.add_parser("add", help="append a brief")
+    add_parser.add_argument("brief")
+    add_parser.add_argument("--split", choices=SPLITS, default="train")
+    add_parser.add_argument("--id", type=int, default=None)
+
+    list_parser = subparsers.add_parser("list", help="print briefs as JSON lines")
+    list_parser.add_argument("--split", choices=SPLITS, default=None)
+
+    get_parser = subparsers.add_parser("get", help="print one brief by id")
+    get_parser.add_argument("id", type=int)
+
+    args = parser.parse_args(argv)
+
+    with BriefStore(args.store) as store:
+        if args.command == "import":
+            added = store.import_json(args.json_file, force=True)
+            print(f"Imported {added} new briefs from {args.json_file} ({store.count()} total)")
+        elif args.command == "add":
+            brief_id = store.append(args.brief, args.split, args.id)
+            print(f"Added brief {brief_id} to {args.split}")
+        elif args.command == "list":
+            for brief in store.iter_briefs(args.split):
+                print(json.dumps(brief))
+        elif args.command == "get":
+            brief = store.get(args.id)
+            if brief is None:
+                print(f"Error: Brief {args.id} not found")
+                return 1
+            print(json.dumps(brief))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Check that the ecd-eye CLI starts fast, using ``python -X importtime``.
+
+Fails if a cheap invocation imports a heavy dependency or if the time spent
+importing what the CLI itself needs exceeds the budget. Modules the bare
+interpreter already imports at startup (``site``, ``encodings``, ...) are not
+counted, so the check doesn't depend on how the Python install is set up.
+"""
+
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+
+CLI = Path(__file__).resolve().parent.parent / "ecd-eye"
+
+HEAVY_MODULES = {"openai", "pandas", "numpy", "scipy", "tqdm", "dotenv", "streamlit", "matplotlib"}
+
+CHEAP_INVOCATIONS = [
+    ["--help"],
+    ["generate", "--help"],
+    ["prepare", "--help"],
+    ["finetune", "--help"],
+    ["evaluate", "--help"],
+    ["report", "--help"],
+    ["blind-page", "--help"],
+    ["synth", "--help"],
+    ["serve", "--help"],
+    ["mock", "--help"],
+    ["bench", "--help"],
+    ["loadtest", "--help"],
+    ["history", "--help"],
+    ["scorer", "--help"],
+    ["ingest", "--help"],
+    ["ingest", "run", "--help"],
+]
+
+
+def import_profile(args):
+    """Run the CLI under -X importtime; return {top-level module: cumulative µs}."""
+    return parse_importtime([str(CLI), *args])
+
+
+def interpreter_modules():
+    """Top-level modules a bare ``python -c pass`` imports at startup."""
+    return {name for name in parse_importtime(["-c", "pass"]) if not name.startswith(" ")}
+
+
+def parse_importtime(args):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        capture_output=True,
+        text=True,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # Header line
+        modules[name[1:]] = int(cumulative)  # Keep nesting indent
+    return modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--budget-ms", type=float, default=100.0, help="max total import time per invocation")
+    args = parser.parse_args(argv)
+
+    startup = interpreter_modules()
+    failures = []
+    for invocation in CHEAP_INVOCATIONS:
+        modules = import_profile(invocation)
+        # Only unindented names are top-level; their cumulative times don't overlap
+        total_ms = sum(
+            us for name, us in modules.items() if not name.startswith(" ") and name not in startup
+        ) / 1000
+        heavy = sorted({name.strip().split(".")[0] for name in modules} & HEAVY_MODULES)
+
+        label = "ecd-eye " + " ".join(invocation)
+        print(f"{label:<28} {total_ms:7.1f} ms  {len(modules)} modules")
+        if heavy:
+            failures.append(f"{label}: imported {', '.join(heavy)}")
+        if total_ms > args.budget_ms:
+            failures.append(f"{label}: {total_ms:.1f} ms exceeds budget of {args.budget_ms:.0f} ms")
+
+    if failures:
+        print("\nStartup check failed:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+
+    print("\nStartup check passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+Lazily loaded environment configuration shared by the pipeline scripts.
+
+``python-dotenv`` and ``openai`` are only imported on first use so that
+``--help`` and other cheap invocations start quickly.
+"""
+
+import os
+
+DEFAULT_BASELINE_MODEL = "gpt-3.5-turbo-0125"
+DEFAULT_FINETUNE_MODEL = "gpt-3.5-turbo-0125"
+
+_env_loaded = False
+
+
+def load_env():
+    """Load variables from .env once per process."""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+
+def get(name, default=None):
+    """Return an environment setting, loading .env first."""
+    load_env()
+    return os.getenv(name, default)
+
+
+def baseline_model():
+    return get("BASELINE_MODEL", DEFAULT_BASELINE_MODEL)
+
+
+def finetune_model():
+    return get("FINETUNE_MODEL", DEFAULT_FINETUNE_MODEL)
+
+
+def router_models():
+    """Models for ``generate_baseline.py --route``, cheapest first."""
+    return get("ROUTER_MODELS", f"gpt-4o-mini,{DEFAULT_BASELINE_MODEL},gpt-4o").split(",")
+
+
+def generation_backend():
+    """``openai`` (hosted API), ``ngram`` or ``local``; see backends.py."""
+    return get("GENERATION_BACKEND", "openai")
+
+
+def use_generation_backend(name):
+    """Select the generation backend for this process and the workers it starts."""
+    os.environ["GENERATION_BACKEND"] = name
+
+
+def prompt_version():
+    """Prompt template version (see prompts.py)."""
+    return get("PROMPT_VERSION", "v1")
+
+
+def request_interval():
+    """Seconds to wait between requests from one worker (its rate budget)."""
+    return float(get("REQUEST_INTERVAL", "1"))
+
+
+def use_shard_settings(index):
+    """Apply ``OPENAI_API_KEY_<index>`` / ``REQUEST_INTERVAL_<index>`` if set."""
+    for name in ("OPENAI_API_KEY", "REQUEST_INTERVAL"):
+        value = get(f"{name}_{index}")
+        if value:
+            os.environ[name] = value
+
+
+def openai_api(max_retries=None):
+    """Return the ``openai`` module configured with the API key.
+
+    Pass ``max_retries=0`` when retries are handled by resilience.py.
+    """
+    load_env()
+    import openai
+    openai.api_key = os.getenv("OPENAI_API_KEY")
+    if max_retries is not None:
+        openai.max_retries = max_retries
+    return openai
+
+
+def async_openai_client(max_retries=None):
+    """Return an ``openai.AsyncOpenAI`` client using the configured API key."""
+    load_env()
+    import openai
+    kwargs = {} if max_retries is None else {"max_retries": max_retries}
+    return openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), **kwargs)
@@ -0,0 +1,768 @@
+#!/usr/bin/env python3
+"""
+Embedded SQLite database holding all pipeline state.
+
+``data/ecd_eye.db`` replaces the CSV and text files that each step used to
+rewrite whole and every consumer re-parsed:
+
+    briefs       id, brief, split                 (see brief_store.py)
+    generations  brief_id, slot -> tagline, model  (was baseline.csv)
+    rankings     brief_id, slot, rater -> rank     (was rankings.csv)
+    jobs         fine-tuning jobs and their status (was job_id.txt)
+    models       fine-tuned models, newest current (was model_id.txt)
+    judgments    blind evaluation pairs and the    (was evaluation.csv and
+                 preferred model once judged        evaluation_results.csv)
+    brief_queue  submitted briefs awaiting         (see ingest.py)
+                 ingestion, and their outcome
+
+Every write is a single transaction, and the database runs in WAL mode so the
+Streamlit apps can read while a script writes. Regenerating a brief's
+taglines drops its now stale rankings.
+
+Existing legacy files in the data directory are imported by ``open_db``
+whenever they are newer than their last import, so older checkouts and
+hand-edited files keep working. CSV exports for humans are still written
+where the pipeline produced them before (``baseline.csv``,
+``evaluation.csv``, ``blind_evaluation_form.csv``) and on demand via
+``ecd-eye db export``.
+"""
+
+import argparse
+import csv
+import io
+import sqlite3
+import sys
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+DB_NAME = "ecd_eye.db"
+DEFAULT_DB_FILE = DATA_DIR / DB_NAME
+
+N_SLOTS = 5
+DEFAULT_RATER = "ecd"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS briefs (
+    id INTEGER PRIMARY KEY,
+    brief TEXT NOT NULL,
+    split TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS briefs_split ON briefs (split, id);
+
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS generations (
+    brief_id INTEGER NOT NULL REFERENCES briefs (id),
+    slot INTEGER NOT NULL CHECK (slot BETWEEN 1 AND 5),
+    tagline TEXT NOT NULL,
+    model TEXT,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (brief_id, slot)
+);
+
+CREATE TABLE IF NOT EXISTS rankings (
+    brief_id INTEGER NOT NULL,
+    slot INTEGER NOT NULL,
+    rater TEXT NOT NULL DEFAULT 'ecd',
+    rank INTEGER NOT NULL CHECK (rank BETWEEN 1 AND 5),
+    ranked_at TEXT NOT NULL,
+    PRIMARY KEY (brief_id, slot, rater),
+    FOREIGN KEY (brief_id, slot) REFERENCES generations (brief_id, slot) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS rankings_rank ON rankings (rater, rank, brief_id);
+
+-- Rankings are for the taglines as they were when ranked
+CREATE TRIGGER IF NOT EXISTS generations_changed
+AFTER UPDATE OF tagline ON generations
+WHEN OLD.tagline != NEW.tagline
+BEGIN
+    DELETE FROM rankings WHERE brief_id = NEW.brief_id;
+END;
+
+-- Briefs whose taglines or rankings changed, and the taglines_version that
+-- changed them, so the cached tagline store can be updated incrementally
+CREATE TABLE IF NOT EXISTS tagline_changes (
+    brief_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tagline_changes_version ON tagline_changes (version);
+
+CREATE TRIGGER IF NOT EXISTS generations_inserted AFTER INSERT ON generations
+BEGIN
+    INSERT INTO tagline_changes (brief_id, version) VALUES (NEW.brief_id,
+        COALESCE((SELECT CAST(value AS INTEGER) FROM store_meta WHERE key = 'taglines_version'), 0) + 1)
+        ON CONFLICT (brief_id) DO UPDATE SET version = excluded.version;
+END;
+
+CREATE TRIGGER IF NOT EXISTS generations_updated AFTER UPDATE OF tagline ON generations
+BEGIN
+    INSERT INTO tagline_changes (brief_id, version) VALUES (NEW.brief_id,
+        COALESCE((SELECT CAST(value AS INTEGER) FROM store_meta WHERE key = 'taglines_version'), 0) + 1)
+        ON CONFLICT (brief_id) DO UPDATE SET version = excluded.version;
+END;
+
+CREATE TRIGGER IF NOT EXISTS rankings_inserted AFTER INSERT ON rankings
+BEGIN
+    INSERT INTO tagline_changes (brief_id, version) VALUES (NEW.brief_id,
+        COALESCE((SELECT CAST(value AS INTEGER) FROM store_meta WHERE key = 'taglines_version'), 0) + 1)
+        ON CONFLICT (brief_id) DO UPDATE SET version = excluded.version;
+END;
+
+CREATE TRIGGER IF NOT EXISTS rankings_deleted AFTER DELETE ON rankings
+BEGIN
+    INSERT INTO tagline_changes (brief_id, version) VALUES (OLD.brief_id,
+        COALESCE((SELECT CAST(value AS INTEGER) FROM store_meta WHERE key = 'taglines_version'), 0) + 1)
+        ON CONFLICT (brief_id) DO UPDATE SET version = excluded.version;
+END;
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    training_file TEXT,
+    base_model TEXT,
+    status TEXT NOT NULL,
+    fine_tuned_model TEXT,
+    created_at TEXT NOT NULL,
+    finished_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS models (
+    id TEXT PRIMARY KEY,
+    base_model TEXT,
+    job_id TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS models_created ON models (created_at);
+
+CREATE TABLE IF NOT EXISTS judgments (
+    brief_id INTEGER NOT NULL REFERENCES briefs (id),
+    baseline_model TEXT NOT NULL,
+    finetuned_model TEXT NOT NULL,
+    baseline_tagline TEXT NOT NULL,
+    finetuned_tagline TEXT NOT NULL,
+    is_a_baseline INTEGER NOT NULL,
+    preferred_model TEXT CHECK (preferred_model IN ('baseline', 'finetuned')),
+    judge TEXT,
+    created_at TEXT NOT NULL,
+    judged_at TEXT,
+    PRIMARY KEY (brief_id, finetuned_model)
+);
+CREATE INDEX IF NOT EXISTS judgments_model ON judgments (finetuned_model, brief_id);
+
+CREATE TABLE IF NOT EXISTS brief_queue (
+    id INTEGER PRIMARY KEY,
+    brief TEXT NOT NULL,
+    split TEXT NOT NULL DEFAULT 'train',
+    source TEXT,
+    status TEXT NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('pending', 'processing', 'done', 'duplicate', 'rejected', 'failed')),
+    brief_id INTEGER,
+    error TEXT,
+    submitted_at TEXT NOT NULL,
+    processed_at TEXT
+);
+CREATE INDEX IF NOT EXISTS brief_queue_status ON brief_queue (status, id);
+"""
+
+BASELINE_HEADER = ["brief_id", "brief"] + [f"tagline_{slot}" for slot in range(1, N_SLOTS + 1)]
+RANKINGS_HEADER = ["brief_id", "brief"] + [f"rank_{slot}" for slot in range(1, N_SLOTS + 1)]
+EVALUATION_HEADER = [
+    "brief_id", "brief", "baseline_tagline", "finetuned_tagline",
+    "randomized_a", "randomized_b", "is_a_baseline",
+]
+RESULTS_HEADER = [
+    "brief_id", "brief", "baseline_tagline", "finetuned_tagline",
+    "preferred_tagline", "preferred_model",
+]
+
+
+def now(timespec="seconds"):
+    return datetime.now(timezone.utc).isoformat(timespec=timespec)
+
+
+def _csv_rows(csv_file):
+    """Stream the data rows of a CSV file, skipping the header."""
+    with open(csv_file, "r", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        yield from reader
+
+
+def connect(path=DEFAULT_DB_FILE):
+    """Open a connection with the schema, WAL and foreign keys enabled."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    # Durable at checkpoints and much faster for bulk writes under WAL
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class Database:
+    """Data access for generations, rankings, jobs, models and judgments."""
+
+    def __init__(self, path=DEFAULT_DB_FILE):
+        self.path = Path(path)
+        self.conn = connect(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    # Bookkeeping
+
+    def _meta(self, key):
+        row = self.conn.execute("SELECT value FROM store_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO store_meta (key, value) VALUES (?, ?)", (key, str(value))
+        )
+
+    def _bump_version(self):
+        self._set_meta("taglines_version", int(self._meta("taglines_version") or 0) + 1)
+
+    def taglines_version(self):
+        """Token that changes whenever generations or rankings change."""
+        with self.conn:
+            if self._meta("db_id") is None:
+                # Distinguishes a recreated database whose counter starts over
+                self._set_meta("db_id", uuid.uuid4().hex)
+        return f"{self._meta('db_id')}:{self._meta('taglines_version') or 0}"
+
+    def _ensure_briefs(self, rows, split="train"):
+        """Add briefs referenced by imported rows that the store doesn't know."""
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO briefs (id, brief, split) VALUES (?, ?, ?)",
+            ((int(brief_id), brief, split) for brief_id, brief in rows),
+        )
+
+    def ensure_briefs(self, rows, split="train"):
+        """Stream ``(brief_id, brief)`` rows into the briefs table, keeping existing ids."""
+        with self.conn:
+            self._ensure_briefs(rows, split)
+
+    # Generations
+
+    def save_generations(self, rows, model=None):
+        """Store ``(brief_id, [tagline_1..5])`` rows in one transaction."""
+        with self.conn:
+            self._write_generations(rows, model)
+
+    def _write_generations(self, rows, model):
+        created_at = now()
+        self.conn.executemany(
+            """
+            INSERT INTO generations (brief_id, slot, tagline, model, created_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (brief_id, slot) DO UPDATE SET
+                tagline = excluded.tagline,
+                model = COALESCE(excluded.model, model),
+                created_at = excluded.created_at
+            WHERE tagline != excluded.tagline OR (excluded.model IS NOT NULL AND excluded.model IS NOT model)
+            """,
+            (
+                (int(brief_id), slot, tagline, model, created_at)
+                for brief_id, taglines in rows
+                for slot, tagline in enumerate(taglines, start=1)
+            ),
+        )
+        self._bump_version()
+
+    def import_generations_csv(self, csv_file, model=None):
+        """Import a baseline.csv-style file; return the number of briefs."""
+        with self.conn:
+            self._ensure_briefs((row[0], row[1]) for row in _csv_rows(csv_file))
+            self._write_generations(((row[0], row[2:2 + N_SLOTS]) for row in _csv_rows(csv_file)), model)
+            self._mark_synced(csv_file)
+        return sum(1 for _ in _csv_rows(csv_file))
+
+    def generations(self, split=None):
+        """Yield ``(brief_id, brief, [tagline_1..5])`` in brief order."""
+        query = """
+            SELECT g.brief_id, b.brief, g.slot, g.tagline
+            FROM generations g JOIN briefs b ON b.id = g.brief_id
+            {where}
+            ORDER BY g.brief_id, g.slot
+        """
+        if split is None:
+            cursor = self.conn.execute(query.format(where=""))
+        else:
+            cursor = self.conn.execute(query.format(where="WHERE b.split = ?"), (split,))
+        current = None
+        for brief_id, brief, slot, tagline in cursor:
+            if current is None or current[0] != brief_id:
+                if current is not None:
+                    yield current
+                current = (brief_id, brief, [""] * N_SLOTS)
+            current[2][slot - 1] = tagline
+        if current is not None:
+            yield current
+
+    def generations_by_brief(self, split=None):
+        """Return ``{brief_id: [tagline_1..5]}``."""
+        return {brief_id: taglines for brief_id, _, taglines in self.generations(split)}
+
+    # Rankings
+
+    def save_rankings(self, rankings, rater=DEFAULT_RATER):
+        """Store ``{brief_id: [rank for slot 1..5]}`` in one transaction.
+
+        ``rankings`` may also be an iterable of ``(brief_id, ranks)`` pairs,
+        which is streamed rather than held in memory.
+        """
+        with self.conn:
+            self._write_rankings(rankings, rater)
+
+    def _write_rankings(self, rankings, rater):
+        ranked_at = now()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO rankings (brief_id, slot, rater, rank, ranked_at) VALUES (?, ?, ?, ?, ?)",
+            (
+                (int(brief_id), slot, rater, int(rank), ranked_at)
+                for brief_id, ranks in (rankings.items() if hasattr(rankings, "items") else rankings)
+                for slot, rank in enumerate(ranks, start=1)
+            ),
+        )
+        self._bump_version()
+
+    def import_rankings_csv(self, csv_file, rater=DEFAULT_RATER):
+        """Import a rankings.csv-style file; return the number of briefs."""
+        with self.conn:
+            self._write_rankings(((row[0], row[2:2 + N_SLOTS]) for row in _csv_rows(csv_file)), rater)
+            self._mark_synced(csv_file)
+        return sum(1 for _ in _csv_rows(csv_file))
+
+    def rankings(self, rater=DEFAULT_RATER):
+        """Yield ``(brief_id, brief, [rank for slot 1..5])`` for ranked briefs."""
+        cursor = self.conn.execute(
+            """
+            SELECT r.brief_id, b.brief, r.slot, r.rank
+            FROM rankings r JOIN briefs b ON b.id = r.brief_id
+            WHERE r.rater = ?
+            ORDER BY r.brief_id, r.slot
+            """,
+            (rater,),
+        )
+        current = None
+        for brief_id, brief, slot, rank in cursor:
+            if current is None or current[0] != brief_id:
+                if current is not None:
+                    yield current
+                current = (brief_id, brief, [None] * N_SLOTS)
+            current[2][slot - 1] = rank
+        if current is not None:
+            yield current
+
+    def count_rankings(self, rater=DEFAULT_RATER):
+        return self.conn.execute(
+            "SELECT COUNT(DISTINCT brief_id) FROM rankings WHERE rater = ?", (rater,)
+        ).fetchone()[0]
+
+    def best_taglines(self, rater=DEFAULT_RATER):
+        """Yield ``(brief_id, brief, tagline)`` for each brief's rank-1 tagline."""
+        return self.conn.execute(
+            """
+            SELECT r.brief_id, b.brief, g.tagline
+            FROM rankings r
+            JOIN generations g ON g.brief_id = r.brief_id AND g.slot = r.slot
+            JOIN briefs b ON b.id = r.brief_id
+            WHERE r.rater = ? AND r.rank = 1
+            ORDER BY r.brief_id
+            """,
+            (rater,),
+        )
+
+    def tagline_rows(self, rater=DEFAULT_RATER, since=None):
+        """Yield ``(brief_id, slot, tagline, rank, brief)``; rank is None if unranked.
+
+        With ``since`` (a taglines_version counter), only briefs changed after it.
+        """
+        where = ""
+        params = (rater,)
+        if since is not None:
+            where = "WHERE g.brief_id IN (SELECT brief_id FROM tagline_changes WHERE version > ?)"
+            params += (since,)
+        return self.conn.execute(
+            f"""
+            SELECT g.brief_id, g.slot, g.tagline, r.rank, b.brief
+            FROM generations g
+            JOIN briefs b ON b.id = g.brief_id
+            LEFT JOIN rankings r ON r.brief_id = g.brief_id AND r.slot = g.slot AND r.rater = ?
+            {where}
+            ORDER BY g.brief_id, g.slot
+            """,
+            params,
+        )
+
+    def changed_briefs(self, since):
+        """Ids of briefs whose taglines or rankings changed after taglines_version ``since``."""
+        return [row[0] for row in self.conn.execute(
+            "SELECT brief_id FROM tagline_changes WHERE version > ? ORDER BY brief_id", (since,)
+        )]
+
+    # Jobs and models
+
+    def record_job(self, job_id, training_file=None, base_model=None, status="created"):
+        with self.conn:
+            self.conn.execute(
+                """
+                INSERT INTO jobs (id, training_file, base_model, status, created_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET status = excluded.status
+                """,
+                (job_id, str(training_file) if training_file else None, base_model, status, now()),
+            )
+
+    def update_job(self, job_id, status, fine_tuned_model=None):
+        """Record a job's status; a successful job also registers its model."""
+        finished = status in ("succeeded", "failed", "cancelled")
+        with self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, fine_tuned_model = COALESCE(?, fine_tuned_model), "
+                "finished_at = CASE WHEN ? THEN ? ELSE finished_at END WHERE id = ?",
+                (status, fine_tuned_model, finished, now(), job_id),
+            )
+            if status == "succeeded" and fine_tuned_model:
+                base_model = self.conn.execute(
+                    "SELECT base_model FROM jobs WHERE id = ?", (job_id,)
+                ).fetchone()
+                self._add_model(fine_tuned_model, base_model[0] if base_model else None, job_id)
+
+    def _add_model(self, model_id, base_model=None, job_id=None):
+        self.conn.execute(
+            "INSERT OR IGNORE INTO models (id, base_model, job_id, created_at) VALUES (?, ?, ?, ?)",
+            (model_id, base_model, job_id, now()),
+        )
+
+    def add_model(self, model_id, base_model=None, job_id=None):
+        with self.conn:
+            self._add_model(model_id, base_model, job_id)
+
+    def current_model(self):
+        """Return the most recently fine-tuned model id, or None."""
+        row = self.conn.execute(
+            "SELECT id FROM models ORDER BY created_at DESC, rowid DESC LIMIT 1"
+        ).fetchone()
+        return row[0] if row else None
+
+    def latest_job(self):
+        row = self.conn.execute("SELECT * FROM jobs ORDER BY created_at DESC, rowid DESC LIMIT 1").fetchone()
+        return dict(row) if row else None
+
+    # Brief queue
+
+    def enqueue_briefs(self, items, source=None):
+        """Queue ``(brief, split)`` pairs for ingestion; return their queue ids."""
+        submitted_at = now("milliseconds")
+        with self.conn:
+            return [
+                self.conn.execute(
+                    "INSERT INTO brief_queue (brief, split, source, submitted_at) VALUES (?, ?, ?, ?)",
+                    (brief, split, source, submitted_at),
+                ).lastrowid
+                for brief, split in items
+            ]
+
+    def count_queued(self, status="pending"):
+        return self.conn.execute("SELECT COUNT(*) FROM brief_queue WHERE status = ?", (status,)).fetchone()[0]
+
+    def queue_counts(self):
+        """Return ``{status: count}`` for the brief queue."""
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM brief_queue GROUP BY status").fetchall())
+
+    def claim_queued(self, limit):
+        """Mark up to ``limit`` of the oldest pending briefs as processing and return them."""
+        with self.conn:
+            rows = [dict(row) for row in self.conn.execute(
+                "SELECT id, brief, split, submitted_at FROM brief_queue WHERE status = 'pending' ORDER BY id LIMIT ?",
+                (limit,),
+            )]
+            self.conn.executemany(
+                "UPDATE brief_queue SET status = 'processing' WHERE id = ?", ((row["id"],) for row in rows)
+            )
+        return rows
+
+    def finish_queued(self, results):
+        """Record ``(queue_id, status, brief_id, error)`` outcomes in one transaction."""
+        processed_at = now("milliseconds")
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE brief_queue SET status = ?, brief_id = ?, error = ?, processed_at = ? WHERE id = ?",
+                (
+                    (status, brief_id, str(error) if error is not None else None, processed_at, queue_id)
+                    for queue_id, status, brief_id, error in results
+                ),
+            )
+
+    def release_queued(self):
+        """Return briefs left processing (by an interrupted run) to the queue; return how many."""
+        with self.conn:
+            return self.conn.execute(
+                "UPDATE brief_queue SET status = 'pending' WHERE status = 'processing'"
+            ).rowcount
+
+    # Judgments
+
+    def save_evaluations(self, rows):
+        """Store evaluation pairs, dicts keyed like the judgments columns."""
+        created_at = now()
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT OR REPLACE INTO judgments (
+                    brief_id, baseline_model, finetuned_model, baseline_tagline,
+                    finetuned_tagline, is_a_baseline, created_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    (
+                        int(row["brief_id"]), row["baseline_model"], row["finetuned_model"],
+                        row["baseline_tagline"], row["finetuned_tagline"],
+                        int(bool(row["is_a_baseline"])), created_at,
+                    )
+                    for row in rows
+                ),
+            )
+
+    def evaluation_pairs(self, finetuned_model=None):
+        """Return evaluation pairs (dicts) for a model, default the current one."""
+        finetuned_model = finetuned_model or self.current_model()
+        cursor = self.conn.execute(
+            """
+            SELECT j.*, b.brief FROM judgments j JOIN briefs b ON b.id = j.brief_id
+            WHERE j.finetuned_model = ?
+            ORDER BY j.brief_id
+            """,
+            (finetuned_model,),
+        )
+        pairs = []
+        for row in cursor:
+            pair = dict(row)
+            pair["is_a_baseline"] = bool(pair["is_a_baseline"])
+            if pair["is_a_baseline"]:
+                pair["randomized_a"], pair["randomized_b"] = pair["baseline_tagline"], pair["finetuned_tagline"]
+            else:
+                pair["randomized_a"], pair["randomized_b"] = pair["finetuned_tagline"], pair["baseline_tagline"]
+            pairs.append(pair)
+        return pairs
+
+    def save_judgments(self, preferences, finetuned_model=None, judge=None):
+        """Record ``{brief_id: "baseline" | "finetuned"}`` (or pairs) in one transaction."""
+        finetuned_model = finetuned_model or self.current_model()
+        judged_at = now()
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE judgments SET preferred_model = ?, judge = ?, judged_at = ? "
+                "WHERE brief_id = ? AND finetuned_model = ?",
+                (
+                    (preferred, judge, judged_at, int(brief_id), finetuned_model)
+                    for brief_id, preferred in (preferences.items() if hasattr(preferences, "items") else preferences)
+                ),
+            )
+
+    def judgments(self, finetuned_model=None):
+        """Return judged pairs as dicts with the evaluation_results.csv columns."""
+        results = []
+        for pair in self.evaluation_pairs(finetuned_model):
+            if pair["preferred_model"] is None:
+                continue
+            pair["preferred_tagline"] = (
+                pair["baseline_tagline"] if pair["preferred_model"] == "baseline" else pair["finetuned_tagline"]
+            )
+            results.append({column: pair[column] for column in RESULTS_HEADER})
+        return results
+
+    # Legacy files and CSV exports
+
+    def _mark_synced(self, path):
+        self._set_meta(f"synced:{Path(path).resolve()}", Path(path).stat().st_mtime_ns)
+
+    def mark_synced(self, *paths):
+        """Record files whose contents are already in the database as imported."""
+        with self.conn:
+            for path in paths:
+                self._mark_synced(path)
+
+    def _needs_sync(self, path):
+        path = Path(path)
+        return path.exists() and self._meta(f"synced:{path.resolve()}") != str(path.stat().st_mtime_ns)
+
+    def import_legacy(self, data_dir=DATA_DIR):
+        """Import legacy CSV / text files that changed since their last import."""
+        data_dir = Path(data_dir)
+        imported = []
+
+        baseline_file = data_dir / "baseline.csv"
+        if self._needs_sync(baseline_file):
+            self.import_generations_csv(baseline_file)
+            imported.append(baseline_file.name)
+
+        rankings_file = data_dir / "rankings.csv"
+        if self._needs_sync(rankings_file):
+            self.import_rankings_csv(rankings_file)
+            imported.append(rankings_file.name)
+
+        job_file = data_dir / "job_id.txt"
+        if self._needs_sync(job_file):
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO jobs (id, status, created_at) VALUES (?, 'unknown', ?)",
+                    (job_file.read_text().strip(), now()),
+                )
+                self._mark_synced(job_file)
+            imported.append(job_file.name)
+
+        model_file = data_dir / "model_id.txt"
+        if self._needs_sync(model_file):
+            with self.conn:
+                self._add_model(model_file.read_text().strip())
+                self._mark_synced(model_file)
+            imported.append(model_file.name)
+
+        evaluation_file = data_dir / "evaluation.csv"
+        if self._needs_sync(evaluation_file):
+            finetuned_model = self.current_model() or "finetuned"
+            with open(evaluation_file, "r", newline="") as f:
+                rows = list(csv.DictReader(f))
+            with self.conn:
+                self._ensure_briefs(((row["brief_id"], row["brief"]) for row in rows), "eval")
+                self.conn.executemany(
+                    """
+                    INSERT OR IGNORE INTO judgments (
+                        brief_id, baseline_model, finetuned_model, baseline_tagline,
+                        finetuned_tagline, is_a_baseline, created_at
+                    ) VALUES (?, 'baseline', ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        (
+                            int(row["brief_id"]), finetuned_model, row["baseline_tagline"],
+                            row["finetuned_tagline"], int(row["is_a_baseline"] == "True"), now(),
+                        )
+                        for row in rows
+                    ),
+                )
+                self._mark_synced(evaluation_file)
+            imported.append(evaluation_file.name)
+
+        results_file = data_dir / "evaluation_results.csv"
+        if self._needs_sync(results_file):
+            with open(results_file, "r", newline="") as f:
+                rows = list(csv.DictReader(f))
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE judgments SET preferred_model = ?, judged_at = ? "
+                    "WHERE brief_id = ? AND baseline_tagline = ? AND finetuned_tagline = ?",
+                    (
+                        (row["preferred_model"], now(), int(row["brief_id"]),
+                         row["baseline_tagline"], row["finetuned_tagline"])
+                        for row in rows
+                    ),
+                )
+                self._mark_synced(results_file)
+            imported.append(results_file.name)
+
+        return imported
+
+    def export_csv(self, kind, out=None):
+        """Write ``baseline``, ``rankings``, ``evaluation`` or ``results`` as CSV.
+
+        ``out`` is a path or a file object; with None, the CSV is returned as
+        a string (e.g. for a download button).
+        """
+        if kind == "baseline":
+            header = BASELINE_HEADER
+            rows = ([brief_id, brief] + taglines for brief_id, brief, taglines in self.generations())
+        elif kind == "rankings":
+            header = RANKINGS_HEADER
+            rows = ([brief_id, brief] + ranks for brief_id, brief, ranks in self.rankings())
+        elif kind == "evaluation":
+            header = EVALUATION_HEADER
+            rows = ([pair[column] for column in EVALUATION_HEADER] for pair in self.evaluation_pairs())
+        elif kind == "results":
+            header = RESULTS_HEADER
+            rows = ([result[column] for column in RESULTS_HEADER] for result in self.judgments())
+        else:
+            raise ValueError(f"Unknown export {kind!r}")
+
+        if out is None:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(header)
+            writer.writerows(rows)
+            return buffer.getvalue()
+
+        if hasattr(out, "write"):
+            writer = csv.writer(out)
+            writer.writerow(header)
+            writer.writerows(rows)
+            return out
+
+        out = Path(out)
+        with open(out, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+        if out.parent.resolve() == self.path.parent.resolve():
+            # Our own export is not a legacy edit to re-import
+            with self.conn:
+                self._mark_synced(out)
+        return out
+
+
+def open_db(path=None, data_dir=DATA_DIR):
+    """Open the database in ``data_dir``, importing changed legacy files first."""
+    from brief_store import open_store
+
+    data_dir = Path(data_dir)
+    path = Path(path) if path else data_dir / DB_NAME
+    # Briefs first, since everything else refers to them
+    open_store(path, data_dir / "briefs.json").close()
+    db = Database(path)
+    db.import_legacy(data_dir)
+    return db
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and export the ECD-Eye database.")
+    parser.add_argument("--db", default=str(DEFAULT_DB_FILE), help="path to the SQLite database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("info", help="print row counts and the current model")
+
+    export_parser = subparsers.add_parser("export", help="export a table as CSV")
+    export_parser.add_argument("kind", choices=["baseline", "rankings", "evaluation", "results"])
+    export_parser.add_argument("--output", help="output file (default: stdout)")
+
+    args = parser.parse_args(argv)
+
+    db_file = Path(args.db)
+    with open_db(db_file, db_file.parent) as db:
+        if args.command == "info":
+            for table in ("briefs", "generations", "rankings", "jobs", "models", "judgments", "brief_queue"):
+                count = db.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                print(f"{table:<12} {count:>8}")
+            print(f"Current model: {db.current_model() or '-'}")
+        elif args.command == "export":
+            if args.output:
+                print(f"Exported {args.kind} to {db.export_csv(args.kind, args.output)}")
+            else:
+                db.export_csv(args.kind, sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,138 +1,508 @@
 #!/usr/bin/env python3
 """
 Evaluate baseline and fine-tuned models on hold-out briefs.
+
+Pairs are stored in the pipeline database (see db.py) and exported to
+evaluation.csv, the blind evaluation form and the offline blind evaluation
+page (see blind_page.py). Transient API errors are retried
+with backoff; briefs that still fail are left out and recorded in
+data/dead_letter.jsonl, and ``--retry-failed`` evaluates just those.
+
+With ``--baseline-only``, only the baseline model's side is generated, with
+its A/B position, and staged in data/evaluation_baseline.csv; this needs no
+fine-tuned model, so it can run while a fine-tuning job trains (see
+run_poc.sh). The next full evaluation then reuses the staged taglines and
+only asks the fine-tuned model, provided the baseline model and prompt
+version are unchanged.
+
+With ``--hedge``, requests slower than the observed p95 latency are duplicated
+and the first response wins (see hedging.py).
+
+With ``--matrix``, evaluate K models x N briefs x S samples instead, running
+each model's requests concurrently up to its own limit and writing one row per
+sample to a long-format results file.
+
+``--backend`` (or ``GENERATION_BACKEND``) answers both models with an offline
+backend instead (see backends.py), e.g. for dry runs. In-process backends skip
+the ``REQUEST_INTERVAL`` sleeps, and the matrix sends each model's briefs to
+them in batches.
 """
 
-import os
-import json
 import csv
+import sys
 import time
 import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from dotenv import load_dotenv
-import openai
-from tqdm import tqdm
 
-# Load environment variables
-load_dotenv()
+import config
+import profiling
+from backends import BACKENDS, get_backend
+from blind_page import load_pairs, write_page
+from brief_store import open_store
+from db import open_db
+from profiling import add_profile_argument, profile_run, span
+from prompts import messages, record_usage, usage_summary
+from resilience import CircuitBreaker, RunAborted, call_with_retry, clear_failures, load_failures, record_failure
+from sharding import atomic_csv_writer
 
-# Configure OpenAI API
-openai.api_key = os.getenv("OPENAI_API_KEY")
-BASELINE_MODEL = os.getenv("BASELINE_MODEL", "gpt-3.5-turbo-0125")
+def tagline_request(brief, model, n=1, version=None, temperature=0.9):
+    """Return the ``chat.completions.create`` arguments asking for ``n`` taglines.
+    
+    ``version`` is the prompt template version (default ``PROMPT_VERSION``).
+    """
+    request = {
+        "model": model,
+        "messages": messages("tagline", brief, version=version),
+        "temperature": temperature
+    }
+    if n > 1:
+        request["n"] = n
+    return request
 
-# System prompt for baseline generation
-RULES_V1 = "You are a punchy award-winning copywriter."
+def generate_tagline(brief, model, version=None, temperature=0.9, hedger=None, breaker=None):
+    """Generate a single tagline for a given brief.
+    
+    Pass a ``hedging.Hedger`` to hedge slow requests. Transient errors are
+    retried; anything else, or running out of retries, raises.
+    """
+    create = hedger.create if hedger else get_backend().create
+    with span("network", model=model):
+        request = tagline_request(brief, model, version=version, temperature=temperature)
+        response = call_with_retry(lambda: create(**request), breaker)
+    record_usage("tagline", response.usage, version)
+    
+    return response.choices[0].message.content.strip()
 
-def generate_tagline(brief, model, system_prompt=RULES_V1, temperature=0.9):
-    """Generate a single tagline for a given brief."""
-    try:
-        response = openai.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Write a punchy tagline (≤7 words) for: {brief}"}
-            ],
-            temperature=temperature
-        )
+def generate_samples(brief, model, n, version=None, temperature=0.9, breaker=None):
+    """Generate ``n`` taglines for a brief in a single request.
+    
+    Transient errors are retried; other exceptions propagate so the caller
+    can record the failure.
+    """
+    with span("network", model=model, n=n):
+        request = tagline_request(brief, model, n, version, temperature)
+        response = call_with_retry(lambda: get_backend().create(**request), breaker)
+    record_usage("tagline", response.usage, version)
+    
+    return [choice.message.content.strip() for choice in response.choices]
+
+def write_blind_form(csv_file, blind_form_file):
+    """Write the blind evaluation form from the evaluation CSV."""
+    with open(csv_file, "r", newline="") as source, open(blind_form_file, "w", newline="") as target:
+        reader = csv.DictReader(source)
+        writer = csv.writer(target)
         
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        print(f"Error generating tagline: {e}")
-        return ""
+        # Write header
+        writer.writerow(["brief_id", "brief", "tagline_a", "tagline_b", "preferred_tagline"])
+        
+        # Write data
+        for row in reader:
+            writer.writerow([
+                row["brief_id"],
+                row["brief"],
+                row["randomized_a"],
+                row["randomized_b"],
+                ""  # preferred_tagline (to be filled by ECD)
+            ])
 
-def main():
-    # Create data directory if it doesn't exist
+def parse_model_limits(values):
+    """Parse repeated ``MODEL=N`` options into a dict."""
+    limits = {}
+    for value in values:
+        model, _, limit = value.rpartition("=")
+        if not model or not limit.isdigit() or int(limit) < 1:
+            raise ValueError(f"Invalid model concurrency {value!r}; expected MODEL=N")
+        limits[model] = int(limit)
+    return limits
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_profile_argument(parser)
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="evaluate only briefs in data/dead_letter.jsonl")
+    parser.add_argument("--hedge", action="store_true",
+                        help="duplicate requests slower than the observed p95 latency")
+    parser.add_argument("--hedge-max-extra", type=float, default=0.1, metavar="FRACTION",
+                        help="with --hedge, cap duplicates at this fraction of requests (default: 0.1)")
+    parser.add_argument("--baseline-only", action="store_true",
+                        help="stage the baseline model's taglines now, e.g. while fine-tuning runs")
+    parser.add_argument("--backend", choices=sorted(BACKENDS),
+                        help="generation backend (default: GENERATION_BACKEND, or openai)")
+    matrix = parser.add_argument_group("evaluation matrix")
+    matrix.add_argument("--matrix", action="store_true", help="evaluate models x briefs x samples")
+    matrix.add_argument("--models", help="comma-separated model ids (default: baseline and current fine-tuned model)")
+    matrix.add_argument("--samples", type=int, default=1, help="samples per model and brief (default: 1)")
+    matrix.add_argument("--split", default="eval", help="brief split to evaluate (default: eval)")
+    matrix.add_argument("--concurrency", type=int, default=4, help="concurrent requests per model (default: 4)")
+    matrix.add_argument("--model-concurrency", action="append", default=[], metavar="MODEL=N",
+                        help="concurrency for one model; may be repeated")
+    matrix.add_argument("--output", default=None, help="results file (default: data/evaluation_matrix.csv)")
+    args = parser.parse_args(argv)
+    if args.samples < 1:
+        parser.error("--samples must be at least 1")
+    
+    try:
+        model_limits = parse_model_limits(args.model_concurrency)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.backend:
+        config.use_generation_backend(args.backend)
+    try:
+        backend = get_backend()
+    except (ValueError, RuntimeError) as e:
+        print(f"Error: {e}")
+        return 1
+    if args.hedge and not backend.remote:
+        print(f"Note: --hedge has no effect with the {backend.name} backend")
+        args.hedge = False
+    
+    with profile_run("evaluate_models", args.profile):
+        try:
+            if args.matrix:
+                models = args.models.split(",") if args.models else None
+                return run_matrix(models, args.samples, args.split, args.concurrency, model_limits, args.output)
+            if args.baseline_only:
+                return run_baseline(args.hedge, args.hedge_max_extra)
+            return run(args.hedge, args.hedge_max_extra, args.retry_failed)
+        except RunAborted as e:
+            print(f"Error: {e}")
+            return 1
+
+BASELINE_STAGE_HEADER = ["brief_id", "brief", "baseline_model", "prompt_version", "baseline_tagline", "is_a_baseline"]
+
+def baseline_stage_file(data_dir):
+    return Path(data_dir) / "evaluation_baseline.csv"
+
+def load_staged_baseline(data_dir, baseline_model):
+    """Return ``{brief_id: (brief, tagline, is_a_baseline)}`` staged by ``--baseline-only``.
+    
+    Rows staged with another baseline model or prompt version are ignored.
+    """
+    stage_file = baseline_stage_file(data_dir)
+    if not stage_file.exists():
+        return {}
+    with open(stage_file, "r", newline="") as f:
+        return {
+            int(row["brief_id"]): (row["brief"], row["baseline_tagline"], row["is_a_baseline"] == "True")
+            for row in csv.DictReader(f)
+            if row["baseline_model"] == baseline_model and row["prompt_version"] == config.prompt_version()
+        }
+
+def discard_staged(data_dir, brief_ids):
+    """Drop the staged baseline rows of ``brief_ids``; remove the file once none are left."""
+    stage_file = baseline_stage_file(data_dir)
+    brief_ids = {str(brief_id) for brief_id in brief_ids}
+    if not brief_ids or not stage_file.exists():
+        return
+    with open(stage_file, "r", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        remaining = [row for row in reader if row[0] not in brief_ids]
+    if not remaining:
+        stage_file.unlink()
+        return
+    with atomic_csv_writer(stage_file, BASELINE_STAGE_HEADER) as writer:
+        writer.writerows(remaining)
+
+def run_baseline(hedge=False, hedge_max_extra=0.1):
+    """Generate and stage the baseline side of every evaluation pair."""
+    from tqdm import tqdm
+    
+    baseline_model = config.baseline_model()
+    backend = get_backend()
+    hedger = None
+    if hedge:
+        from hedging import Hedger
+        hedger = Hedger(max_extra=hedge_max_extra)
+    
     data_dir = Path(__file__).parent.parent / "data"
     data_dir.mkdir(exist_ok=True)
+    stage_file = baseline_stage_file(data_dir)
     
-    # Load briefs
-    briefs_file = data_dir / "briefs.json"
-    with open(briefs_file, "r") as f:
-        briefs_data = json.load(f)
+    with span("load"):
+        store = open_store()
+        n_briefs = store.count("eval")
     
-    evaluation_briefs = briefs_data["evaluation_briefs"]
+    breaker = CircuitBreaker()
+    n_failed = 0
+    with store, atomic_csv_writer(stage_file, BASELINE_STAGE_HEADER) as writer:
+        for brief in tqdm(store.iter_briefs("eval"), total=n_briefs, desc="Evaluating baseline"):
+            with span("generate", brief_id=brief["id"]):
+                try:
+                    tagline = generate_tagline(brief["brief"], baseline_model, hedger=hedger, breaker=breaker)
+                except RunAborted:
+                    raise
+                except Exception as e:
+                    # Left for the full evaluation to generate
+                    print(f"Error generating tagline for brief {brief['id']} with {baseline_model}: {e}")
+                    n_failed += 1
+                    continue
+            
+            # The A/B position is fixed now so the fine-tuned side only fills in its tagline
+            with span("write"):
+                writer.writerow([
+                    brief["id"], brief["brief"], baseline_model, config.prompt_version(), tagline,
+                    random.choice([True, False])
+                ])
+            
+            if backend.remote:
+                profiling.sleep(config.request_interval())
     
-    # Load fine-tuned model ID
-    model_id_file = data_dir / "model_id.txt"
-    if not model_id_file.exists():
-        print(f"Error: Fine-tuned model ID not found at {model_id_file}")
-        return
+    if usage_summary():
+        print(usage_summary())
+    if hedger:
+        print(hedger.summary())
+    if n_failed:
+        print(f"Warning: {n_failed} briefs failed; the full evaluation will generate them")
+    print(f"Baseline taglines for {n_briefs - n_failed} briefs staged in {stage_file}")
+    return 0
+
+def run(hedge=False, hedge_max_extra=0.1, retry_failed=False):
+    from tqdm import tqdm
+    
+    baseline_model = config.baseline_model()
+    backend = get_backend()
+    hedger = None
+    if hedge:
+        from hedging import Hedger
+        hedger = Hedger(max_extra=hedge_max_extra)
     
-    with open(model_id_file, "r") as f:
-        fine_tuned_model = f.read().strip()
+    # Create data directory if it doesn't exist
+    data_dir = Path(__file__).parent.parent / "data"
+    data_dir.mkdir(exist_ok=True)
+    
+    # Load fine-tuned model ID
+    db = open_db(data_dir=data_dir)
+    fine_tuned_model = db.current_model()
+    if fine_tuned_model is None:
+        print(f"Error: No fine-tuned model found in {db.path}; run submit_finetune.py first")
+        db.close()
+        return 1
     
     print(f"Using fine-tuned model: {fine_tuned_model}")
     
-    # Prepare CSV file
-    csv_file = data_dir / "evaluation.csv"
-    with open(csv_file, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            "brief_id", 
-            "brief", 
-            "baseline_tagline", 
-            "finetuned_tagline", 
-            "randomized_a", 
-            "randomized_b", 
-            "is_a_baseline"
-        ])
-        
+    # Baseline taglines staged while the fine-tuning job ran
+    staged = load_staged_baseline(data_dir, baseline_model)
+    reused_ids = []
+    
+    # Open the brief store
+    with span("load"):
+        store = open_store()
+        briefs = store.iter_briefs("eval")
+        n_briefs = store.count("eval")
+    
+    if retry_failed:
+        # Evaluate just the dead-lettered briefs, keeping the existing pairs
+        failed_ids = set(load_failures("evaluate_models"))
+        if not failed_ids:
+            print("No failed briefs to retry.")
+            store.close()
+            db.close()
+            return
+        briefs = (brief for brief in briefs if brief["id"] in failed_ids)
+        n_briefs = len(failed_ids)
+    
+    # Pause requests when the error rate spikes
+    breaker = CircuitBreaker()
+    written_ids = []
+    failures = []
+    
+    with store, db:
         # Generate taglines for each brief
-        for brief in tqdm(evaluation_briefs, desc="Evaluating models"):
+        for brief in tqdm(briefs, total=n_briefs, desc="Evaluating models"):
             brief_id = brief["id"]
             brief_text = brief["brief"]
             
-            # Generate taglines
-            baseline_tagline = generate_tagline(brief_text, BASELINE_MODEL)
-            time.sleep(1)  # Avoid rate limiting
-            finetuned_tagline = generate_tagline(brief_text, fine_tuned_model)
-            
-            # Randomize order for blind evaluation
-            is_a_baseline = random.choice([True, False])
-            if is_a_baseline:
-                tagline_a = baseline_tagline
-                tagline_b = finetuned_tagline
-            else:
-                tagline_a = finetuned_tagline
-                tagline_b = baseline_tagline
+            # Generate taglines; a brief missing either tagline is dead-lettered
+            with span("generate", brief_id=brief_id):
+                model = baseline_model
+                reused = brief_id in staged and staged[brief_id][0] == brief_text
+                try:
+                    if reused:
+                        _, baseline_tagline, is_a_baseline = staged[brief_id]
+                    else:
+                        baseline_tagline = generate_tagline(brief_text, model, hedger=hedger, breaker=breaker)
+                        is_a_baseline = random.choice([True, False])
+                        if backend.remote:
+                            profiling.sleep(config.request_interval())  # Avoid rate limiting
+                    model = fine_tuned_model
+                    finetuned_tagline = generate_tagline(brief_text, model, hedger=hedger, breaker=breaker)
+                except RunAborted:
+                    raise
+                except Exception as e:
+                    print(f"Error generating tagline for brief {brief_id} with {model}: {e}")
+                    failures.append((brief_id, brief_text, e, model))
+                    continue
             
-            # Write to CSV
-            writer.writerow([
-                brief_id,
-                brief_text,
-                baseline_tagline,
-                finetuned_tagline,
-                tagline_a,
-                tagline_b,
-                is_a_baseline
-            ])
+            # Randomize order for blind evaluation and store the pair
+            with span("write"):
+                db.save_evaluations([{
+                    "brief_id": brief_id,
+                    "baseline_model": baseline_model,
+                    "finetuned_model": fine_tuned_model,
+                    "baseline_tagline": baseline_tagline,
+                    "finetuned_tagline": finetuned_tagline,
+                    "is_a_baseline": is_a_baseline
+                }])
+            written_ids.append(brief_id)
+            if reused:
+                reused_ids.append(brief_id)
             
             # Sleep to avoid rate limiting
-            time.sleep(1)
+            if backend.remote:
+                profiling.sleep(config.request_interval())
+        
+        # Export every pair for this model, including earlier runs
+        csv_file = data_dir / "evaluation.csv"
+        with span("export"):
+            db.export_csv("evaluation", csv_file)
+    
+    # Dead-letter permanent failures instead of writing blank taglines
+    clear_failures("evaluate_models", written_ids)
+    for brief_id, brief_text, error, model in failures:
+        record_failure("evaluate_models", brief_id, brief_text, error, model)
+    if failures:
+        print(f"Warning: {len(failures)} briefs failed and were recorded in data/dead_letter.jsonl; "
+              "re-run them with --retry-failed")
     
-    print(f"Evaluation results saved to {csv_file}")
+    # Staged taglines are used once, like freshly generated ones; those of
+    # failed or skipped briefs stay staged for --retry-failed
+    if reused_ids:
+        discard_staged(data_dir, reused_ids)
+        print(f"Reused {len(reused_ids)} staged baseline taglines")
+    
+    print(f"Evaluation results saved to {db.path} and {csv_file}")
+    if usage_summary():
+        print(usage_summary())
+    if hedger:
+        print(hedger.summary())
     
     # Create a blind evaluation form
     blind_form_file = data_dir / "blind_evaluation_form.csv"
-    with open(csv_file, "r") as source, open(blind_form_file, "w", newline="") as target:
-        reader = csv.reader(source)
-        writer = csv.writer(target)
-        
-        # Write header
-        header = next(reader)
-        writer.writerow(["brief_id", "brief", "tagline_a", "tagline_b", "preferred_tagline"])
-        
-        # Write data
-        for row in reader:
-            writer.writerow([
-                row[0],  # brief_id
-                row[1],  # brief
-                row[3],  # tagline_a
-                row[4],  # tagline_b
-                ""       # preferred_tagline (to be filled by ECD)
-            ])
+    with span("blind_form"):
+        write_blind_form(csv_file, blind_form_file)
     
     print(f"Blind evaluation form saved to {blind_form_file}")
+    
+    # And the offline page for judging in a browser
+    with span("blind_page"):
+        blind_page_file = write_page(load_pairs(csv_file), data_dir / "blind_evaluation.html")
+    
+    print(f"Blind evaluation page saved to {blind_page_file}")
+    return 0
+
+MATRIX_HEADER = ["model", "brief_id", "sample", "tagline", "latency_s", "error"]
+
+def evaluate_pair(brief, model, samples, breaker=None):
+    """Return matrix rows for one model and brief."""
+    start = time.perf_counter()
+    try:
+        taglines = generate_samples(brief["brief"], model, samples, breaker=breaker)
+        error = ""
+    except RunAborted:
+        raise
+    except Exception as e:
+        taglines = []
+        error = f"{type(e).__name__}: {e}"
+    latency = round(time.perf_counter() - start, 3)
+    
+    return matrix_rows(brief, model, samples, taglines, latency, error)
+
+def matrix_rows(brief, model, samples, taglines, latency, error=""):
+    # Pad so every (model, brief, sample) cell has a row
+    taglines = taglines + [""] * (samples - len(taglines))
+    return [
+        [model, brief["id"], sample, tagline, latency, error]
+        for sample, tagline in enumerate(taglines[:samples])
+    ]
+
+def evaluate_batch(briefs, model, samples, backend):
+    """Return matrix rows for a batch of briefs answered by one ``create_many`` call.
+    
+    Every row gets the batch's latency.
+    """
+    requests = [tagline_request(brief["brief"], model, samples) for brief in briefs]
+    start = time.perf_counter()
+    try:
+        with span("inference", model=model, briefs=len(briefs)):
+            responses = backend.create_many(requests)
+        error = ""
+    except Exception as e:
+        responses = [None] * len(briefs)
+        error = f"{type(e).__name__}: {e}"
+    latency = round(time.perf_counter() - start, 3)
+    rows = []
+    for brief, response in zip(briefs, responses):
+        if response:
+            record_usage("tagline", response.usage)
+        taglines = [choice.message.content.strip() for choice in response.choices] if response else []
+        rows.append(matrix_rows(brief, model, samples, taglines, latency, error))
+    return rows
+
+def run_matrix(models, samples, split, concurrency, model_limits, output=None):
+    """Evaluate every model on every brief, ``samples`` taglines per pair."""
+    from tqdm import tqdm
+    
+    data_dir = Path(__file__).parent.parent / "data"
+    data_dir.mkdir(exist_ok=True)
+    
+    if not models:
+        models = [config.baseline_model()]
+        with open_db(data_dir=data_dir) as db:
+            if db.current_model():
+                models.append(db.current_model())
+    
+    with span("load"), open_store() as store:
+        briefs = list(store.iter_briefs(split))
+    
+    print(f"Evaluating {len(models)} models x {len(briefs)} briefs x {samples} samples")
+    csv_file = Path(output) if output else data_dir / "evaluation_matrix.csv"
+    
+    backend = get_backend()
+    pools = {}
+    if backend.batched:
+        # In-process backends take a batch of briefs per call instead of a request pool
+        results = (
+            rows
+            for model in models
+            for start in range(0, len(briefs), backend.prefetch)
+            for rows in evaluate_batch(briefs[start:start + backend.prefetch], model, samples, backend)
+        )
+    else:
+        # One pool per model so each model gets its own concurrency limit
+        pools = {
+            model: ThreadPoolExecutor(max_workers=model_limits.get(model, concurrency))
+            for model in models
+        }
+        breaker = CircuitBreaker()
+        futures = [
+            pools[model].submit(evaluate_pair, brief, model, samples, breaker)
+            for model in models
+            for brief in briefs
+        ]
+        # Written in submission order, like the batched path, so the file is deterministic
+        results = (future.result() for future in futures)
+    
+    n_errors = 0
+    try:
+        with span("generate"), atomic_csv_writer(csv_file, MATRIX_HEADER) as writer:
+            for rows in tqdm(results, total=len(models) * len(briefs), desc="Evaluating matrix"):
+                n_errors += bool(rows[0][-1])
+                with span("write"):
+                    writer.writerows(rows)
+    finally:
+        for pool in pools.values():
+            pool.shutdown(cancel_futures=True)
+    
+    print(f"Evaluation matrix saved to {csv_file}")
+    if usage_summary():
+        print(usage_summary())
+    if n_errors:
+        print(f"Warning: {n_errors} model/brief requests failed; see the error column")
+        return 1
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
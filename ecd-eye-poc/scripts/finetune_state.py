@@ -0,0 +1,74 @@
+"""
+Bookkeeping for incremental fine-tuning.
+
+``data/finetune_state.json`` records which training examples each fine-tuned
+model has already seen, keyed by brief id and chosen tagline, so that
+``prepare_finetune.py --incremental`` can emit only the delta. Keys for a
+prepared delta are kept in ``fine_tune_delta.pending.json`` and only become
+"trained" once ``submit_finetune.py --incremental`` succeeds. A full
+``fine_tune.jsonl`` run keeps its keys in ``fine_tune.pending.json``; when it
+succeeds they replace the trained keys, since the new model starts from the
+base model and has seen exactly those examples.
+"""
+
+import hashlib
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+STATE_FILE = DATA_DIR / "finetune_state.json"
+DELTA_FILE = DATA_DIR / "fine_tune_delta.jsonl"
+PENDING_FILE = DATA_DIR / "fine_tune_delta.pending.json"
+FULL_PENDING_FILE = DATA_DIR / "fine_tune.pending.json"
+
+
+def example_key(brief_id, tagline):
+    """Stable key for a (brief, chosen tagline) training example."""
+    digest = hashlib.sha1(tagline.encode("utf-8")).hexdigest()[:12]
+    return f"{int(brief_id)}:{digest}"
+
+
+def load_state(state_file=STATE_FILE):
+    if Path(state_file).exists():
+        with open(state_file, "r") as f:
+            return json.load(f)
+    return {"trained_keys": [], "history": []}
+
+
+def save_state(state, state_file=STATE_FILE):
+    tmp_file = Path(state_file).with_suffix(".tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(state, f, indent=2)
+    tmp_file.replace(state_file)
+
+
+def write_pending(keys, pending_file=PENDING_FILE):
+    with open(pending_file, "w") as f:
+        json.dump({"keys": sorted(keys)}, f)
+
+
+def commit_pending(model_id, job_id, base_model, pending_file=PENDING_FILE, state_file=STATE_FILE,
+                   full=False):
+    """Mark the pending examples as trained into ``model_id``; return the key count.
+
+    ``full`` replaces the trained keys instead of adding to them.
+    """
+    with open(pending_file, "r") as f:
+        keys = json.load(f)["keys"]
+
+    state = load_state(state_file)
+    trained = set() if full else set(state["trained_keys"])
+    trained.update(keys)
+    state["trained_keys"] = sorted(trained)
+    state["history"].append({
+        "model_id": model_id,
+        "base_model": base_model,
+        "job_id": job_id,
+        "full": full,
+        "n_new_examples": len(keys),
+        "trained_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    })
+    save_state(state, state_file)
+    Path(pending_file).unlink()
+    return len(keys)
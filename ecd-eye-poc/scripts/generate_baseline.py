@@ -1,91 +1,432 @@
 #!/usr/bin/env python3
 """
 Generate baseline taglines using GPT-3.5-Turbo with a static prompt.
+
+The finished baseline.csv is imported into the pipeline database (see
+db.py). Transient API errors are retried with backoff. Briefs that still fail
+are left out and recorded in data/dead_letter.jsonl; re-run just those with
+``--retry-failed``.
+
+``--backend`` (or ``GENERATION_BACKEND``) switches to an offline backend (see
+backends.py); in-process backends generate many briefs per batch and skip
+the ``REQUEST_INTERVAL`` sleeps.
+
+``--overgenerate S`` asks for S sets of five taglines per brief (the API's
+``n``) and keeps the five the local scorer ranks best (see scorer.py).
 """
 
-import os
-import json
 import csv
-import time
+import sys
+import argparse
+import itertools
+import subprocess
 from pathlib import Path
-from dotenv import load_dotenv
-import openai
-from tqdm import tqdm
 
-# Load environment variables
-load_dotenv()
+import config
+import profiling
+from backends import BACKENDS, get_backend
+from brief_store import open_store
+from db import open_db
+from profiling import add_profile_argument, profile_run, span
+from resilience import CircuitBreaker, RunAborted, call_with_retry, clear_failures, load_failures, record_failure
+from prompts import messages, record_usage, usage_summary
+from retrieval import RetrievalIndex
+from router import BudgetExceeded, Router
+from scorer import get_scorer
+from sharding import atomic_csv_writer, merge_shards, parse_shard, shard_file, shard_of
 
-# Configure OpenAI API
-openai.api_key = os.getenv("OPENAI_API_KEY")
-MODEL = os.getenv("BASELINE_MODEL", "gpt-3.5-turbo-0125")
+BASELINE_HEADER = ["brief_id", "brief", "tagline_1", "tagline_2", "tagline_3", "tagline_4", "tagline_5"]
 
-# System prompt for baseline generation
-RULES_V1 = "You are a punchy award-winning copywriter."
+def parse_lines(content):
+    """Split a completion into taglines, dropping bullets and blank lines."""
+    return [line.strip("• ").strip() for line in content.split("\n") if line.strip()]
 
-def generate_lines(brief, model=MODEL, temperature=0.9):
-    """Generate 5 taglines for a given brief."""
-    try:
-        response = openai.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": RULES_V1},
-                {"role": "user", "content": f"Write five punchy taglines (≤7 words) for: {brief}"}
-            ],
-            temperature=temperature
-        )
-        
-        # Extract taglines from the response
-        content = response.choices[0].message.content
-        lines = [line.strip("• ").strip() for line in content.split("\n") if line.strip()]
-        
-        # Ensure we have exactly 5 taglines
-        if len(lines) < 5:
-            print(f"Warning: Only generated {len(lines)} taglines for brief: {brief}")
-            # Pad with empty strings if needed
-            lines.extend([""] * (5 - len(lines)))
-        elif len(lines) > 5:
-            print(f"Warning: Generated {len(lines)} taglines, truncating to 5 for brief: {brief}")
-            lines = lines[:5]
-            
+def lines_request(brief, model=None, temperature=0.9, examples=None, n=1):
+    """Return the ``chat.completions.create`` arguments asking for a brief's taglines.
+    
+    ``examples`` are retrieved few-shot examples (see retrieval.py) that are
+    placed in the prompt ahead of the brief; ``n`` asks for that many sets.
+    """
+    request = {
+        "model": model or config.baseline_model(),
+        "messages": messages("taglines", brief, examples),
+        "temperature": temperature
+    }
+    if n > 1:
+        request["n"] = n
+    return request
+
+def response_lines(response):
+    """The taglines of every choice in a response."""
+    return [line for choice in response.choices for line in parse_lines(choice.message.content)]
+
+def request_lines(brief, model=None, temperature=0.9, examples=None, n=1):
+    """Request taglines for a brief; return the raw lines and token usage.
+    
+    Exceptions propagate; retries are left to the caller (see resilience.py).
+    """
+    request = lines_request(brief, model, temperature, examples, n)
+    with span("network", model=request["model"]):
+        response = get_backend().create(**request)
+    record_usage("taglines", response.usage)
+    
+    # Extract taglines from the response
+    return response_lines(response), response.usage
+
+def best_lines(lines, overgenerate):
+    """Keep the 5 best-scored distinct lines when over-generating."""
+    if overgenerate <= 1:
         return lines
-    except Exception as e:
-        print(f"Error generating taglines: {e}")
-        # Return empty strings in case of error
-        return [""] * 5
+    with span("score", taglines=len(lines)):
+        return get_scorer().top(lines, 5)
 
-def main():
+def generate_lines(brief, model=None, temperature=0.9, examples=None, breaker=None, overgenerate=1):
+    """Generate 5 taglines for a given brief.
+    
+    Transient errors are retried; anything else, or running out of retries,
+    raises.
+    """
+    lines, _ = call_with_retry(lambda: request_lines(brief, model, temperature, examples, overgenerate), breaker)
+    return five_lines(best_lines(lines, overgenerate), brief)
+
+def generate_batched(items, model=None, temperature=0.9, overgenerate=1):
+    """Generate 5 taglines for each ``(brief, examples)`` in one ``create_many`` call."""
+    backend = get_backend()
+    requests = [lines_request(brief, model, temperature, examples, overgenerate) for brief, examples in items]
+    with span("inference", briefs=len(requests)):
+        responses = backend.create_many(requests)
+    for response in responses:
+        record_usage("taglines", response.usage)
+    return [
+        five_lines(best_lines(response_lines(response), overgenerate), brief)
+        for (brief, _), response in zip(items, responses)
+    ]
+
+def five_lines(lines, brief):
+    """Pad or truncate ``lines`` to exactly 5 taglines, with a warning."""
+    if len(lines) < 5:
+        print(f"Warning: Only generated {len(lines)} taglines for brief: {brief}")
+        # Pad with empty strings if needed
+        lines.extend([""] * (5 - len(lines)))
+    elif len(lines) > 5:
+        print(f"Warning: Generated {len(lines)} taglines, truncating to 5 for brief: {brief}")
+        lines = lines[:5]
+    
+    return lines
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_profile_argument(parser)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--shard", metavar="I/N", help="generate only shard I of N into data/shards/")
+    mode.add_argument("--workers", type=int, metavar="N", help="run N shard worker processes, then merge")
+    mode.add_argument("--merge", type=int, metavar="N", help="merge N shard files into baseline.csv")
+    mode.add_argument("--retry-failed", action="store_true",
+                      help="regenerate only briefs in data/dead_letter.jsonl and merge them into baseline.csv")
+    parser.add_argument("--few-shot", type=int, default=0, metavar="K",
+                        help="prompt with top-ranked taglines of the K most similar ranked briefs")
+    parser.add_argument("--route", nargs="?", const="", metavar="MODELS",
+                        help="route through comma-separated models, cheapest first, escalating "
+                             "briefs that fail local checks (default: ROUTER_MODELS)")
+    parser.add_argument("--budget", type=float, metavar="USD",
+                        help="with --route, stop spending once the run has cost this much")
+    parser.add_argument("--backend", choices=sorted(BACKENDS),
+                        help="generation backend (default: GENERATION_BACKEND, or openai)")
+    parser.add_argument("--overgenerate", type=int, default=1, metavar="S",
+                        help="request S sets of taglines per brief and keep the 5 the local scorer ranks best")
+    args = parser.parse_args(argv)
+    
+    if args.backend:
+        # Also inherited by --workers shard processes
+        config.use_generation_backend(args.backend)
+    
+    route = None
+    if args.route is not None:
+        route = args.route.split(",") if args.route else config.router_models()
+    elif args.budget is not None:
+        parser.error("--budget requires --route")
+    if args.overgenerate < 1:
+        parser.error("--overgenerate must be at least 1")
+    if args.overgenerate > 1 and route:
+        parser.error("--overgenerate cannot be combined with --route")
+    
+    shard = None
+    profile_name = "generate_baseline"
+    if args.shard:
+        try:
+            shard = parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+        profile_name += f"-shard{shard[0]}"
+    
+    with profile_run(profile_name, args.profile):
+        if args.workers:
+            return run_workers(args.workers, args.profile, args.few_shot, args.route, args.budget, args.overgenerate)
+        if args.merge:
+            return merge(args.merge)
+        try:
+            return run(shard, args.few_shot, route, args.budget, args.retry_failed, args.overgenerate)
+        except RunAborted as e:
+            # Nothing is written; the briefs are not dead-lettered, as they never had a chance
+            print(f"Error: {e}")
+            return 1
+
+def save_to_db(csv_file, model=None):
+    """Import a finished baseline.csv into the pipeline database."""
+    with span("save"), open_db() as db:
+        n_briefs = db.import_generations_csv(csv_file, model)
+    print(f"Stored taglines for {n_briefs} briefs in {db.path}")
+
+def run(shard=None, few_shot=0, route=None, budget=None, retry_failed=False, overgenerate=1):
+    from tqdm import tqdm
+    
+    if overgenerate > 1 and get_scorer() is None:
+        print("Error: --overgenerate needs a trained scorer; run 'scorer.py train' first")
+        return 1
+    
     # Create data directory if it doesn't exist
     data_dir = Path(__file__).parent.parent / "data"
     data_dir.mkdir(exist_ok=True)
     
-    # Load briefs
-    briefs_file = data_dir / "briefs.json"
-    with open(briefs_file, "r") as f:
-        briefs_data = json.load(f)
+    # Open the brief store
+    with span("load"):
+        store = open_store()
+        briefs = store.iter_briefs("train")
+        n_briefs = store.count("train")
+        index = RetrievalIndex() if few_shot else None
     
-    training_briefs = briefs_data["training_briefs"]
+    if shard:
+        # Each shard uses its own API key / rate budget and writes its own partial file
+        shard_index, shard_count = shard
+        config.use_shard_settings(shard_index)
+        briefs = (brief for brief in briefs if shard_of(brief["id"], shard_count) == shard_index)
+        n_briefs = None
+        csv_file = shard_file(data_dir / "shards", "baseline", shard_index, shard_count)
+        desc = f"Generating taglines (shard {shard_index}/{shard_count})"
+    elif retry_failed:
+        # Only the dead-lettered briefs, merged into baseline.csv afterwards
+        failed_ids = set(load_failures("generate_baseline"))
+        if not failed_ids:
+            print("No failed briefs to retry.")
+            return
+        briefs = (brief for brief in briefs if brief["id"] in failed_ids)
+        n_briefs = len(failed_ids)
+        csv_file = data_dir / "shards" / "baseline.retry.csv"
+        desc = "Retrying failed briefs"
+    else:
+        csv_file = data_dir / "baseline.csv"
+        desc = "Generating taglines"
     
-    # Prepare CSV file
-    csv_file = data_dir / "baseline.csv"
-    with open(csv_file, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["brief_id", "brief", "tagline_1", "tagline_2", "tagline_3", "tagline_4", "tagline_5"])
-        
-        # Generate taglines for each brief
-        for brief in tqdm(training_briefs, desc="Generating taglines"):
-            brief_id = brief["id"]
-            brief_text = brief["brief"]
-            
-            # Generate taglines
-            taglines = generate_lines(brief_text)
-            
-            # Write to CSV
-            writer.writerow([brief_id, brief_text] + taglines)
+    try:
+        backend = get_backend()
+    except (ValueError, RuntimeError) as e:
+        print(f"Error: {e}")
+        return 1
+    
+    # Pause every worker when the error rate spikes
+    breaker = CircuitBreaker()
+    
+    # Cheapest model first; briefs failing local checks are escalated later
+    router = None
+    if route:
+        router = Router(
+            route,
+            lambda brief, model: call_with_retry(
+                lambda: request_lines(brief["brief"], model, examples=brief["examples"]), breaker
+            ),
+            budget=budget,
+        )
+        print(f"Routing through {' -> '.join(route)}")
+    
+    # Prepare CSV file; it only appears once every brief is written
+    written_ids = []
+    failures = []
+    budget_error = None
+    try:
+        with store, atomic_csv_writer(csv_file, BASELINE_HEADER) as writer:
+            # Generate taglines for each brief, streaming from the store
+            if backend.batched and not router:
+                results = generate_chunks(briefs, index, few_shot, backend.prefetch, overgenerate)
+            else:
+                results = generate_each(briefs, index, few_shot, router, breaker, overgenerate)
+            for brief_id, brief_text, taglines, error in tqdm(results, total=n_briefs, desc=desc):
+                if isinstance(error, BudgetExceeded):
+                    # Nothing was requested; keep what is paid for and dead-letter the rest
+                    if budget_error is None:
+                        budget_error = error
+                        print(f"Error: {error}; remaining briefs are recorded for --retry-failed")
+                    failures.append((brief_id, brief_text, error))
+                    continue
+                if error is not None:
+                    print(f"Error generating taglines for brief {brief_id}: {error}")
+                    failures.append((brief_id, brief_text, error))
+                
+                # Write to CSV; escalated briefs are written once resolved
+                if taglines is not None:
+                    with span("write"):
+                        writer.writerow([brief_id, brief_text] + taglines)
+                    written_ids.append(brief_id)
+                
+                # Sleep to avoid rate limiting
+                if backend.remote:
+                    profiling.sleep(config.request_interval())
             
-            # Sleep to avoid rate limiting
-            time.sleep(1)
+            if router:
+                # Retry failing briefs on stronger models, worst first
+                for brief, taglines in tqdm(router.escalate(), desc="Escalating"):
+                    if taglines is None:
+                        failures.append((brief["id"], brief["brief"], RuntimeError("every routed model failed")))
+                        continue
+                    with span("write"):
+                        writer.writerow([brief["id"], brief["brief"]] + taglines)
+                    written_ids.append(brief["id"])
+                    if backend.remote:
+                        profiling.sleep(config.request_interval())
+    finally:
+        if router:
+            print(router.summary())
+    
+    # Dead-letter permanent failures instead of writing blank taglines
+    for brief_id, brief_text, error in failures:
+        record_failure("generate_baseline", brief_id, brief_text, error, ",".join(route or [config.baseline_model()]))
+    if breaker.trips:
+        print(f"Circuit breaker opened {breaker.trips} times")
+    if failures:
+        print(f"Warning: {len(failures)} briefs failed and were recorded in data/dead_letter.jsonl; "
+              "re-run them with --retry-failed")
     
+    if retry_failed:
+        # Merge the retried briefs into baseline.csv, leaving out those still failing
+        with open_store() as store:
+            expected_ids = [brief["id"] for brief in store.iter_briefs("train")]
+        failed_ids = set(load_failures("generate_baseline")) - set(written_ids)
+        sources = [path for path in (data_dir / "baseline.csv", csv_file) if path.exists()]
+        try:
+            with span("merge"):
+                merge_shards(sources, expected_ids, data_dir / "baseline.csv", optional_ids=failed_ids)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return 1
+        csv_file.unlink()
+        csv_file = data_dir / "baseline.csv"
+    
+    # Briefs that succeeded this time are no longer dead letters (for shards,
+    # merge() does this once all workers have finished appending)
+    if not shard:
+        clear_failures("generate_baseline", written_ids)
+    if usage_summary():
+        print(usage_summary())
     print(f"Generated taglines saved to {csv_file}")
+    if not shard:
+        save_to_db(csv_file, ",".join(route or [config.baseline_model()]))
+    if budget_error is not None:
+        return 1
+
+def retrieve_examples(index, brief, few_shot):
+    """Few-shot examples from similar ranked briefs, or None without an index."""
+    if index is None:
+        return None
+    with span("retrieve"):
+        return index.few_shot_examples(brief["brief"], few_shot, exclude_ids=[brief["id"]])
+
+def generate_each(briefs, index, few_shot, router=None, breaker=None, overgenerate=1):
+    """Yield ``(brief_id, brief, taglines, error)``, one request per brief.
+    
+    Routed briefs that are escalated yield None taglines until resolved. Once
+    the router's budget is spent, this and every later brief yield the
+    ``BudgetExceeded`` error without a request.
+    """
+    briefs = iter(briefs)
+    for brief in briefs:
+        examples = retrieve_examples(index, brief, few_shot)
+        taglines = error = None
+        with span("generate", brief_id=brief["id"]):
+            if router:
+                try:
+                    taglines = router.submit({"id": brief["id"], "brief": brief["brief"], "examples": examples})
+                except BudgetExceeded as e:
+                    for unsent in itertools.chain([brief], briefs):
+                        yield unsent["id"], unsent["brief"], None, e
+                    return
+            else:
+                try:
+                    taglines = generate_lines(
+                        brief["brief"], examples=examples, breaker=breaker, overgenerate=overgenerate
+                    )
+                except RunAborted:
+                    raise
+                except Exception as e:
+                    error = e
+        yield brief["id"], brief["brief"], taglines, error
+
+def generate_chunks(briefs, index, few_shot, size, overgenerate=1):
+    """Yield ``(brief_id, brief, taglines, error)``, generating ``size`` briefs per batch."""
+    briefs = iter(briefs)
+    while True:
+        chunk = list(itertools.islice(briefs, size))
+        if not chunk:
+            return
+        items = [(brief["brief"], retrieve_examples(index, brief, few_shot)) for brief in chunk]
+        with span("generate", briefs=len(chunk)):
+            try:
+                results = [(taglines, None) for taglines in generate_batched(items, overgenerate=overgenerate)]
+            except Exception as e:
+                results = [(None, e)] * len(chunk)
+        for brief, (taglines, error) in zip(chunk, results):
+            yield brief["id"], brief["brief"], taglines, error
+
+def run_workers(count, profile_dir=None, few_shot=0, route=None, budget=None, overgenerate=1):
+    """Run ``count`` shard workers as separate processes, then merge."""
+    workers = []
+    for index in range(count):
+        command = [sys.executable, __file__, "--shard", f"{index}/{count}"]
+        if profile_dir:
+            command += ["--profile", profile_dir]
+        if few_shot:
+            command += ["--few-shot", str(few_shot)]
+        if route is not None:
+            command += ["--route", route]
+        if budget is not None:
+            # Split the run budget evenly between shards
+            command += ["--budget", str(budget / count)]
+        if overgenerate > 1:
+            command += ["--overgenerate", str(overgenerate)]
+        workers.append(subprocess.Popen(command))
+    
+    failed = [index for index, worker in enumerate(workers) if worker.wait() != 0]
+    if failed:
+        print(f"Error: Shard workers failed: {failed}")
+        return 1
+    return merge(count)
+
+def merge(count):
+    """Merge shard files into baseline.csv in brief order."""
+    data_dir = Path(__file__).parent.parent / "data"
+    with open_store() as store:
+        expected_ids = [brief["id"] for brief in store.iter_briefs("train")]
+    
+    # Dead-lettered briefs may have no rows; they are merged in by --retry-failed
+    failed_ids = set(load_failures("generate_baseline"))
+    
+    shard_files = [shard_file(data_dir / "shards", "baseline", index, count) for index in range(count)]
+    csv_file = data_dir / "baseline.csv"
+    try:
+        with span("merge"):
+            n_rows = merge_shards(shard_files, expected_ids, csv_file, optional_ids=failed_ids)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+    
+    # Briefs with a row are no longer dead letters
+    with open(csv_file, "r", newline="") as f:
+        merged_ids = [int(row[0]) for row in list(csv.reader(f))[1:]]
+    clear_failures("generate_baseline", merged_ids)
+    if len(merged_ids) < len(expected_ids):
+        print(f"Warning: {len(expected_ids) - len(merged_ids)} failed briefs are left out; "
+              "re-run them with --retry-failed")
+    
+    print(f"Merged {n_rows} briefs from {count} shards into {csv_file}")
+    save_to_db(csv_file)
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
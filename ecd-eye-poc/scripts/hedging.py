@@ -0,0 +1,104 @@
+"""
+Hedged chat completions for latency-sensitive callers.
+
+A request that has not answered within the observed p95 latency gets a
+duplicate; whichever returns first wins and the other is cancelled, which
+closes its HTTP connection. Duplicates are capped at a fraction of all
+requests so hedging cannot more than marginally raise spend.
+
+Requests run on a private event loop in a background thread, so synchronous
+code such as ``generate_tagline`` can use a Hedger directly.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+
+
+class Hedger:
+    """Issue chat completions, hedging the slow tail.
+
+    ``quantile`` of the last ``window`` latencies is the hedge delay once
+    ``min_samples`` requests have completed; before that ``initial_delay``
+    seconds is used. At most ``max_extra`` duplicates are sent per request.
+    """
+
+    def __init__(self, quantile=0.95, max_extra=0.1, min_samples=20, initial_delay=2.0, window=500):
+        self.quantile = quantile
+        self.max_extra = max_extra
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._loop = None
+        self._client = None
+        self._lock = threading.Lock()
+        # Start the loop and client now, so they don't count as the first request's latency
+        self._start()
+
+    def delay(self):
+        """Seconds to wait for the first response before hedging."""
+        if len(self.latencies) < self.min_samples:
+            return self.initial_delay
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(self.quantile * len(ordered)))]
+
+    def _start(self):
+        with self._lock:
+            if self._loop is None:
+                import config
+
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="hedger", daemon=True).start()
+                # Retries are left to the caller (see resilience.py)
+                self._client = config.async_openai_client(max_retries=0)
+                self._loop = loop
+
+    async def _race(self, kwargs):
+        create = self._client.chat.completions.create
+        self.requests += 1
+        primary = asyncio.ensure_future(create(**kwargs))
+        done, _ = await asyncio.wait({primary}, timeout=self.delay())
+        if done or self.hedged >= self.max_extra * self.requests:
+            return await primary
+
+        self.hedged += 1
+        backup = asyncio.ensure_future(create(**kwargs))
+        pending = {primary, backup}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Prefer a successful response; only fail if both requests fail
+                for task in done:
+                    if task.exception() is None:
+                        self.hedge_wins += task is backup
+                        return task.result()
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def create(self, **kwargs):
+        """Return ``chat.completions.create(**kwargs)``, hedged if it is slow."""
+        self._start()
+        start = time.perf_counter()
+        response = asyncio.run_coroutine_threadsafe(self._race(kwargs), self._loop).result()
+        self.latencies.append(time.perf_counter() - start)
+        return response
+
+    def summary(self):
+        """Return a one-line report of hedging and latency percentiles."""
+        if not self.latencies:
+            return "No hedged requests made"
+        ordered = sorted(self.latencies)
+
+        def percentile(q):
+            return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+        return (
+            f"Hedged {self.hedged} of {self.requests} requests ({self.hedge_wins} won by the duplicate); "
+            f"latency p50 {percentile(0.5):.2f} s, p95 {percentile(0.95):.2f} s, p99 {percentile(0.99):.2f} s"
+        )
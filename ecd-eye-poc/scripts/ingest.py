@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""
+Continuous brief ingestion.
+
+New briefs no longer have to be edited into briefs.json and followed by a
+full ``make generate``. Submit them to the queue and keep a daemon running:
+
+    ./ecd-eye ingest submit "A brief..." [--split eval]
+    ./ecd-eye ingest run
+    ./ecd-eye ingest status
+
+Submissions wait in the ``brief_queue`` table of the pipeline database (see
+db.py). Files dropped into ``data/inbox/`` are queued as well: ``*.txt``
+with one brief per line, or ``*.json`` holding a brief string, a
+``{"brief": ..., "split": ...}`` object, a list of either, or a
+briefs.json-style document. Write a file under another name and rename it
+into the inbox, so a half-written file is never read. Queued files move to
+``inbox/done/`` and unreadable ones to ``inbox/rejected/``.
+
+The daemon takes pending briefs in micro-batches of at most
+``--batch-size``. Each brief is validated and deduplicated against the
+store and the rest of its batch, ignoring case, whitespace and
+punctuation. New briefs are added to the brief store. Training briefs then
+get taglines from generate_baseline.py's code, so backends, ``--few-shot``
+and ``--overgenerate`` behave as in batch runs. The taglines are saved at
+the end of the micro-batch and show up in the ranking form on its next
+reload. Failed briefs go to the dead-letter file, as in
+``generate_baseline.py --retry-failed``.
+
+Backpressure: the queue holds at most ``--max-pending`` pending briefs
+(``INGEST_MAX_PENDING``, default 1000). Beyond that, ``submit`` fails and
+inbox files wait in place. On SIGINT or SIGTERM the daemon finishes and
+saves the current micro-batch, then puts unprocessed briefs back in the
+queue; a second SIGINT stops at once. Run one daemon per database.
+"""
+
+import argparse
+import json
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from backends import BACKENDS
+from brief_store import JSON_SECTIONS, SPLITS
+from profiling import add_profile_argument, profile_run, span
+from resilience import RunAborted
+from router import normalise
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+DEFAULT_INBOX_DIR = DATA_DIR / "inbox"
+
+DEFAULT_MAX_PENDING = 1000
+DEFAULT_INTERVAL = 1.0
+REMOTE_BATCH_SIZE = 8
+MIN_BRIEF_WORDS = 3
+MAX_BRIEF_CHARS = 2000
+INBOX_SUFFIXES = (".json", ".txt")
+
+
+def clean_brief(brief, split="train"):
+    """Return the brief with its whitespace collapsed; raise ValueError if it can't be ingested."""
+    if not isinstance(brief, str):
+        raise ValueError("brief must be a string")
+    text = " ".join(brief.split())
+    if len(text.split()) < MIN_BRIEF_WORDS:
+        raise ValueError(f"brief has fewer than {MIN_BRIEF_WORDS} words")
+    if len(text) > MAX_BRIEF_CHARS:
+        raise ValueError(f"brief is longer than {MAX_BRIEF_CHARS} characters")
+    if split not in SPLITS:
+        raise ValueError(f"unknown split {split!r}; expected one of {', '.join(SPLITS)}")
+    return text
+
+
+def read_inbox_file(path):
+    """Return the ``(brief, split)`` pairs in an inbox file; raise ValueError if it can't be read."""
+    text = Path(path).read_text(encoding="utf-8")
+    if Path(path).suffix == ".txt":
+        return [(line, "train") for line in text.splitlines() if line.strip()]
+
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise ValueError(f"not valid JSON: {e}") from None
+    if isinstance(data, dict) and any(section in data for section in JSON_SECTIONS):
+        items = [
+            {**item, "split": split} if isinstance(item, dict) else item
+            for section, split in JSON_SECTIONS.items()
+            for item in data.get(section, [])
+        ]
+    else:
+        items = data if isinstance(data, list) else [data]
+
+    pairs = []
+    for item in items:
+        if isinstance(item, str):
+            pairs.append((item, "train"))
+        elif isinstance(item, dict) and isinstance(item.get("brief"), str):
+            pairs.append((item["brief"], str(item.get("split", "train"))))
+        else:
+            raise ValueError('expected brief strings or objects with a "brief" string')
+    return pairs
+
+
+def move_to(path, directory):
+    """Move a file into ``directory``, keeping older files of the same name."""
+    directory.mkdir(parents=True, exist_ok=True)
+    target = directory / path.name
+    if target.exists():
+        target = directory / f"{path.stem}.{time.time_ns()}{path.suffix}"
+    path.replace(target)
+    return target
+
+
+def drain_inbox(db, inbox_dir, max_pending):
+    """Queue the briefs of inbox files, oldest first, while the queue has room; return how many."""
+    inbox_dir = Path(inbox_dir)
+    if not inbox_dir.is_dir():
+        return 0
+    paths = sorted(
+        (path for path in inbox_dir.iterdir()
+         if path.is_file() and path.suffix in INBOX_SUFFIXES and not path.name.startswith(".")),
+        key=lambda path: (path.stat().st_mtime_ns, path.name),
+    )
+    queued = 0
+    for path in paths:
+        try:
+            items = read_inbox_file(path)
+        except ValueError as e:
+            print(f"Error: Rejected {path.name}: {e}")
+            target = move_to(path, inbox_dir / "rejected")
+            target.with_name(target.name + ".error").write_text(f"{e}\n")
+            continue
+        pending = db.count_queued()
+        if pending and pending + len(items) > max_pending:
+            # Leave the file until the queue drains
+            break
+        db.enqueue_briefs(items, source=path.name)
+        move_to(path, inbox_dir / "done")
+        queued += len(items)
+    return queued
+
+
+class KnownBriefs:
+    """Normalised text -> id of the briefs in the store, for duplicate checks.
+
+    The store is append-only, so each ``refresh`` only reads briefs added
+    since the last one.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.ids = {}
+        self.last_id = 0
+        self.refresh()
+
+    def refresh(self):
+        for brief_id, brief in self.conn.execute(
+            "SELECT id, brief FROM briefs WHERE id > ? ORDER BY id", (self.last_id,)
+        ):
+            self.ids.setdefault(normalise(brief), brief_id)
+            self.last_id = brief_id
+
+    def get(self, brief):
+        return self.ids.get(normalise(brief))
+
+    def add(self, brief, brief_id):
+        self.ids.setdefault(normalise(brief), brief_id)
+
+
+def generate(briefs, index, few_shot, overgenerate, backend, breaker):
+    """Yield ``(brief_id, brief, taglines, error)`` for ``briefs`` with generate_baseline.py's code."""
+    import config
+    import profiling
+    from generate_baseline import generate_chunks, generate_each
+
+    if backend.batched:
+        yield from generate_chunks(briefs, index, few_shot, backend.prefetch, overgenerate)
+        return
+    for number, brief in enumerate(briefs):
+        # Sleep to avoid rate limiting, but not before the first brief
+        if number and backend.remote:
+            profiling.sleep(config.request_interval())
+        yield from generate_each([brief], index, few_shot, None, breaker, overgenerate)
+
+
+class Ingester:
+    """Validates, stores and generates taglines for queued briefs, one micro-batch at a time."""
+
+    def __init__(self, db, store, backend, few_shot=0, overgenerate=1, breaker=None):
+        import config
+        from retrieval import RetrievalIndex
+
+        self.db = db
+        self.store = store
+        self.backend = backend
+        self.few_shot = few_shot
+        self.overgenerate = overgenerate
+        self.breaker = breaker
+        self.index = RetrievalIndex() if few_shot else None
+        self.model = config.baseline_model()
+        self.known = KnownBriefs(db.conn)
+
+    def process(self, batch):
+        """Ingest claimed queue rows; return ``{status: count}`` and the generated briefs' latencies."""
+        from resilience import record_failure
+
+        self.known.refresh()
+        outcomes = {}  # queue id -> [status, brief_id, error]
+        new = {}  # normalised text -> (text, split, [queue ids])
+        with span("validate", briefs=len(batch)):
+            for row in batch:
+                try:
+                    text = clean_brief(row["brief"], row["split"])
+                except ValueError as e:
+                    outcomes[row["id"]] = ["rejected", None, e]
+                    continue
+                existing = self.known.get(text)
+                if existing is not None:
+                    outcomes[row["id"]] = ["duplicate", existing, None]
+                    continue
+                key = normalise(text)
+                if key in new:
+                    outcomes[row["id"]] = ["duplicate", None, None]
+                    new[key][2].append(row["id"])
+                else:
+                    new[key] = (text, row["split"], [row["id"]])
+                    outcomes[row["id"]] = ["done", None, None]
+
+        # Stored training briefs without taglines, usually left by an
+        # interrupted run, are generated along with the new ones
+        ids = []
+        duplicate_ids = {brief_id for status, brief_id, _ in outcomes.values() if status == "duplicate"}
+        if duplicate_ids:
+            marks = ", ".join("?" * len(duplicate_ids))
+            ids += [row[0] for row in self.db.conn.execute(
+                f"""
+                SELECT id FROM briefs
+                WHERE id IN ({marks}) AND split = 'train'
+                AND NOT EXISTS (SELECT 1 FROM generations WHERE brief_id = briefs.id)
+                """,
+                sorted(duplicate_ids),
+            )]
+            for outcome in outcomes.values():
+                if outcome[1] in ids:
+                    outcome[0] = "done"
+
+        with span("store", briefs=len(new)):
+            # append_many takes one split, so each split's briefs are added separately
+            for split in SPLITS:
+                group = [(text, queue_ids) for text, brief_split, queue_ids in new.values() if brief_split == split]
+                if not group:
+                    continue
+                brief_ids = self.store.append_many([{"brief": text} for text, _ in group], split)
+                for (text, queue_ids), brief_id in zip(group, brief_ids):
+                    self.known.add(text, brief_id)
+                    for queue_id in queue_ids:
+                        outcomes[queue_id][1] = brief_id
+                    if split == "train":
+                        ids.append(brief_id)
+
+        rows, failed = [], {}
+        if ids:
+            briefs = [self.store.get(brief_id) for brief_id in ids]
+            for brief_id, brief_text, taglines, error in generate(
+                briefs, self.index, self.few_shot, self.overgenerate, self.backend, self.breaker
+            ):
+                if error is not None:
+                    print(f"Error generating taglines for brief {brief_id}: {error}")
+                    record_failure("generate_baseline", brief_id, brief_text, error, self.model)
+                    failed[brief_id] = error
+                else:
+                    rows.append((brief_id, taglines))
+            with span("save", briefs=len(rows)):
+                if rows:
+                    self.db.save_generations(rows, self.model)
+
+        for queue_id, outcome in outcomes.items():
+            if outcome[1] in failed:
+                outcome[0], outcome[2] = "failed", failed[outcome[1]]
+        self.db.finish_queued((queue_id, *outcome) for queue_id, outcome in outcomes.items())
+
+        counts = {}
+        for status, _, _ in outcomes.values():
+            counts[status] = counts.get(status, 0) + 1
+        ready = datetime.now().astimezone()
+        generated = {brief_id for brief_id, _ in rows}
+        latencies = [
+            (ready - datetime.fromisoformat(row["submitted_at"])).total_seconds()
+            for row in batch if outcomes[row["id"]][1] in generated
+        ]
+        return counts, latencies
+
+
+def run(batch_size=None, interval=DEFAULT_INTERVAL, max_pending=DEFAULT_MAX_PENDING, few_shot=0,
+        overgenerate=1, once=False, inbox_dir=DEFAULT_INBOX_DIR, data_dir=DATA_DIR):
+    """Ingest queued and inbox briefs until stopped (or, with ``once``, until both are empty)."""
+    from backends import get_backend
+    from brief_store import BriefStore
+    from db import open_db
+    from resilience import CircuitBreaker
+    from scorer import get_scorer
+
+    try:
+        backend = get_backend()
+    except (ValueError, RuntimeError) as e:
+        print(f"Error: {e}")
+        return 1
+    if overgenerate > 1 and get_scorer(Path(data_dir) / "scorer.npz") is None:
+        print("Error: --overgenerate needs a trained scorer; run 'scorer.py train' first")
+        return 1
+    batch_size = batch_size or (backend.prefetch if backend.batched else REMOTE_BATCH_SIZE)
+
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        print("Stopping after the current batch (Ctrl-C again to stop now)")
+        stop.set()
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    with open_db(data_dir=data_dir) as db, BriefStore(db.path) as store:
+        released = db.release_queued()
+        if released:
+            print(f"Returned {released} briefs left by an interrupted run to the queue")
+        ingester = Ingester(db, store, backend, few_shot, overgenerate, CircuitBreaker())
+        print(f"Ingesting briefs from {inbox_dir} and the queue in {db.path} "
+              f"(batches of up to {batch_size}, at most {max_pending} pending)")
+        try:
+            while not stop.is_set():
+                with span("inbox"):
+                    drain_inbox(db, inbox_dir, max_pending)
+                batch = db.claim_queued(batch_size)
+                if not batch:
+                    if once:
+                        break
+                    stop.wait(interval)
+                    continue
+                with span("batch", briefs=len(batch)):
+                    counts, latencies = ingester.process(batch)
+                summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+                ready = f"; taglines ready {max(latencies):.1f} s after submission" if latencies else ""
+                print(f"Ingested {len(batch)} briefs ({summary}){ready}; {db.count_queued()} pending")
+        finally:
+            db.release_queued()
+    return 0
+
+
+def status(data_dir=DATA_DIR):
+    from db import open_db
+
+    with open_db(data_dir=data_dir) as db:
+        counts = db.queue_counts()
+        for name in ("pending", "processing", "done", "duplicate", "rejected", "failed"):
+            print(f"{name:<11} {counts.get(name, 0):>8}")
+        oldest = db.conn.execute(
+            "SELECT MIN(submitted_at) FROM brief_queue WHERE status = 'pending'"
+        ).fetchone()[0]
+        if oldest:
+            age = (datetime.now().astimezone() - datetime.fromisoformat(oldest)).total_seconds()
+            print(f"Oldest pending brief submitted {age:.0f} s ago")
+        for row in db.conn.execute(
+            "SELECT id, brief, error FROM brief_queue WHERE status IN ('rejected', 'failed') "
+            "ORDER BY id DESC LIMIT 5"
+        ):
+            print(f"  #{row['id']} {row['brief'][:60]!r}: {row['error']}")
+
+
+def submit(briefs, split, max_pending, data_dir=DATA_DIR):
+    from db import open_db
+
+    try:
+        texts = [clean_brief(brief, split) for brief in briefs]
+    except ValueError as e:
+        print(f"Error: {e}; nothing queued")
+        return 1
+    with open_db(data_dir=data_dir) as db:
+        pending = db.count_queued()
+        if pending + len(texts) > max_pending:
+            print(f"Error: The queue is full ({pending} pending, at most {max_pending}); try again later")
+            return 1
+        ids = db.enqueue_briefs([(text, split) for text in texts], source="submit")
+    print(f"Queued {len(ids)} briefs ({pending + len(ids)} pending)")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="ingest and generate continuously")
+    add_profile_argument(run_parser)
+    run_parser.add_argument("--inbox", default=str(DEFAULT_INBOX_DIR), help="inbox directory (default: data/inbox)")
+    run_parser.add_argument("--batch-size", type=int, metavar="N",
+                            help="most briefs per micro-batch (default: the backend's batch, "
+                                 f"or {REMOTE_BATCH_SIZE} for the hosted API)")
+    run_parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, metavar="SECONDS",
+                            help=f"how often to check for new briefs when idle (default: {DEFAULT_INTERVAL})")
+    run_parser.add_argument("--max-pending", type=int, metavar="N",
+                            help=f"queue limit (default: INGEST_MAX_PENDING, or {DEFAULT_MAX_PENDING})")
+    run_parser.add_argument("--few-shot", type=int, default=0, metavar="K",
+                            help="prompt with top-ranked taglines of the K most similar ranked briefs")
+    run_parser.add_argument("--overgenerate", type=int, default=1, metavar="S",
+                            help="request S sets of taglines per brief and keep the 5 the local scorer ranks best")
+    run_parser.add_argument("--backend", choices=sorted(BACKENDS), help="generation backend (default: GENERATION_BACKEND, or openai)")
+    run_parser.add_argument("--once", action="store_true", help="exit once the inbox and queue are empty")
+
+    submit_parser = subparsers.add_parser("submit", help="queue briefs for ingestion")
+    submit_parser.add_argument("briefs", nargs="*", help="briefs to queue (default: one per line on stdin)")
+    submit_parser.add_argument("--split", choices=SPLITS, default="train")
+    submit_parser.add_argument("--max-pending", type=int, metavar="N",
+                               help=f"queue limit (default: INGEST_MAX_PENDING, or {DEFAULT_MAX_PENDING})")
+
+    subparsers.add_parser("status", help="show queue counts and recent errors")
+
+    args = parser.parse_args(argv)
+
+    import config
+
+    if args.command == "status":
+        status()
+        return 0
+
+    max_pending = args.max_pending or int(config.get("INGEST_MAX_PENDING", DEFAULT_MAX_PENDING))
+    if args.command == "submit":
+        briefs = args.briefs or [line for line in sys.stdin if line.strip()]
+        return submit(briefs, args.split, max_pending)
+
+    if args.batch_size is not None and args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+    if args.overgenerate < 1:
+        parser.error("--overgenerate must be at least 1")
+    if args.backend:
+        config.use_generation_backend(args.backend)
+    with profile_run("ingest", args.profile):
+        try:
+            return run(args.batch_size, args.interval, max_pending, args.few_shot, args.overgenerate,
+                       args.once, args.inbox)
+        except KeyboardInterrupt:
+            print("Stopped")
+            return 1
+        except RunAborted as e:
+            # The claimed batch went back to the queue; its stored briefs are generated next time
+            print(f"Error: {e}")
+            return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
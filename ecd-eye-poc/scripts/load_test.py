@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Load test the Streamlit apps with concurrent headless judges.
+
+Each judge speaks Streamlit's websocket protocol the way a browser tab does:
+it opens a session, makes ``--interactions`` edits with think times drawn
+from ``--think``, submits, and starts over until the level's ``--duration``
+is up. In the ranking form an edit swaps the ranks of two taglines for a
+brief; in the blind evaluation it picks a preference. Every edit and submit
+is a script rerun, timed from sending the new widget state to the
+``script_finished`` message.
+
+The judge count is ramped through ``--judges``. Each level gets a fresh
+``streamlit run`` server on a scratch copy of the apps and a synthetic
+dataset (see synthetic_data.py), so ``data/`` is never touched. The server
+process's CPU time and resident memory are sampled from ``/proc`` (Linux).
+
+Per level it reports reruns/s, rerun latency percentiles, errors, server CPU
+and memory per session. The saturation point is the first level where p95
+rerun latency exceeds ``--slo`` or throughput stops scaling with judges.
+Results are written as JSON to ``data/benchmarks/`` and appended to the
+benchmark history; ``--compare`` then checks them for regressions (see
+bench_history.py).
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import bench_history
+from benchmark import make_dataset, percentile
+from mock_openai import latency_spec, parse_latency
+
+ROOT = Path(__file__).parent.parent
+DATA_DIR = ROOT / "data"
+DEFAULT_OUTPUT_DIR = DATA_DIR / "benchmarks"
+
+# App -> (script, submit button label)
+APPS = {
+    "rank": ("ranking_form.py", "Save Rankings"),
+    "blind": ("blind_evaluation.py", "Submit Evaluation"),
+}
+
+RERUN_TIMEOUT = 60
+
+# Throughput must grow at least this fraction as fast as the judge count
+SCALING_EFFICIENCY = 0.8
+
+
+class ServerMonitor:
+    """Sample a process's CPU time and resident memory from /proc."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.ticks = os.sysconf("SC_CLK_TCK")
+        self.peak_rss = 0
+
+    def cpu_seconds(self):
+        with open(f"/proc/{self.pid}/stat") as f:
+            # Fields after the parenthesised command name; utime and stime are 14 and 15
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self.ticks
+
+    def rss_mb(self):
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1]) / 1024
+                    self.peak_rss = max(self.peak_rss, rss)
+                    return rss
+        return 0.0
+
+
+class Judge:
+    """One browser-like Streamlit session."""
+
+    def __init__(self, ws, app):
+        self.ws = ws
+        self.app = app
+        self.widgets = {}  # user key -> widget id
+        self.options = {}  # user key -> options
+        self.button = None
+        self.values = {}  # widget id -> value sent with every rerun
+        self.errors = 0
+
+    async def rerun(self, trigger=None):
+        """Send the current widget state; return the rerun latency in seconds."""
+        import asyncio
+        from streamlit.proto.Alert_pb2 import Alert
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.page_script_hash = ""
+        for widget_id, value in self.values.items():
+            message.rerun_script.widget_states.widgets.add(id=widget_id, string_value=value)
+        if trigger:
+            message.rerun_script.widget_states.widgets.add(id=trigger, trigger_value=True)
+
+        start = time.perf_counter()
+        await self.ws.send(message.SerializeToString())
+        async with asyncio.timeout(RERUN_TIMEOUT):
+            while True:
+                reply = ForwardMsg()
+                reply.ParseFromString(await self.ws.recv())
+                kind = reply.WhichOneof("type")
+                if kind == "script_finished":
+                    return time.perf_counter() - start
+                if kind != "delta" or reply.delta.WhichOneof("type") != "new_element":
+                    continue
+                element = reply.delta.new_element
+                element_type = element.WhichOneof("type")
+                if element_type == "exception" or (
+                    element_type == "alert" and element.alert.format == Alert.ERROR
+                ):
+                    self.errors += 1
+                elif element_type in ("selectbox", "radio"):
+                    widget = getattr(element, element_type)
+                    key = widget.id.rsplit("-", 1)[1]
+                    self.widgets[key] = widget.id
+                    self.options[key] = list(widget.options)
+                elif element_type == "button" and element.button.label == APPS[self.app][1]:
+                    self.button = element.button.id
+
+    def edits(self, rng):
+        """Return the widget changes for one edit; each is applied in its own rerun."""
+        if self.app == "rank":
+            # Swap the ranks of two taglines of one brief
+            brief_id = rng.choice(sorted({key.split("_")[1] for key in self.widgets}))
+            first, second = rng.sample(range(5), 2)
+            keys = [f"rank_{brief_id}_{first}", f"rank_{brief_id}_{second}"]
+            current = [self.values.get(self.widgets[key], str(slot + 1)) for key, slot in
+                       zip(keys, (first, second))]
+            return [(keys[0], current[1]), (keys[1], current[0])]
+        key = rng.choice(sorted(self.widgets))
+        return [(key, rng.choice(self.options[key]))]
+
+
+async def judge_loop(url, app, rng, think, interactions, deadline, records, errors):
+    """Run sessions until ``deadline``; append ``(kind, seconds)`` to ``records``."""
+    import asyncio
+    from websockets.asyncio.client import connect
+
+    while time.monotonic() < deadline:
+        try:
+            async with connect(url, subprotocols=["streamlit"], max_size=None, open_timeout=RERUN_TIMEOUT) as ws:
+                judge = Judge(ws, app)
+                records.append(("load", await judge.rerun()))
+                for _ in range(interactions):
+                    await asyncio.sleep(think(rng))
+                    if time.monotonic() >= deadline:
+                        break
+                    for key, value in judge.edits(rng):
+                        judge.values[judge.widgets[key]] = value
+                        records.append(("edit", await judge.rerun()))
+                else:
+                    await asyncio.sleep(think(rng))
+                    records.append(("submit", await judge.rerun(trigger=judge.button)))
+                errors.append(judge.errors)
+        except Exception as e:
+            errors.append(1)
+            print(f"Judge error: {type(e).__name__}: {e}")
+            await asyncio.sleep(1)
+
+
+async def warm_up(url, app, seed):
+    """Run one full session so first-run imports don't count against a level."""
+    from websockets.asyncio.client import connect
+
+    async with connect(url, subprotocols=["streamlit"], max_size=None, open_timeout=RERUN_TIMEOUT) as ws:
+        judge = Judge(ws, app)
+        await judge.rerun()
+        for key, value in judge.edits(random.Random(seed)):
+            judge.values[judge.widgets[key]] = value
+            await judge.rerun()
+        await judge.rerun(trigger=judge.button)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(root, app, port):
+    """Start ``streamlit run`` for an app; return the process once it is healthy."""
+    import urllib.request
+
+    command = [
+        sys.executable, "-m", "streamlit", "run", str(root / "app" / APPS[app][0]),
+        "--server.headless", "true",
+        "--server.port", str(port),
+        "--server.fileWatcherType", "none",
+        "--browser.gatherUsageStats", "false",
+    ]
+    log = open(root / f"streamlit-{port}.log", "w")
+    process = subprocess.Popen(command, cwd=root, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"streamlit exited with code {process.returncode}; see {log.name}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"streamlit did not become healthy; see {log.name}")
+
+
+def run_level(root, app, judges, duration, think, interactions, seed):
+    """Run one load level on a fresh server; return its result row."""
+    import asyncio
+
+    port = free_port()
+    process = start_server(root, app, port)
+    url = f"ws://127.0.0.1:{port}/_stcore/stream"
+    monitor = ServerMonitor(process.pid)
+    try:
+        async def level():
+            await warm_up(url, app, seed)
+            base_rss = monitor.rss_mb()
+            monitor.peak_rss = base_rss
+            cpu_start = monitor.cpu_seconds()
+            start = time.monotonic()
+            deadline = start + duration
+            records, errors = [], []
+            tasks = [
+                asyncio.ensure_future(judge_loop(url, app, random.Random(f"{seed}:{judges}:{index}"), think,
+                                                 interactions, deadline, records, errors))
+                for index in range(judges)
+            ]
+            while not all(task.done() for task in tasks):
+                monitor.rss_mb()
+                await asyncio.sleep(0.25)
+            await asyncio.gather(*tasks)
+            return records, errors, time.monotonic() - start, monitor.cpu_seconds() - cpu_start, base_rss
+
+        records, errors, wall, cpu, base_rss = asyncio.run(level())
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+    latencies = sorted(seconds for _, seconds in records)
+    reruns = len(latencies)
+    return {
+        "judges": judges,
+        "sessions": sum(kind == "submit" for kind, _ in records),
+        "reruns": reruns,
+        "reruns_per_s": round(reruns / wall, 2),
+        "rerun_p50_s": percentile(latencies, 0.5),
+        "rerun_p95_s": percentile(latencies, 0.95),
+        "rerun_p99_s": percentile(latencies, 0.99),
+        "submit_p95_s": percentile(sorted(s for kind, s in records if kind == "submit"), 0.95),
+        "errors": sum(errors),
+        "wall_s": round(wall, 2),
+        "cpu_percent": round(100 * cpu / wall, 1),
+        "cpu_ms_per_rerun": round(1000 * cpu / reruns, 1) if reruns else None,
+        "rss_mb": round(monitor.peak_rss, 1),
+        "rss_mb_per_session": round((monitor.peak_rss - base_rss) / judges, 2),
+    }
+
+
+def find_saturation(levels, slo):
+    """Return ``(judges, reason)`` for the first saturated level, or ``(None, None)``."""
+    previous = None
+    for level in levels:
+        if level["rerun_p95_s"] is not None and level["rerun_p95_s"] > slo:
+            return level["judges"], f"p95 rerun latency {level['rerun_p95_s']:.2f}s exceeds the {slo:g}s SLO"
+        if previous and previous["reruns_per_s"]:
+            scaling = (level["reruns_per_s"] / previous["reruns_per_s"]) / (level["judges"] / previous["judges"])
+            if scaling < SCALING_EFFICIENCY:
+                return level["judges"], (f"throughput grew {scaling:.0%} as fast as the judge count "
+                                         f"({previous['reruns_per_s']:.1f} -> {level['reruns_per_s']:.1f} reruns/s)")
+        previous = level
+    return None, None
+
+
+def format_ms(seconds):
+    return f"{seconds * 1000:.0f}" if seconds is not None else "-"
+
+
+def print_table(levels):
+    print(f"{'judges':>6} {'sessions':>8} {'reruns':>7} {'reruns/s':>8} {'p50 ms':>7} {'p95 ms':>7} "
+          f"{'p99 ms':>7} {'errors':>6} {'cpu %':>6} {'cpu ms/rerun':>12} {'rss MB':>7} {'MB/session':>10}")
+    for level in levels:
+        print(f"{level['judges']:>6} {level['sessions']:>8} {level['reruns']:>7} {level['reruns_per_s']:>8.1f} "
+              f"{format_ms(level['rerun_p50_s']):>7} {format_ms(level['rerun_p95_s']):>7} "
+              f"{format_ms(level['rerun_p99_s']):>7} {level['errors']:>6} {level['cpu_percent']:>6.1f} "
+              f"{level['cpu_ms_per_rerun'] or 0:>12.1f} {level['rss_mb']:>7.1f} {level['rss_mb_per_session']:>10.2f}")
+
+
+def run(app, judge_levels, duration=20, think="exp:1", interactions=5, briefs=20, slo=1.0, seed=0,
+        output_dir=DEFAULT_OUTPUT_DIR, keep=False, compare=None):
+    work_dir = Path(tempfile.mkdtemp(prefix="ecd-eye-loadtest-"))
+    dataset_dir = work_dir / "dataset"
+    make_dataset(dataset_dir, briefs, seed)
+    print(f"Load testing {APPS[app][0]} with {briefs} briefs, {duration:g}s per level; working in {work_dir}")
+
+    levels = []
+    try:
+        for judges in judge_levels:
+            # A fresh copy per level so earlier submits don't change the workload
+            root = work_dir / f"judges-{judges}"
+            for name in ("app", "scripts"):
+                shutil.copytree(ROOT / name, root / name, ignore=shutil.ignore_patterns("__pycache__"))
+            shutil.copytree(dataset_dir, root / "data")
+            level = run_level(root, app, judges, duration, parse_latency(think), interactions, seed)
+            levels.append(level)
+            print(f"  {judges:>4} judges: {level['reruns_per_s']:.1f} reruns/s, "
+                  f"p95 {format_ms(level['rerun_p95_s'])} ms, {level['errors']} errors")
+    finally:
+        if not keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print()
+    print_table(levels)
+    saturated_at, reason = find_saturation(levels, slo)
+    if saturated_at is None:
+        print(f"\nNo saturation up to {judge_levels[-1]} judges (p95 SLO {slo:g}s)")
+    else:
+        print(f"\nSaturation point: {saturated_at} judges; {reason}")
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    now = datetime.now(timezone.utc)
+    output_file = output_dir / f"loadtest-{app}-{now.strftime('%Y%m%d-%H%M%S')}.json"
+    timestamp = now.isoformat(timespec="seconds")
+    settings = {"duration_s": duration, "think": think, "interactions": interactions,
+                "briefs": briefs, "slo_s": slo, "seed": seed}
+    with open(output_file, "w") as f:
+        json.dump({
+            "timestamp": timestamp,
+            "app": app,
+            "settings": settings,
+            "levels": levels,
+            "saturation": {"judges": saturated_at, "reason": reason},
+        }, f, indent=2)
+    print(f"Results saved to {output_file}")
+    history_file = output_dir / bench_history.HISTORY_FILE.name
+    bench_history.record(f"loadtest-{app}", settings,
+                         [dict(level, name="judges", size=level["judges"]) for level in levels], timestamp,
+                         history_file)
+    print(f"Recorded in {history_file}")
+    if keep:
+        print(f"Run directories kept in {work_dir}")
+    if compare:
+        print()
+        return bench_history.check([f"loadtest-{app}"], path=history_file, **compare)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("app", choices=sorted(APPS), help="app to load: rank (ranking form) or blind")
+    parser.add_argument("--judges", default="1,2,4,8,16",
+                        help="comma-separated concurrent judge counts to ramp through (default: 1,2,4,8,16)")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per level (default: 20)")
+    parser.add_argument("--think", type=latency_spec, default="exp:1",
+                        help="think time between edits, in mock_openai.py --latency syntax (default: exp:1)")
+    parser.add_argument("--interactions", type=int, default=5, help="edits per session before submitting (default: 5)")
+    parser.add_argument("--briefs", type=int, default=20, help="briefs on the page (default: 20)")
+    parser.add_argument("--slo", type=float, default=1.0, help="p95 rerun latency target in seconds (default: 1.0)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+    parser.add_argument("--output", default=str(DEFAULT_OUTPUT_DIR),
+                        help="directory for the results JSON (default: data/benchmarks)")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directories and server logs")
+    parser.add_argument("--compare", action="store_true",
+                        help="check the run against the benchmark history; exit 1 on regressions")
+    bench_history.add_compare_arguments(parser)
+    args = parser.parse_args(argv)
+
+    try:
+        judge_levels = [int(value) for value in args.judges.split(",")]
+    except ValueError:
+        parser.error("--judges must be comma-separated integers")
+    if min(judge_levels) < 1 or args.briefs < 1:
+        parser.error("--judges and --briefs must be at least 1")
+    if not sys.platform.startswith("linux"):
+        parser.error("server CPU and memory sampling needs Linux /proc")
+
+    compare = None
+    if args.compare:
+        compare = {"window": args.window, "alpha": args.alpha, "min_change": args.min_change}
+    return run(args.app, judge_levels, args.duration, args.think, args.interactions, args.briefs, args.slo,
+               args.seed, args.output, args.keep, compare)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI endpoints the pipeline uses.
+
+Point the scripts at it with ``OPENAI_BASE_URL=http://127.0.0.1:8089/v1``
+(any ``OPENAI_API_KEY`` works) to run and measure them offline:
+
+    POST /v1/chat/completions          taglines for single, ``n``-sample and
+                                       multi-brief (tagline_service.py) prompts
+    POST /v1/files                     accept an upload, processed immediately
+    GET  /v1/files/<id>
+    POST /v1/fine_tuning/jobs          succeeds after ``--finetune-seconds``
+    GET  /v1/fine_tuning/jobs/<id>
+    GET  /v1/models
+    GET  /mock/stats                   request, status and latency counters
+
+Each completion waits a latency drawn from ``--latency`` plus its completion
+tokens at ``--tokens-per-second``. ``--error-rate`` and ``--rate-limit-rate``
+inject 5xx and 429 responses, and ``--rpm`` / ``--tpm`` enforce per-minute
+limits with OpenAI-style ``x-ratelimit-*`` and ``Retry-After`` headers.
+Taglines are seeded by ``--seed``, the model and the prompt, so runs repeat.
+Like OpenAI's prompt caching, a prompt's longest prefix of 1024 tokens or
+more (in 128-token steps) already seen for the model is reported as
+``usage.prompt_tokens_details.cached_tokens``.
+
+http.server is imported when a server is made, so ``--help`` (and the
+scripts that share the mock's options) stay fast.
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from backends import answer_prompt, approx_tokens
+from synthetic_data import make_tagline
+
+DEFAULT_PORT = 8089
+
+# Prompt caching: minimum cached prefix, prefix step (in tokens) and prefixes remembered
+CACHE_MIN_TOKENS = 1024
+CACHE_STEP_TOKENS = 128
+CACHE_ENTRIES = 100_000
+
+
+def parse_latency(text):
+    """Return a function drawing a latency in seconds from ``rng``.
+
+    Accepts ``0.2`` (fixed), ``uniform:LO:HI``, ``exp:MEAN`` and
+    ``lognormal:MEDIAN:SIGMA``.
+    """
+    kind, _, params = text.partition(":")
+    try:
+        if not params:
+            value = float(kind)
+            return lambda rng: value
+        values = [float(value) for value in params.split(":")]
+        if kind == "uniform" and len(values) == 2:
+            return lambda rng: rng.uniform(*values)
+        if kind == "exp" and len(values) == 1:
+            return lambda rng: rng.expovariate(1 / values[0]) if values[0] else 0.0
+        if kind == "lognormal" and len(values) == 2:
+            return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    except ValueError:
+        pass
+    raise argparse.ArgumentTypeError(f"invalid latency {text!r}; use e.g. 0.2, uniform:0.1:0.5, "
+                                     "exp:0.3 or lognormal:0.3:0.5")
+
+
+def latency_spec(text):
+    """argparse type: validate a latency spec, keeping it as text."""
+    parse_latency(text)
+    return text
+
+
+class MockState:
+    """Settings, counters and rate-limit windows shared by request threads."""
+
+    def __init__(self, latency="lognormal:0.05:0.5", tokens_per_second=500, error_rate=0.0,
+                 rate_limit_rate=0.0, rpm=0, tpm=0, finetune_seconds=0.0, seed=0):
+        self.latency = parse_latency(latency)
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rpm = rpm
+        self.tpm = tpm
+        self.finetune_seconds = finetune_seconds
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = deque()
+        self.tokens = deque()
+        self.files = {}
+        self.jobs = {}
+        self.counts = {}
+        self.prompt_cache = OrderedDict()
+        self.latencies = deque(maxlen=100_000)
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def cached_tokens(self, model, messages):
+        """Return the prompt's cached prefix length in tokens, and cache its prefixes."""
+        text = "".join(f"{message.get('role')}:{message.get('content', '')}\n" for message in messages)
+        cached = 0
+        with self.lock:
+            # Tokens are counted as four characters, as in approx_tokens
+            for tokens in range(CACHE_MIN_TOKENS, len(text) // 4 + 1, CACHE_STEP_TOKENS):
+                key = (model, hash(text[:tokens * 4]))
+                if key in self.prompt_cache:
+                    self.prompt_cache.move_to_end(key)
+                    cached = tokens
+                else:
+                    self.prompt_cache[key] = None
+            while len(self.prompt_cache) > CACHE_ENTRIES:
+                self.prompt_cache.popitem(last=False)
+        return cached
+
+    def admit(self, tokens):
+        """Apply limits and injection; return ``(status, headers)`` for a completion."""
+        with self.lock:
+            now = time.monotonic()
+            for window in (self.requests, self.tokens):
+                while window and window[0][0] <= now - 60:
+                    window.popleft()
+            used_tokens = sum(n for _, n in self.tokens)
+            headers = {}
+            status = 200
+            retry_after = 0.0
+            if self.rpm:
+                remaining = self.rpm - len(self.requests)
+                reset = 60 - (now - self.requests[0][0]) if self.requests else 0.0
+                headers.update({
+                    "x-ratelimit-limit-requests": str(self.rpm),
+                    "x-ratelimit-remaining-requests": str(max(0, remaining - 1)),
+                    "x-ratelimit-reset-requests": f"{reset:.3f}s",
+                })
+                if remaining <= 0:
+                    status, retry_after = 429, reset
+            if self.tpm:
+                remaining = self.tpm - used_tokens
+                reset = 60 - (now - self.tokens[0][0]) if self.tokens else 0.0
+                headers.update({
+                    "x-ratelimit-limit-tokens": str(self.tpm),
+                    "x-ratelimit-remaining-tokens": str(max(0, remaining - tokens)),
+                    "x-ratelimit-reset-tokens": f"{reset:.3f}s",
+                })
+                if remaining < tokens:
+                    status, retry_after = 429, max(retry_after, reset)
+            if status == 429:
+                self.counts["rate_limited"] = self.counts.get("rate_limited", 0) + 1
+            else:
+                roll = self.rng.random()
+                if roll < self.rate_limit_rate:
+                    status, retry_after = 429, 1.0
+                elif roll < self.rate_limit_rate + self.error_rate:
+                    status = self.rng.choice([500, 502, 503])
+                if status != 200:
+                    self.counts["injected"] = self.counts.get("injected", 0) + 1
+            if status == 200:
+                self.requests.append((now, 1))
+                self.tokens.append((now, tokens))
+            if retry_after:
+                headers["retry-after"] = f"{retry_after:.3f}"
+            return status, headers
+
+    def stats(self):
+        with self.lock:
+            ordered = sorted(self.latencies)
+            counts = dict(self.counts)
+
+        def percentile(q):
+            return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4) if ordered else None
+
+        return {
+            "counts": counts,
+            "latency_s": {"p50": percentile(0.5), "p95": percentile(0.95), "p99": percentile(0.99)},
+        }
+
+
+class Handler:
+    """Request handling, mixed into ``BaseHTTPRequestHandler`` by make_server."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; don't let Nagle delay the body
+    disable_nagle_algorithm = True
+    state = None  # set by make_server
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.state.count(f"status.{status}")
+
+    def send_error_json(self, status, message, headers=None):
+        kind = {429: "rate_limit_error", 404: "invalid_request_error", 400: "invalid_request_error"}
+        self.send_json(status, {"error": {
+            "message": message,
+            "type": kind.get(status, "server_error"),
+            "code": None,
+        }}, headers)
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        state = self.state
+        if path == "/mock/stats":
+            return self.send_json(200, state.stats())
+        if path == "/v1/models":
+            state.count("models")
+            return self.send_json(200, {"object": "list", "data": [
+                {"id": model, "object": "model", "owned_by": "mock"}
+                for model in ["gpt-3.5-turbo-0125", "gpt-4o-mini", "gpt-4o"]
+            ]})
+        if path.startswith("/v1/files/"):
+            state.count("files.retrieve")
+            record = state.files.get(path.rsplit("/", 1)[1])
+            if record is None:
+                return self.send_error_json(404, "No such file")
+            return self.send_json(200, record)
+        if path.startswith("/v1/fine_tuning/jobs/"):
+            state.count("fine_tuning.jobs.retrieve")
+            job = state.jobs.get(path.rsplit("/", 1)[1])
+            if job is None:
+                return self.send_error_json(404, "No such job")
+            return self.send_json(200, self.job_status(job))
+        self.send_error_json(404, f"Unknown path {path}")
+
+    def do_POST(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        body = self.read_body()
+        if path == "/v1/chat/completions":
+            return self.chat_completion(body)
+        if path == "/v1/files":
+            return self.create_file(body)
+        if path == "/v1/fine_tuning/jobs":
+            return self.create_job(body)
+        self.send_error_json(404, f"Unknown path {path}")
+
+    def chat_completion(self, body):
+        state = self.state
+        state.count("chat.completions")
+        start = time.perf_counter()
+        try:
+            request = json.loads(body)
+            model = request["model"]
+            prompt = request["messages"][-1]["content"]
+        except (ValueError, KeyError, IndexError, TypeError):
+            return self.send_error_json(400, "Expected a JSON body with model and messages")
+
+        n = int(request.get("n") or 1)
+        choices = []
+        for index in range(n):
+            rng = random.Random(f"{state.seed}:{model}:{prompt}:{index}")
+            choices.append({
+                "index": index,
+                "message": {"role": "assistant", "content": answer_prompt(prompt, lambda: make_tagline(rng)[0])},
+                "finish_reason": "stop",
+            })
+        prompt_tokens = sum(approx_tokens(message.get("content", "")) for message in request["messages"])
+        completion_tokens = sum(approx_tokens(choice["message"]["content"]) for choice in choices)
+        cached_tokens = min(prompt_tokens, state.cached_tokens(model, request["messages"]))
+
+        status, headers = state.admit(prompt_tokens + completion_tokens)
+        with state.lock:
+            delay = state.latency(state.rng)
+        if status == 200 and state.tokens_per_second:
+            delay += completion_tokens / state.tokens_per_second
+        time.sleep(max(0.0, delay))
+        if status != 200:
+            message = "Rate limit reached" if status == 429 else "The server had an error"
+            return self.send_error_json(status, message, headers)
+
+        self.send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": choices,
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens},
+            },
+        }, headers)
+        with state.lock:
+            state.latencies.append(time.perf_counter() - start)
+            for key, tokens in (("prompt_tokens", prompt_tokens), ("cached_tokens", cached_tokens),
+                                ("completion_tokens", completion_tokens)):
+                state.counts[key] = state.counts.get(key, 0) + tokens
+
+    def create_file(self, body):
+        state = self.state
+        state.count("files.create")
+        match = re.search(rb'filename="([^"]*)"', body)
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        record = {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(body),
+            "created_at": int(time.time()),
+            "filename": match.group(1).decode() if match else "upload.jsonl",
+            "purpose": "fine-tune",
+            "status": "processed",
+        }
+        with state.lock:
+            state.files[file_id] = record
+        self.send_json(200, record)
+
+    def create_job(self, body):
+        state = self.state
+        state.count("fine_tuning.jobs.create")
+        try:
+            request = json.loads(body)
+        except ValueError:
+            return self.send_error_json(400, "Expected a JSON body")
+        if request.get("training_file") not in state.files:
+            return self.send_error_json(400, "Unknown training_file")
+        job_id = f"ftjob-{uuid.uuid4().hex[:24]}"
+        job = {
+            "id": job_id,
+            "object": "fine_tuning.job",
+            "model": request.get("model"),
+            "training_file": request["training_file"],
+            "created_at": int(time.time()),
+            "suffix": request.get("suffix"),
+            "started": time.monotonic(),
+        }
+        with state.lock:
+            state.jobs[job_id] = job
+        self.send_json(200, self.job_status(job, status="validating_files"))
+
+    def job_status(self, job, status=None):
+        state = self.state
+        done = time.monotonic() - job["started"] >= state.finetune_seconds
+        status = status or ("succeeded" if done else "running")
+        suffix = job["suffix"] or "mock"
+        return {
+            "id": job["id"],
+            "object": job["object"],
+            "model": job["model"],
+            "training_file": job["training_file"],
+            "created_at": job["created_at"],
+            "status": status,
+            "fine_tuned_model": f"ft:{job['model']}:{suffix}:{job['id'][-8:]}" if status == "succeeded" else None,
+            "finished_at": int(time.time()) if status == "succeeded" else None,
+            "error": None,
+            "hyperparameters": {"n_epochs": "auto"},
+            "organization_id": "org-mock",
+            "result_files": [],
+            "seed": 0,
+            "trained_tokens": None,
+            "validation_file": None,
+        }
+
+
+def make_server(host="127.0.0.1", port=DEFAULT_PORT, **settings):
+    """Return a ``ThreadingHTTPServer`` with its ``MockState`` as ``server.state``."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    state = MockState(**settings)
+    handler = type("MockHandler", (Handler, BaseHTTPRequestHandler), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = state
+    return server
+
+
+def start(host="127.0.0.1", port=0, **settings):
+    """Serve in a background thread; return the server (port 0 picks a free one)."""
+    server = make_server(host, port, **settings)
+    threading.Thread(target=server.serve_forever, name="mock-openai", daemon=True).start()
+    return server
+
+
+def base_url(server):
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}/v1"
+
+
+def add_mock_arguments(parser):
+    """Add the latency, error and rate-limit options shared with benchmark.py."""
+    parser.add_argument("--latency", type=latency_spec, default="lognormal:0.05:0.5",
+                        help="completion latency: SECONDS, uniform:LO:HI, exp:MEAN or lognormal:MEDIAN:SIGMA "
+                             "(default: lognormal:0.05:0.5)")
+    parser.add_argument("--tokens-per-second", type=float, default=500,
+                        help="completion token rate added to the latency; 0 disables (default: 500)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of completions failing with 5xx")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of completions failing with 429")
+    parser.add_argument("--rpm", type=int, default=0, help="requests per minute before 429s; 0 is unlimited")
+    parser.add_argument("--tpm", type=int, default=0, help="tokens per minute before 429s; 0 is unlimited")
+    parser.add_argument("--finetune-seconds", type=float, default=0.0,
+                        help="how long fine-tuning jobs run (default: 0)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+
+
+def mock_settings(args):
+    """Return ``MockState`` settings from parsed ``add_mock_arguments`` options."""
+    return {
+        "latency": args.latency,
+        "tokens_per_second": args.tokens_per_second,
+        "error_rate": args.error_rate,
+        "rate_limit_rate": args.rate_limit_rate,
+        "rpm": args.rpm,
+        "tpm": args.tpm,
+        "finetune_seconds": args.finetune_seconds,
+        "seed": args.seed,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a local mock of the OpenAI API.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port (default: {DEFAULT_PORT})")
+    add_mock_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = make_server(args.host, args.port, **mock_settings(args))
+    print(f"Mock OpenAI API on {base_url(server)}; set OPENAI_BASE_URL to use it")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
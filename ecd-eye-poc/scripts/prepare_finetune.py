@@ -1,98 +1,244 @@
 #!/usr/bin/env python3
 """
 Prepare fine-tuning data from ECD rankings.
+
+With ``--incremental``, only examples that the current fine-tuned model has
+not been trained on are written to ``data/fine_tune_delta.jsonl``, optionally
+mixed with a random replay sample of already-trained examples.
+
+With ``--pairs``, every ranking is expanded instead into all of its
+(better, worse) tagline pairs, ten per fully ranked brief, and written to
+``data/preference_pairs.jsonl`` in the preference (DPO) fine-tuning format.
+``--min-margin`` drops pairs ranked too close together, ``--margin-weight``
+adds a ``weight`` that grows with the rank gap, and ``--dedup`` drops pairs
+repeated across briefs with the same text.
 """
 
-import os
 import json
-import pandas as pd
+import random
+import argparse
 from pathlib import Path
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+import config
+import finetune_state
+from db import N_SLOTS, open_db
+from profiling import add_profile_argument, profile_run, span
+from prompts import messages
 
-def main():
-    # Create data directory if it doesn't exist
-    data_dir = Path(__file__).parent.parent / "data"
-    data_dir.mkdir(exist_ok=True)
+def make_example(brief, tagline):
+    """Create a fine-tuning example for a brief and its chosen tagline.
     
-    # Load rankings
-    rankings_file = data_dir / "rankings.csv"
-    if not rankings_file.exists():
-        print(f"Error: Rankings file not found at {rankings_file}")
-        return
+    The prompt is the ``PROMPT_VERSION`` tagline prompt evaluate_models.py
+    sends, so train with the version you evaluate with.
+    """
+    return {
+        "messages": messages("tagline", brief),
+        "response": tagline
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_profile_argument(parser)
+    parser.add_argument("--incremental", action="store_true",
+                        help="write only examples not yet trained on to fine_tune_delta.jsonl")
+    parser.add_argument("--replay", type=int, default=0, metavar="N",
+                        help="with --incremental, mix in N already-trained examples")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the replay sample")
+    parser.add_argument("--pairs", action="store_true",
+                        help="write every ranked (better, worse) tagline pair to preference_pairs.jsonl")
+    parser.add_argument("--min-margin", type=int, default=1, metavar="N",
+                        help="with --pairs, keep only pairs at least N ranks apart (default: 1)")
+    parser.add_argument("--margin-weight", action="store_true",
+                        help="with --pairs, add a weight of rank gap / 4 to each pair")
+    parser.add_argument("--dedup", action="store_true",
+                        help="with --pairs, drop pairs whose brief and taglines repeat an earlier pair")
+    args = parser.parse_args(argv)
     
-    rankings_df = pd.read_csv(rankings_file)
+    if args.pairs and args.incremental:
+        parser.error("--pairs and --incremental can't be combined")
+    if not 1 <= args.min_margin < N_SLOTS:
+        parser.error(f"--min-margin must be between 1 and {N_SLOTS - 1}")
     
-    # Load baseline taglines
-    baseline_file = data_dir / "baseline.csv"
-    if not baseline_file.exists():
-        print(f"Error: Baseline file not found at {baseline_file}")
-        return
+    with profile_run("prepare_finetune", args.profile):
+        if args.pairs:
+            run_pairs(args.min_margin, args.margin_weight, args.dedup)
+        else:
+            run(args.incremental, args.replay, args.seed)
+
+def run(incremental=False, replay=0, seed=0):
+    config.load_env()
     
-    baseline_df = pd.read_csv(baseline_file)
+    # Create data directory if it doesn't exist
+    data_dir = Path(__file__).parent.parent / "data"
+    data_dir.mkdir(exist_ok=True)
+    
+    # Load the top-ranked tagline (rank 1) of every ranked brief
+    with span("load"), open_db(data_dir=data_dir) as db:
+        if not db.count_rankings():
+            print(f"Error: No rankings found in {db.path}")
+            return
+        examples = db.best_taglines().fetchall()
     
     # Prepare fine-tuning data
     finetune_data = []
     
-    for _, row in rankings_df.iterrows():
-        brief_id = row["brief_id"]
-        brief = row["brief"]
-        
-        # Get the taglines in order of ranking
-        baseline_row = baseline_df[baseline_df["brief_id"] == brief_id].iloc[0]
-        taglines = [
-            baseline_row["tagline_1"],
-            baseline_row["tagline_2"],
-            baseline_row["tagline_3"],
-            baseline_row["tagline_4"],
-            baseline_row["tagline_5"]
-        ]
-        
-        # Get the rankings (1 to 5, where 1 is best)
-        rankings = [
-            row["rank_1"],
-            row["rank_2"],
-            row["rank_3"],
-            row["rank_4"],
-            row["rank_5"]
-        ]
-        
-        # Create a mapping of tagline index to rank
-        tagline_ranks = {i: rank for i, rank in enumerate(rankings)}
-        
-        # Sort taglines by rank
-        sorted_taglines = [taglines[i] for i in sorted(tagline_ranks, key=tagline_ranks.get)]
-        
-        # Get the top-ranked tagline
-        best_tagline = sorted_taglines[0]
-        
-        # Create fine-tuning example
-        finetune_example = {
-            "messages": [
-                {
-                    "role": "system",
-                    "content": "You are a punchy award-winning copywriter."
-                },
-                {
-                    "role": "user",
-                    "content": f"Write a punchy tagline (≤7 words) for: {brief}"
-                }
-            ],
-            "response": best_tagline
-        }
-        
-        finetune_data.append(finetune_example)
+    with span("prepare"):
+        if incremental:
+            # Split into new examples and ones the current model has seen
+            trained_keys = set(finetune_state.load_state()["trained_keys"])
+            new_keys = []
+            replay_pool = []
+            for brief_id, brief, best_tagline in examples:
+                key = finetune_state.example_key(brief_id, best_tagline)
+                if key in trained_keys:
+                    replay_pool.append(make_example(brief, best_tagline))
+                else:
+                    new_keys.append(key)
+                    finetune_data.append(make_example(brief, best_tagline))
+            
+            n_new = len(finetune_data)
+            if n_new and replay:
+                replayed = random.Random(seed).sample(replay_pool, min(replay, len(replay_pool)))
+                finetune_data.extend(replayed)
+        else:
+            keys = []
+            for brief_id, brief, best_tagline in examples:
+                keys.append(finetune_state.example_key(brief_id, best_tagline))
+                finetune_data.append(make_example(brief, best_tagline))
+    
+    if incremental and not n_new:
+        print("No new ranked examples since the last fine-tune; nothing to do.")
+        return
     
     # Save fine-tuning data to JSONL file
-    finetune_file = data_dir / "fine_tune.jsonl"
-    with open(finetune_file, "w") as f:
+    finetune_file = finetune_state.DELTA_FILE if incremental else data_dir / "fine_tune.jsonl"
+    with span("write"), open(finetune_file, "w") as f:
         for example in finetune_data:
             f.write(json.dumps(example) + "\n")
     
+    if incremental:
+        finetune_state.write_pending(new_keys)
+        print(f"New examples: {n_new}, replayed: {len(finetune_data) - n_new}")
+    else:
+        finetune_state.write_pending(keys, finetune_state.FULL_PENDING_FILE)
+    
     print(f"Fine-tuning data saved to {finetune_file}")
     print(f"Number of examples: {len(finetune_data)}")
 
+PAIRS_CHUNK = 10_000
+
+def ranked_chunks(table, size=PAIRS_CHUNK):
+    """Yield ``(briefs, taglines, ranks)`` for up to ``size`` briefs at a time.
+    
+    ``table`` is the long tagline store (see tagline_store.py), ordered by
+    brief and slot. ``taglines`` is an object array and ``ranks`` a float
+    array (NaN where a slot is unranked), both of shape (briefs, 5). Only
+    each chunk's strings are materialised.
+    """
+    import numpy as np
+    
+    brief_ids = table["brief_id"].to_numpy()
+    starts = np.flatnonzero(np.r_[True, brief_ids[1:] != brief_ids[:-1]])
+    bounds = np.r_[starts, len(brief_ids)]
+    for first in range(0, len(starts), size):
+        last = min(first + size, len(starts))
+        rows = slice(bounds[first], bounds[last])
+        chunk = table.slice(rows.start, rows.stop - rows.start)
+        # Position of each tagline in the (briefs, 5) matrix
+        brief_index = np.repeat(np.arange(last - first), np.diff(bounds[first:last + 1]))
+        slot_index = chunk["slot"].to_numpy() - 1
+        taglines = np.full((last - first, N_SLOTS), "", dtype=object)
+        ranks = np.full((last - first, N_SLOTS), np.nan)
+        taglines[brief_index, slot_index] = chunk["tagline"].fill_null("").to_numpy(zero_copy_only=False)
+        ranks[brief_index, slot_index] = chunk["rank"].to_numpy(zero_copy_only=False)
+        briefs = table["brief"].take(starts[first:last]).to_pylist()
+        yield briefs, taglines, ranks
+
+def preference_pairs(taglines, ranks, min_margin=1):
+    """Return ``(rows, better slots, worse slots, margins)`` for every ranked pair.
+    
+    A pair is kept when the better slot is ranked at least ``min_margin``
+    above the worse one and both taglines are non-empty and differ.
+    """
+    import numpy as np
+    
+    # margins[b, i, j] = how many ranks slot i beat slot j by (NaN if either is unranked)
+    margins = ranks[:, None, :] - ranks[:, :, None]
+    filled = taglines != ""
+    keep = (margins >= min_margin) & filled[:, :, None] & filled[:, None, :]
+    rows, better, worse = np.nonzero(keep)
+    differ = taglines[rows, better] != taglines[rows, worse]
+    rows, better, worse = rows[differ], better[differ], worse[differ]
+    return rows, better, worse, margins[rows, better, worse].astype(int)
+
+def pair_lines(briefs, taglines, ranks, min_margin=1, margin_weight=False, version=None):
+    """Return the JSONL lines for a chunk's preference pairs.
+    
+    Each prompt and tagline is JSON-encoded once and pairs are assembled
+    from the encoded pieces with array operations.
+    """
+    import numpy as np
+    from json.encoder import encode_basestring_ascii
+    
+    rows, better, worse, margins = preference_pairs(taglines, ranks, min_margin)
+    heads = np.array([
+        '{"input": ' + json.dumps({"messages": messages("tagline", brief, version=version)})
+        for brief in briefs
+    ], dtype=object)
+    outputs = np.array([
+        '[{"role": "assistant", "content": ' + encode_basestring_ascii(tagline) + "}]"
+        for tagline in taglines.ravel()
+    ], dtype=object).reshape(taglines.shape)
+    tails = np.array(
+        [f', "weight": {margin / (N_SLOTS - 1)}}}\n' if margin_weight else "}\n" for margin in range(N_SLOTS)],
+        dtype=object,
+    )
+    return (
+        heads[rows] + ', "preferred_output": ' + outputs[rows, better]
+        + ', "non_preferred_output": ' + outputs[rows, worse] + tails[margins]
+    ).tolist()
+
+def run_pairs(min_margin=1, margin_weight=False, dedup=False):
+    import numpy as np
+    from tagline_store import load_taglines
+    
+    config.load_env()
+    version = config.prompt_version()
+    
+    data_dir = Path(__file__).parent.parent / "data"
+    data_dir.mkdir(exist_ok=True)
+    pairs_file = data_dir / "preference_pairs.jsonl"
+    
+    with span("load"), open_db(data_dir=data_dir) as db:
+        if not db.count_rankings():
+            print(f"Error: No rankings found in {db.path}")
+            return
+        table = load_taglines(data_dir)
+    
+    n_briefs = n_pairs = n_duplicates = 0
+    seen = set()
+    with open(pairs_file, "w") as f:
+        for briefs, taglines, ranks in ranked_chunks(table):
+            with span("prepare", briefs=len(briefs)):
+                lines = pair_lines(briefs, taglines, ranks, min_margin, margin_weight, version)
+                if dedup:
+                    # A line without its weight is the brief and the two taglines
+                    unique = []
+                    for line in lines:
+                        key = hash(line.rsplit(', "weight"', 1)[0] if margin_weight else line)
+                        if key not in seen:
+                            seen.add(key)
+                            unique.append(line)
+                    n_duplicates += len(lines) - len(unique)
+                    lines = unique
+            with span("write"):
+                f.writelines(lines)
+            n_briefs += int((~np.isnan(ranks)).any(axis=1).sum())
+            n_pairs += len(lines)
+    
+    print(f"Preference pairs saved to {pairs_file}")
+    print(f"Number of pairs: {n_pairs} from {n_briefs} ranked briefs"
+          + (f" ({n_duplicates} duplicates dropped)" if n_duplicates else ""))
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,146 @@
+"""
+Profiling and tracing helpers shared by the pipeline scripts.
+
+Running a script with ``--profile`` captures a cProfile dump (``.prof``, open
+with snakeviz or ``python -m pstats``) and a Chrome trace-event file
+(``.trace.json``, open in https://ui.perfetto.dev or chrome://tracing) built
+from nested ``span()`` blocks.
+"""
+
+import cProfile
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+DEFAULT_PROFILE_DIR = Path(__file__).parent.parent / "data" / "profiles"
+
+# Profiler for the current run, or None when profiling is off
+_active = None
+
+
+class Profiler:
+    """Collect cProfile stats and trace spans for one script run."""
+
+    def __init__(self, name, out_dir=DEFAULT_PROFILE_DIR):
+        self.name = name
+        self.out_dir = Path(out_dir)
+        self.events = []
+        self._lock = threading.Lock()
+        self._profile = cProfile.Profile()
+        self._t0 = None
+
+    def _now_us(self):
+        return (time.perf_counter() - self._t0) * 1e6
+
+    def start(self):
+        self._t0 = time.perf_counter()
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+
+    @contextmanager
+    def span(self, name, **args):
+        """Record a complete ("X") trace event around the block."""
+        start = self._now_us()
+        try:
+            yield
+        finally:
+            event = {
+                "name": name,
+                "cat": name.split(".")[0],
+                "ph": "X",
+                "ts": start,
+                "dur": self._now_us() - start,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+            }
+            if args:
+                event["args"] = {k: str(v) for k, v in args.items()}
+            with self._lock:
+                self.events.append(event)
+
+    def summary(self):
+        """Return total time per span name, longest first."""
+        totals = {}
+        for event in self.events:
+            totals[event["name"]] = totals.get(event["name"], 0.0) + event["dur"] / 1e6
+        return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+    def write(self):
+        """Write the trace and cProfile files; return their paths."""
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        trace_file = self.out_dir / f"{self.name}-{stamp}.trace.json"
+        prof_file = self.out_dir / f"{self.name}-{stamp}.prof"
+
+        with self._lock:
+            events = list(self.events)
+        metadata = [{
+            "name": "process_name",
+            "ph": "M",
+            "pid": os.getpid(),
+            "args": {"name": self.name},
+        }]
+        with open(trace_file, "w") as f:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+
+        self._profile.dump_stats(prof_file)
+        return trace_file, prof_file
+
+
+def add_profile_argument(parser):
+    """Add the shared ``--profile [DIR]`` option to an argument parser."""
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const=str(DEFAULT_PROFILE_DIR),
+        default=None,
+        metavar="DIR",
+        help=f"capture cProfile stats and a trace file (default dir: {DEFAULT_PROFILE_DIR})",
+    )
+
+
+@contextmanager
+def profile_run(name, out_dir=None):
+    """Profile the enclosed block when ``out_dir`` is set, else do nothing."""
+    global _active
+    if not out_dir:
+        yield None
+        return
+
+    profiler = Profiler(name, out_dir)
+    _active = profiler
+    profiler.start()
+    try:
+        with profiler.span(name):
+            yield profiler
+    finally:
+        profiler.stop()
+        _active = None
+        trace_file, prof_file = profiler.write()
+        print("\nTime by span:")
+        for span_name, seconds in profiler.summary():
+            print(f"  {span_name:<24} {seconds:8.3f}s")
+        print(f"Trace saved to {trace_file}")
+        print(f"cProfile stats saved to {prof_file}")
+
+
+@contextmanager
+def span(name, **args):
+    """Record a trace span if a profiled run is active."""
+    if _active is None:
+        yield
+        return
+    with _active.span(name, **args):
+        yield
+
+
+def sleep(seconds):
+    """``time.sleep`` that shows up as a ``sleep`` span in traces."""
+    with span("sleep"):
+        time.sleep(seconds)
@@ -0,0 +1,259 @@
+"""
+Versioned prompt templates.
+
+Every request the pipeline sends is built here: ``taglines`` (five for a
+brief, with optional retrieved few-shot examples), ``tagline`` (one, also used
+for fine-tuning examples) and ``batch`` (five for each of several numbered
+briefs, see batching.py). ``PROMPT_VERSION`` picks the version; a version's
+text never changes once released, so fine-tuning data and evaluations made
+with it stay comparable.
+
+    v1   the original one-line system prompt (default)
+    v2   one long system message shared by every task (rules, house style
+         guide, fixed example taglines), then the task, then retrieved
+         examples, with the brief last
+
+Providers cache prompt prefixes: OpenAI reuses identical prefixes of 1024
+tokens or more, in 128-token steps, at a discount and with lower latency.
+v1's shared prefix is far too short to be cached; v2's system message alone
+is over 1024 tokens, so every request after the first hits the cache. Use v2
+with models that support prompt caching.
+
+``record_usage`` keeps per-template totals of prompt, cached and completion
+tokens from each response's ``usage``, and ``usage_summary`` reports the
+cache hit rate at the end of a run.
+"""
+
+import threading
+from collections import namedtuple
+
+import config
+
+DEFAULT_VERSION = "v1"
+
+Template = namedtuple("Template", "system user")
+
+RULES_V1 = "You are a punchy award-winning copywriter."
+
+BATCH_INSTRUCTIONS = (
+    "Write five punchy taglines (≤7 words) for each numbered brief below. "
+    "Put each tagline on its own line, starting with the brief's number in square brackets, "
+    "for example \"[2] Your tagline\".\n\n"
+)
+
+STYLE_GUIDE_V2 = """\
+House style for ECD-Eye taglines
+
+Length and shape
+- Seven words or fewer. Every word counts, including "a", "the" and "your".
+- One idea per tagline. If it needs a comma and an "and", it is two taglines.
+- Sentence case. End with a full stop when the line is a statement.
+- No hashtags, emoji, quotation marks, brand names or trademark symbols.
+- No numbering, bullets or commentary around the taglines unless the request
+  asks for a numbered format.
+
+Voice
+- Concrete beats abstract: name what the customer gets, feels or avoids.
+- Verbs beat adjectives. "Drive the future" beats "Futuristic driving".
+- Talk to one person ("you", "your"), not to a market segment.
+- Confident, warm and plain-spoken; never smug, never shouty.
+- Humour is welcome when the brief allows it. Keep a pun only if it still
+  works the second time it is read aloud.
+- Rhythm matters: two short beats ("Simple setup. Serious security.") or one
+  clean line. Read it aloud; if you stumble, rewrite it.
+
+Avoid
+- Clichés our ECD always ranks last: unleash, elevate your, game changer,
+  next level, revolutionize, like never before, redefine.
+- Empty superlatives (best, ultimate, world-class) unless the brief gives
+  proof.
+- Questions that can be answered "no".
+- Repeating the brief's own wording back at it.
+- Jargon the audience would not use about themselves.
+
+Working from a brief
+- Find the single benefit that matters most to the named audience and lead
+  with it. Other taglines in the same set may explore the other benefits.
+- A set of five should show range: one literal, one emotional, one playful,
+  one imperative and one of three words or fewer. Never five rewordings of
+  the same line.
+- If the brief names a tension (luxury and sustainability, speed and calm),
+  the strongest lines resolve it rather than listing both sides.
+- When ranked examples from similar briefs are given, learn from what made
+  them win; do not copy them.
+
+Checking your work
+- Count the words of every line before answering.
+- Cut any line that would fit a competitor's product just as well.
+- Cut any line that needs the brief beside it to make sense.
+- Prefer the line a customer could repeat to a friend.
+"""
+
+EXAMPLES_V2 = """\
+Taglines our ECD ranked highest for earlier briefs:
+
+Brief: A premium electric vehicle that emphasizes sustainability and luxury.
+- Luxury that leaves no footprint.
+- Elegance powered by conscience.
+- Drive the future, preserve tomorrow.
+
+Brief: A fitness app focused on personalized workouts and mental wellbeing.
+- Your body, your mind, your way.
+- Train smarter, feel better.
+- Your personal path to total wellness.
+
+Brief: A plant-based food brand that highlights taste and environmental benefits.
+- Taste good. Do good. Feel good.
+- Plant power never tasted so good.
+- Deliciously kind to you and Earth.
+
+Brief: A travel booking platform that specializes in sustainable tourism.
+- Travel well, tread lightly.
+- Explore more, impact less.
+- See the world, save the planet.
+
+Brief: A streaming service for independent films and documentaries.
+- Stories untold. Voices unheard. Until now.
+- Discover cinema's hidden treasures.
+- Beyond mainstream. Beyond ordinary.
+
+Brief: A smart home security system that emphasizes ease of use and peace of mind.
+- Simple setup. Serious security.
+- Peace of mind, at your fingertips.
+- Smart security, sound sleep.
+
+Brief: A premium coffee subscription delivering globally sourced beans.
+- Travel the world, cup by cup.
+- Taste the world, one cup at a time.
+- World-class beans, delivered to your door.
+
+Brief: A skincare brand using only natural, ethically sourced ingredients.
+- Kind to skin, kind to Earth.
+- Pure ingredients, powerful results.
+- Naturally effective, ethically sourced.
+
+Brief: A financial app that helps young people save and invest.
+- Small steps today. Big future tomorrow.
+- Save smarter, dream bigger.
+- Building wealth, one tap at a time.
+
+Brief: A co-working space designed for creative professionals.
+- Where creativity finds community.
+- Space to create, community to thrive.
+- Your studio. Your network. Your success.
+
+Brief: An online education platform specializing in creative skills.
+- Creativity taught by creators.
+- Master your craft, unlock your future.
+- Learn. Create. Succeed.
+
+Brief: An energy drink for professionals who need sustained focus.
+- Clarity when it counts.
+- Sustained energy. Sharper focus.
+- Focus that lasts, energy that works.
+
+Brief: A meal kit service for busy families who want healthy dinners.
+- Dinner, sorted. Family, fed.
+- Healthy dinners in thirty minutes flat.
+- Fresh food, less fuss.
+
+Brief: A secondhand fashion marketplace for vintage and designer pieces.
+- Pre-loved. Still adored.
+- Style with a past, fashion with a future.
+- Wear the story.
+
+Brief: A language learning app built around short daily conversations.
+- Five minutes a day. A new voice.
+- Talk first, textbook later.
+- Speak it before you study it.
+"""
+
+SYSTEM_V2 = f"{RULES_V1}\n\n{STYLE_GUIDE_V2}\n{EXAMPLES_V2}"
+
+# (task, version) -> Template; ``{examples}`` is the few-shot block and a blank line, or empty
+TEMPLATES = {
+    ("taglines", "v1"): Template(RULES_V1, "{examples}Write five punchy taglines (≤7 words) for: {brief}"),
+    ("tagline", "v1"): Template(RULES_V1, "Write a punchy tagline (≤7 words) for: {brief}"),
+    ("batch", "v1"): Template(RULES_V1, BATCH_INSTRUCTIONS + "{brief}"),
+    ("taglines", "v2"): Template(
+        SYSTEM_V2, "Write five punchy taglines (≤7 words), one per line, for the brief below.\n\n{examples}Brief: {brief}"
+    ),
+    ("tagline", "v2"): Template(SYSTEM_V2, "Write one punchy tagline (≤7 words) for the brief below.\n\n{examples}Brief: {brief}"),
+    ("batch", "v2"): Template(SYSTEM_V2, BATCH_INSTRUCTIONS + "{brief}"),
+}
+
+VERSIONS = sorted({version for _, version in TEMPLATES})
+
+# "task/version" -> [requests, prompt tokens, cached tokens, completion tokens]
+_usage = {}
+_usage_lock = threading.Lock()
+
+
+def template(task, version=None):
+    """Return the ``Template`` for a task, default version ``PROMPT_VERSION``."""
+    version = version or config.prompt_version()
+    try:
+        return TEMPLATES[(task, version)]
+    except KeyError:
+        raise ValueError(f"no {task!r} prompt version {version!r}; expected one of {', '.join(VERSIONS)}") from None
+
+
+def messages(task, brief, examples=None, version=None):
+    """Return chat messages for a task: the shared prefix first, the brief last.
+
+    ``examples`` are retrieved few-shot examples (see retrieval.py); for
+    ``batch``, ``brief`` is a list of briefs.
+    """
+    chosen = template(task, version)
+    block = ""
+    if examples:
+        from retrieval import few_shot_block
+
+        block = few_shot_block(examples) + "\n\n"
+    if task == "batch":
+        brief = "\n".join(f"[{number}] {text}" for number, text in enumerate(brief, 1))
+    return [
+        {"role": "system", "content": chosen.system},
+        {"role": "user", "content": chosen.user.format(brief=brief, examples=block)},
+    ]
+
+
+def cached_tokens(usage):
+    """Prompt tokens served from the provider's cache, 0 if not reported."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return getattr(details, "cached_tokens", None) or 0
+
+
+def record_usage(task, usage, version=None):
+    """Add a response's token usage to the totals for its template."""
+    if usage is None:
+        return
+    key = f"{task}/{version or config.prompt_version()}"
+    with _usage_lock:
+        totals = _usage.setdefault(key, [0, 0, 0, 0])
+        totals[0] += 1
+        totals[1] += usage.prompt_tokens or 0
+        totals[2] += cached_tokens(usage)
+        totals[3] += usage.completion_tokens or 0
+
+
+def usage_totals():
+    """Return ``{"task/version": {requests, prompt_tokens, cached_tokens, completion_tokens}}``."""
+    with _usage_lock:
+        return {
+            key: dict(zip(("requests", "prompt_tokens", "cached_tokens", "completion_tokens"), totals))
+            for key, totals in _usage.items()
+        }
+
+
+def usage_summary():
+    """One line per template used: requests, tokens and the prompt cache hit rate."""
+    lines = []
+    for key, totals in sorted(usage_totals().items()):
+        prompt = totals["prompt_tokens"]
+        rate = totals["cached_tokens"] / prompt if prompt else 0.0
+        lines.append(
+            f"Prompt {key}: {totals['requests']} requests, {prompt} prompt tokens "
+            f"({totals['cached_tokens']} cached, {rate:.1%}), {totals['completion_tokens']} completion tokens"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Headless evaluation report.
+
+Computes what the evaluation and fine-tuning-prep notebooks show (model
+preferences, a one-sided binomial test, word counts, rank-by-position counts)
+in one vectorized pass over the database and writes a static HTML and
+Markdown report, e.g. from CI or a nightly job.
+
+Metrics and charts are cached in ``data/reports/cache/`` under a hash of the
+input rows, so an unchanged section is not recomputed or re-rendered. Charts
+that do need rendering are drawn in parallel worker processes.
+"""
+
+import argparse
+import base64
+import hashlib
+import html
+import json
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from profiling import add_profile_argument, profile_run, span
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+DEFAULT_REPORT_DIR = DATA_DIR / "reports"
+
+# Bump when metrics or charts change, to invalidate cached results
+REPORT_VERSION = "1"
+
+ALPHA = 0.05
+N_EXAMPLES = 20
+
+
+def load_inputs(data_dir=DATA_DIR, model=None):
+    """Return (model, judgments DataFrame, long tagline DataFrame)."""
+    import pandas as pd
+
+    from db import RESULTS_HEADER, open_db
+    from tagline_store import load_taglines
+
+    with open_db(data_dir=data_dir) as db:
+        model = model or db.current_model()
+        judgments = pd.DataFrame(db.judgments(model) if model else [], columns=RESULTS_HEADER)
+
+    try:
+        taglines = load_taglines(data_dir).to_pandas()
+        taglines["brief"] = taglines["brief"].astype(str)
+    except FileNotFoundError:
+        taglines = pd.DataFrame({"brief_id": [], "slot": [], "tagline": [], "rank": [], "brief": []})
+    return model, judgments, taglines
+
+
+def input_hash(name, df):
+    """Hash a section's input rows (and the report version) for the cache key."""
+    import pandas as pd
+
+    digest = hashlib.sha256(f"{REPORT_VERSION}:{name}:{len(df)}:{','.join(df.columns)}".encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def word_counts(series):
+    return series.fillna("").str.split().str.len()
+
+
+def evaluation_metrics(judgments):
+    """Preference counts, binomial test and word counts for judged pairs."""
+    from scipy import stats
+
+    n_total = len(judgments)
+    if not n_total:
+        return {"total_count": 0}
+
+    counts = judgments["preferred_model"].value_counts()
+    n_finetuned = int(counts.get("finetuned", 0))
+    n_baseline = int(counts.get("baseline", 0))
+    test = stats.binomtest(n_finetuned, n_total, p=0.5, alternative="greater")
+    ci = test.proportion_ci(confidence_level=1 - ALPHA)
+
+    words = {
+        column: word_counts(judgments[f"{column}_tagline"])
+        for column in ("baseline", "finetuned", "preferred")
+    }
+    return {
+        "total_count": n_total,
+        "baseline_count": n_baseline,
+        "finetuned_count": n_finetuned,
+        "baseline_percent": n_baseline / n_total * 100,
+        "finetuned_percent": n_finetuned / n_total * 100,
+        "finetuned_ci": [ci.low * 100, ci.high * 100],
+        "p_value": test.pvalue,
+        "significant": bool(test.pvalue < ALPHA),
+        "mean_words": {column: float(counts.mean()) for column, counts in words.items()},
+        "word_counts": {column: counts.tolist() for column, counts in words.items()},
+    }
+
+
+def ranking_metrics(taglines):
+    """Brief, tagline and rank counts, and how rank relates to slot and length."""
+    import pandas as pd
+
+    ranked = taglines[taglines["rank"].notna()].copy()
+    metrics = {
+        "brief_count": int(taglines["brief_id"].nunique()),
+        "tagline_count": len(taglines),
+        "ranked_brief_count": int(ranked["brief_id"].nunique()),
+    }
+    if ranked.empty:
+        return metrics
+
+    ranked["rank"] = ranked["rank"].astype(int)
+    ranked["words"] = word_counts(ranked["tagline"])
+    by_slot = pd.crosstab(ranked["rank"], ranked["slot"])
+    metrics.update({
+        "rank_by_slot": {
+            "ranks": by_slot.index.tolist(),
+            "slots": by_slot.columns.tolist(),
+            "counts": by_slot.values.tolist(),
+        },
+        "mean_words_by_rank": {int(rank): float(words) for rank, words in ranked.groupby("rank")["words"].mean().items()},
+        "top_slot_share": float((ranked.loc[ranked["rank"] == 1, "slot"] == 1).mean() * 100),
+    })
+    return metrics
+
+
+def render_chart(name, metrics, path):
+    """Draw one chart to a PNG file; runs in a worker process."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(7, 4))
+    if name == "preferences":
+        labels = ["baseline", "finetuned"]
+        values = [metrics["baseline_count"], metrics["finetuned_count"]]
+        bars = ax.bar(labels, values, color=["#8c8c8c", "#2a7ab0"])
+        for bar, value in zip(bars, values):
+            ax.annotate(f"{value / metrics['total_count'] * 100:.1f}%",
+                        (bar.get_x() + bar.get_width() / 2, bar.get_height()), ha="center", va="bottom")
+        ax.set_title("Model preferences")
+        ax.set_ylabel("Count")
+    elif name == "word_counts":
+        labels = list(metrics["word_counts"])
+        ax.boxplot([metrics["word_counts"][label] for label in labels])
+        ax.set_xticks(range(1, len(labels) + 1), labels)
+        ax.set_title("Word count distribution")
+        ax.set_ylabel("Words")
+    elif name == "rank_by_slot":
+        table = metrics["rank_by_slot"]
+        image = ax.imshow(table["counts"], cmap="YlGnBu")
+        ax.set_xticks(range(len(table["slots"])), table["slots"])
+        ax.set_yticks(range(len(table["ranks"])), table["ranks"])
+        for i, row in enumerate(table["counts"]):
+            for j, count in enumerate(row):
+                ax.text(j, i, count, ha="center", va="center")
+        fig.colorbar(image, ax=ax)
+        ax.set_title("Distribution of rankings")
+        ax.set_xlabel("Tagline position")
+        ax.set_ylabel("Rank (1 = best, 5 = worst)")
+    else:
+        raise ValueError(f"Unknown chart {name!r}")
+    fig.tight_layout()
+    fig.savefig(path, dpi=100)
+    plt.close(fig)
+    return path
+
+
+class Cache:
+    """Metrics (JSON) and charts (PNG) stored by section input hash."""
+
+    def __init__(self, cache_dir):
+        self.dir = Path(cache_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def metrics(self, name, key, compute):
+        path = self.dir / f"{name}-{key}.json"
+        if path.exists():
+            self.hits += 1
+            return json.loads(path.read_text())
+        self.misses += 1
+        metrics = compute()
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text(json.dumps(metrics))
+        tmp_path.replace(path)
+        return metrics
+
+    def chart_path(self, name, key):
+        return self.dir / f"chart-{name}-{key}.png"
+
+
+def build_sections(judgments, taglines, cache):
+    """Return ``{section: (key, metrics)}``, computing only uncached sections."""
+    sections = {}
+    with span("metrics"):
+        key = input_hash("evaluation", judgments)
+        sections["evaluation"] = (key, cache.metrics("evaluation", key, lambda: evaluation_metrics(judgments)))
+        # Only the columns the ranking metrics use, so brief edits don't invalidate them
+        ranking_input = taglines[["brief_id", "slot", "tagline", "rank"]]
+        key = input_hash("rankings", ranking_input)
+        sections["rankings"] = (key, cache.metrics("rankings", key, lambda: ranking_metrics(taglines)))
+    return sections
+
+
+def render_charts(sections, cache, workers=None):
+    """Render missing charts in parallel; return ``{chart: png path}``."""
+    wanted = {}
+    evaluation_key, evaluation = sections["evaluation"]
+    if evaluation["total_count"]:
+        wanted["preferences"] = (evaluation_key, evaluation)
+        wanted["word_counts"] = (evaluation_key, evaluation)
+    rankings_key, rankings = sections["rankings"]
+    if "rank_by_slot" in rankings:
+        wanted["rank_by_slot"] = (rankings_key, rankings)
+
+    paths = {name: cache.chart_path(name, key) for name, (key, _) in wanted.items()}
+    missing = [name for name, path in paths.items() if not path.exists()]
+    cache.hits += len(paths) - len(missing)
+    cache.misses += len(missing)
+    if missing:
+        with span("charts", n=len(missing)), ProcessPoolExecutor(max_workers=workers or len(missing)) as pool:
+            futures = [pool.submit(render_chart, name, wanted[name][1], paths[name]) for name in missing]
+            for future in futures:
+                future.result()
+    return paths
+
+
+def markdown_table(header, rows):
+    lines = ["| " + " | ".join(str(cell) for cell in header) + " |", "|" + " --- |" * len(header)]
+    for row in rows:
+        lines.append("| " + " | ".join(str(cell).replace("|", "\\|") for cell in row) + " |")
+    return "\n".join(lines)
+
+
+def report_blocks(model, sections, judgments):
+    """Return the report as a list of ("heading" | "text" | "table" | "chart", ...) blocks."""
+    blocks = [("heading", "ECD-Eye Evaluation Report")]
+    generated_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    blocks.append(("text", f"Generated {generated_at} for fine-tuned model {model or '(none)'}."))
+
+    _, evaluation = sections["evaluation"]
+    blocks.append(("heading", "Blind evaluation"))
+    if not evaluation["total_count"]:
+        blocks.append(("text", "No judged pairs yet; run the blind evaluation app first."))
+    else:
+        n_total = evaluation["total_count"]
+        low, high = evaluation["finetuned_ci"]
+        verdict = ("The fine-tuned model is significantly better than the baseline model."
+                   if evaluation["significant"] else
+                   "The difference between models is not statistically significant.")
+        blocks.append(("table", ["Model", "Preferred", "%"], [
+            ["baseline", f"{evaluation['baseline_count']}/{n_total}", f"{evaluation['baseline_percent']:.1f}"],
+            ["finetuned", f"{evaluation['finetuned_count']}/{n_total}", f"{evaluation['finetuned_percent']:.1f}"],
+        ]))
+        blocks.append(("text", f"Fine-tuned win rate 95% CI: {low:.1f}% to {high:.1f}%. "
+                               f"One-sided binomial test p-value: {evaluation['p_value']:.4f}. {verdict}"))
+        blocks.append(("chart", "preferences"))
+        blocks.append(("table", ["Taglines", "Mean words"], [
+            [column, f"{mean:.1f}"] for column, mean in evaluation["mean_words"].items()
+        ]))
+        blocks.append(("chart", "word_counts"))
+        blocks.append(("heading", "Example taglines"))
+        blocks.append(("table", ["Brief", "Baseline", "Fine-tuned", "Preferred"], [
+            [row.brief, row.baseline_tagline, row.finetuned_tagline, row.preferred_model]
+            for row in judgments.head(N_EXAMPLES).itertuples()
+        ]))
+
+    _, rankings = sections["rankings"]
+    blocks.append(("heading", "Rankings"))
+    blocks.append(("text", f"{rankings['brief_count']} briefs with {rankings['tagline_count']} generated taglines; "
+                           f"{rankings['ranked_brief_count']} briefs ranked."))
+    if "rank_by_slot" in rankings:
+        blocks.append(("chart", "rank_by_slot"))
+        blocks.append(("table", ["Rank", "Mean words"], [
+            [rank, f"{words:.1f}"] for rank, words in rankings["mean_words_by_rank"].items()
+        ]))
+        blocks.append(("text", f"The first generated tagline was ranked best for "
+                               f"{rankings['top_slot_share']:.1f}% of ranked briefs."))
+    return blocks
+
+
+def write_markdown(blocks, charts, path, chart_dir_name):
+    lines = []
+    for block in blocks:
+        kind = block[0]
+        if kind == "heading":
+            lines.append(("# " if not lines else "## ") + block[1])
+        elif kind == "text":
+            lines.append(block[1])
+        elif kind == "table":
+            lines.append(markdown_table(block[1], block[2]))
+        elif kind == "chart":
+            lines.append(f"![{block[1]}]({chart_dir_name}/{block[1]}.png)")
+        lines.append("")
+    path.write_text("\n".join(lines))
+
+
+def write_html(blocks, charts, path):
+    parts = []
+    for block in blocks:
+        kind = block[0]
+        if kind == "heading":
+            tag = "h1" if not parts else "h2"
+            parts.append(f"<{tag}>{html.escape(block[1])}</{tag}>")
+        elif kind == "text":
+            parts.append(f"<p>{html.escape(block[1])}</p>")
+        elif kind == "table":
+            header = "".join(f"<th>{html.escape(str(cell))}</th>" for cell in block[1])
+            rows = "".join(
+                "<tr>" + "".join(f"<td>{html.escape(str(cell))}</td>" for cell in row) + "</tr>"
+                for row in block[2]
+            )
+            parts.append(f"<table><thead><tr>{header}</tr></thead><tbody>{rows}</tbody></table>")
+        elif kind == "chart":
+            # Embedded so the report is a single self-contained file
+            data = base64.b64encode(charts[block[1]].read_bytes()).decode()
+            parts.append(f'<img alt="{block[1]}" src="data:image/png;base64,{data}">')
+    style = (
+        "body{font-family:sans-serif;max-width:960px;margin:2em auto;padding:0 1em}"
+        "table{border-collapse:collapse;margin:1em 0}td,th{border:1px solid #ccc;padding:4px 8px;text-align:left}"
+        "img{max-width:100%}"
+    )
+    path.write_text(
+        "<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>ECD-Eye Evaluation Report</title>"
+        f"<style>{style}</style></head><body>\n" + "\n".join(parts) + "\n</body></html>\n"
+    )
+
+
+def run(output_dir=DEFAULT_REPORT_DIR, formats=("html", "md"), model=None, workers=None, data_dir=DATA_DIR):
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    cache = Cache(Path(data_dir) / DEFAULT_REPORT_DIR.name / "cache")
+
+    with span("load"):
+        model, judgments, taglines = load_inputs(data_dir, model)
+    sections = build_sections(judgments, taglines, cache)
+    charts = render_charts(sections, cache, workers)
+
+    with span("write"):
+        blocks = report_blocks(model, sections, judgments)
+        written = []
+        if "md" in formats:
+            # Markdown links to chart files next to the report
+            chart_dir = output_dir / "report_files"
+            chart_dir.mkdir(exist_ok=True)
+            for name, path in charts.items():
+                shutil.copyfile(path, chart_dir / f"{name}.png")
+            write_markdown(blocks, charts, output_dir / "report.md", chart_dir.name)
+            written.append(output_dir / "report.md")
+        if "html" in formats:
+            write_html(blocks, charts, output_dir / "report.html")
+            written.append(output_dir / "report.html")
+
+    print(f"Cache: {cache.hits} hits, {cache.misses} misses")
+    for path in written:
+        print(f"Report saved to {path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_profile_argument(parser)
+    parser.add_argument("--output", default=str(DEFAULT_REPORT_DIR), help="report directory (default: data/reports)")
+    parser.add_argument("--format", default="html,md", help="comma-separated formats: html, md (default: both)")
+    parser.add_argument("--model", default=None, help="fine-tuned model to report on (default: current model)")
+    parser.add_argument("--workers", type=int, default=None, help="chart rendering processes (default: one per chart)")
+    args = parser.parse_args(argv)
+
+    formats = set(args.format.split(","))
+    if not formats <= {"html", "md"}:
+        parser.error(f"Unknown format in {args.format!r}; expected html and/or md")
+
+    with profile_run("report", args.profile):
+        run(args.output, formats, args.model, args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,335 @@
+"""
+Retries, circuit breaking and dead-lettering for OpenAI requests.
+
+``call_with_retry`` retries transient failures (429, 5xx, timeouts and
+connection errors) with exponential backoff and full jitter, honouring
+``Retry-After``. Other errors, such as 400, fail immediately. A 401 or 403
+means no request can succeed (a bad key, or a model the key may not use), so
+it raises ``RunAborted`` and the scripts stop instead of failing every brief.
+
+A ``CircuitBreaker`` watches the outcome of recent attempts. When the error
+rate spikes it opens: every caller waits out a cooldown instead of hammering
+the endpoint, then a single trial request decides whether to close it again
+while everyone else keeps waiting. The state is also written to a small JSON
+file, so separate worker processes sharing the data directory pause together
+and send one trial between them.
+
+``call_with_retry_async`` does the same for coroutines without blocking the
+event loop (see tagline_service.py).
+
+Briefs that still fail are appended to ``data/dead_letter.jsonl`` rather than
+written out as blank taglines, and can be re-run with ``--retry-failed``.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+
+import config
+import profiling
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+DEAD_LETTER_FILE = DATA_DIR / "dead_letter.jsonl"
+BREAKER_FILE = DATA_DIR / "circuit_breaker.json"
+
+RETRYABLE_STATUS = {408, 409, 429}
+ABORT_STATUS = {401, 403}
+
+
+class RunAborted(Exception):
+    """Raised when an error means every later request would fail too."""
+
+
+def max_attempts():
+    return int(config.get("RETRY_ATTEMPTS", "5"))
+
+
+def base_delay():
+    return float(config.get("RETRY_BASE_DELAY", "1"))
+
+
+def is_retryable(exc):
+    """Return True for errors worth retrying (rate limits, 5xx, network)."""
+    import openai
+
+    if isinstance(exc, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code in RETRYABLE_STATUS or exc.status_code >= 500
+    return False
+
+
+def aborts_run(exc):
+    """Return True for authentication and permission errors."""
+    import openai
+
+    return isinstance(exc, openai.APIStatusError) and exc.status_code in ABORT_STATUS
+
+
+def abort_error(exc):
+    return RunAborted(f"{type(exc).__name__}: {exc}; check OPENAI_API_KEY and the models it may use")
+
+
+def retry_after(exc):
+    """Seconds requested by a ``Retry-After`` header, if any."""
+    response = getattr(exc, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def backoff_delay(attempt, base=None, cap=60.0):
+    """Full-jitter exponential backoff for the given (0-based) retry attempt."""
+    base = base_delay() if base is None else base
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Open when the error rate of the last ``window`` attempts spikes.
+
+    The breaker opens once at least ``min_calls`` attempts are recorded and
+    the share of failures reaches ``threshold``. It stays open for
+    ``cooldown`` seconds, then half-opens: one caller is admitted as the
+    trial, and the rest wait until its outcome closes the breaker or opens it
+    again with the cooldown doubled (up to ``max_cooldown``). A trial that
+    reports nothing within ``trial_timeout`` seconds (e.g. its process died)
+    is replaced by another.
+
+    With a ``state_file``, the state lives in that file and the trial is
+    claimed by creating a file next to it, so processes sharing it behave as
+    one breaker.
+    """
+
+    def __init__(self, window=20, min_calls=10, threshold=0.5, cooldown=30.0, max_cooldown=300.0,
+                 state_file=BREAKER_FILE, trial_timeout=60.0, poll_interval=0.5):
+        self.outcomes = deque(maxlen=window)
+        self.min_calls = min_calls
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.state_file = Path(state_file) if state_file else None
+        self.trial_timeout = trial_timeout
+        self.poll_interval = poll_interval
+        self.open_until = 0.0  # 0 while closed
+        self.trips = 0
+        self._claimed = None
+        self._lock = threading.Lock()
+
+    def _state(self):
+        """Return ``(open_until, cooldown)``, from the shared file if there is one."""
+        if self.state_file is None:
+            return self.open_until, self.cooldown
+        try:
+            state = json.loads(self.state_file.read_text())
+        except (OSError, ValueError):
+            return 0.0, self.cooldown
+        return state.get("open_until", 0.0), state.get("cooldown", self.cooldown)
+
+    def _write_state(self):
+        if self.state_file is None:
+            return
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.state_file.with_name(f"{self.state_file.name}.tmp-{os.getpid()}")
+        tmp_file.write_text(json.dumps({"open_until": self.open_until, "cooldown": self.cooldown}))
+        tmp_file.replace(self.state_file)
+
+    def _claim(self, open_until, slot):
+        """Claim the trial for one ``trial_timeout`` slot of a half-open period; True if won."""
+        if self.state_file is None:
+            if self._claimed == (open_until, slot):
+                return False
+            self._claimed = (open_until, slot)
+            return True
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        claim_file = self.state_file.with_name(f"{self.state_file.name}.trial-{open_until:.3f}-{slot}")
+        try:
+            os.close(os.open(claim_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return False
+        return True
+
+    def _release_claims(self):
+        if self.state_file is not None:
+            for claim_file in self.state_file.parent.glob(f"{self.state_file.name}.trial-*"):
+                claim_file.unlink(missing_ok=True)
+
+    def remaining(self):
+        """Seconds until the breaker (or another process's breaker) half-opens."""
+        open_until, _ = self._state()
+        return open_until - time.time() if open_until else 0.0
+
+    def _admit(self):
+        """Return ``(delay, trial)``: seconds to wait before asking again, else 0 and
+        whether the caller is the half-open trial."""
+        with self._lock:
+            open_until, _ = self._state()
+            if not open_until:
+                return 0.0, False
+            now = time.time()
+            if now < open_until:
+                return open_until - now, False
+            slot = int((now - open_until) // self.trial_timeout)
+            if self._claim(open_until, slot):
+                return 0.0, True
+            return min(self.poll_interval, open_until + (slot + 1) * self.trial_timeout - now), False
+
+    def wait(self):
+        """Block while the breaker is open or another caller's trial is pending.
+
+        Returns True if the caller is the trial; it must pass that to ``record``.
+        """
+        remaining = self.remaining()
+        if remaining > 0:
+            print(f"Circuit open after repeated errors; pausing {remaining:.0f}s")
+        while True:
+            delay, trial = self._admit()
+            if delay <= 0:
+                return trial
+            profiling.sleep(delay)
+
+    async def wait_async(self):
+        """Like ``wait``, but sleeps without blocking the event loop."""
+        import asyncio
+
+        remaining = self.remaining()
+        if remaining > 0:
+            print(f"Circuit open after repeated errors; pausing {remaining:.0f}s")
+        while True:
+            delay, trial = self._admit()
+            if delay <= 0:
+                return trial
+            await asyncio.sleep(delay)
+
+    def record(self, ok, trial=False):
+        with self._lock:
+            if trial:
+                self._release_claims()
+                if ok:
+                    self._close()
+                else:
+                    _, cooldown = self._state()
+                    self.cooldown = min(max(self.cooldown, cooldown) * 2, self.max_cooldown)
+                    self._open()
+                return
+            if self._state()[0]:
+                return  # Sent before the breaker opened; only the trial decides now
+            self.outcomes.append(ok)
+            failures = self.outcomes.count(False)
+            if len(self.outcomes) >= self.min_calls and failures / len(self.outcomes) >= self.threshold:
+                self._open()
+
+    def _open(self):
+        self.open_until = time.time() + self.cooldown
+        self.outcomes.clear()
+        self.trips += 1
+        self._write_state()
+
+    def _close(self):
+        self.open_until = 0.0
+        self.cooldown = self.base_cooldown
+        self.outcomes.clear()
+        self._write_state()
+
+
+def call_with_retry(fn, breaker=None, attempts=None):
+    """Call ``fn()``; retry transient errors with backoff, re-raise the rest."""
+    attempts = attempts or max_attempts()
+    for attempt in range(attempts):
+        trial = breaker.wait() if breaker is not None else False
+        try:
+            result = fn()
+        except Exception as e:
+            retryable = is_retryable(e)
+            if breaker is not None and (retryable or trial):
+                # A non-retryable error still shows the endpoint is answering
+                breaker.record(not retryable, trial)
+            if aborts_run(e):
+                raise abort_error(e) from e
+            if not retryable or attempt == attempts - 1:
+                raise
+            delay = max(backoff_delay(attempt), retry_after(e) or 0)
+            print(f"Retrying in {delay:.1f}s after {type(e).__name__}: {e}")
+            profiling.sleep(delay)
+        else:
+            if breaker is not None:
+                breaker.record(True, trial)
+            return result
+
+
+async def call_with_retry_async(fn, breaker=None, attempts=None):
+    """Await ``fn()``; retry transient errors with backoff, re-raise the rest."""
+    import asyncio
+
+    attempts = attempts or max_attempts()
+    for attempt in range(attempts):
+        trial = await breaker.wait_async() if breaker is not None else False
+        try:
+            result = await fn()
+        except Exception as e:
+            retryable = is_retryable(e)
+            if breaker is not None and (retryable or trial):
+                # A non-retryable error still shows the endpoint is answering
+                breaker.record(not retryable, trial)
+            if aborts_run(e):
+                raise abort_error(e) from e
+            if not retryable or attempt == attempts - 1:
+                raise
+            delay = max(backoff_delay(attempt), retry_after(e) or 0)
+            print(f"Retrying in {delay:.1f}s after {type(e).__name__}: {e}")
+            await asyncio.sleep(delay)
+        else:
+            if breaker is not None:
+                breaker.record(True, trial)
+            return result
+
+
+def record_failure(script, brief_id, brief, error, model=None, path=DEAD_LETTER_FILE):
+    """Append a permanently failed brief to the dead-letter file."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    record = {
+        "script": script,
+        "brief_id": brief_id,
+        "brief": brief,
+        "model": model,
+        "error": f"{type(error).__name__}: {error}",
+        "failed_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def load_failures(script, path=DEAD_LETTER_FILE):
+    """Return ``{brief_id: latest record}`` for a script's dead letters."""
+    failures = {}
+    if Path(path).exists():
+        with open(path, "r") as f:
+            for line in f:
+                record = json.loads(line)
+                if record["script"] == script:
+                    failures[record["brief_id"]] = record
+    return failures
+
+
+def clear_failures(script, brief_ids, path=DEAD_LETTER_FILE):
+    """Remove a script's dead letters for ``brief_ids`` (e.g. after a re-run)."""
+    path = Path(path)
+    if not path.exists():
+        return
+    brief_ids = set(brief_ids)
+    with open(path, "r") as f:
+        records = [json.loads(line) for line in f]
+    kept = [r for r in records if not (r["script"] == script and r["brief_id"] in brief_ids)]
+    tmp_file = path.with_name(path.name + ".tmp")
+    with open(tmp_file, "w") as f:
+        for record in kept:
+            f.write(json.dumps(record) + "\n")
+    tmp_file.replace(path)
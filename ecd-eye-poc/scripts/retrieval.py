@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Local similarity index over ranked briefs for few-shot prompting.
+
+Each ranked brief is embedded as a signed feature-hashing vector of word
+unigrams and bigrams (sublinear TF, L2-normalised) and stored with its
+top-ranked taglines. Queries are IDF-weighted using document frequencies kept
+alongside the index, so the index can grow by appending rows without
+re-embedding anything.
+
+A brief has a few dozen non-zero buckets, so the vectors are stored sparsely
+(CSR) in append-only files under ``data/retrieval/``:
+
+    buckets.u16   bucket of each non-zero entry, row by row
+    values.f32    value of each non-zero entry
+    offsets.i64   end of each row's entries in the two files above
+    items.jsonl   brief_id, brief and top taglines for each row
+    df.npy        document frequency per hash bucket
+    meta.json     dimension, row count and entry count
+
+On the first search the entries are regrouped into a posting list per bucket
+(a transposed SciPy CSR matrix), and a query only scores the postings of its
+own non-zero buckets. Indexes written by older versions as a dense
+``vectors.f32`` matrix are converted on open. If ``faiss`` is installed, ``--ann`` builds an HNSW index instead.
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import zlib
+from pathlib import Path
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+DEFAULT_INDEX_DIR = DATA_DIR / "retrieval"
+
+# Wide enough that a brief's few dozen features rarely collide; an existing
+# index keeps the dimension it was built with until ``update --rebuild``
+DEFAULT_DIM = 4096
+# Buckets are stored as uint16
+MAX_DIM = 1 << 16
+TOP_TAGLINES = 2
+
+# Rows densified per step when building the faiss index
+ANN_CHUNK = 4096
+
+TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+# Words that say nothing about the product being briefed
+STOP_WORDS = {
+    "a", "an", "and", "the", "for", "of", "to", "that", "with", "on", "in", "its", "their",
+    "write", "create", "develop", "tagline", "new", "which", "who", "is", "are", "by",
+}
+
+
+def features(text):
+    """Return unigram and bigram features for a brief."""
+    words = [word for word in TOKEN_RE.findall(text.lower()) if word not in STOP_WORDS]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def hash_counts(text, dim):
+    """Return ``{bucket: signed count}`` for a brief's hashed features."""
+    counts = {}
+    for feature in features(text):
+        h = zlib.crc32(feature.encode("utf-8"))
+        bucket = h % dim
+        sign = 1.0 if (h >> 31) & 1 else -1.0
+        counts[bucket] = counts.get(bucket, 0.0) + sign
+    return counts
+
+
+def embed_sparse(texts, dim=DEFAULT_DIM):
+    """Embed texts as L2-normalised sublinear-TF hashing vectors in CSR form.
+
+    Returns ``(lengths, buckets, values)``: the number of non-zero entries per
+    text, then every text's entries in bucket order.
+    """
+    import numpy as np
+
+    lengths, buckets, values = [], [], []
+    for text in texts:
+        row = sorted((bucket, count) for bucket, count in hash_counts(text, dim).items() if count)
+        weights = [math.copysign(1.0 + math.log(abs(count)), count) for _, count in row]
+        norm = math.sqrt(sum(weight * weight for weight in weights)) or 1.0
+        lengths.append(len(row))
+        buckets.extend(bucket for bucket, _ in row)
+        values.extend(weight / norm for weight in weights)
+    return (
+        np.array(lengths, dtype=np.int64),
+        np.array(buckets, dtype=np.uint16),
+        np.array(values, dtype=np.float32),
+    )
+
+
+def embed(texts, dim=DEFAULT_DIM):
+    """Embed texts as dense L2-normalised sublinear-TF hashing vectors."""
+    import numpy as np
+
+    lengths, buckets, values = embed_sparse(texts, dim)
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    matrix[np.repeat(np.arange(len(texts)), lengths), buckets] = values
+    return matrix
+
+
+class RetrievalIndex:
+    """Append-only similarity index over ranked briefs."""
+
+    def __init__(self, index_dir=DEFAULT_INDEX_DIR, dim=DEFAULT_DIM):
+        import numpy as np
+
+        self.index_dir = Path(index_dir)
+        self.meta_file = self.index_dir / "meta.json"
+        self.buckets_file = self.index_dir / "buckets.u16"
+        self.values_file = self.index_dir / "values.f32"
+        self.offsets_file = self.index_dir / "offsets.i64"
+        self.items_file = self.index_dir / "items.jsonl"
+        self.df_file = self.index_dir / "df.npy"
+
+        meta = json.loads(self.meta_file.read_text()) if self.meta_file.exists() else {}
+        self.dim = meta.get("dim", dim)
+        self.count = meta.get("count", 0)
+        self.nnz = meta.get("nnz", 0)
+        if self.dim > MAX_DIM:
+            raise ValueError(f"retrieval index dimension {self.dim} exceeds {MAX_DIM}")
+
+        self.df = np.load(self.df_file) if self.df_file.exists() else np.zeros(self.dim, dtype=np.int64)
+        self.items = []
+        if self.items_file.exists():
+            with open(self.items_file, "r") as f:
+                self.items = [json.loads(line) for line in f]
+        self._discard_partial_append()
+
+        # Latest row per brief; older rows for a re-ranked brief are ignored
+        self.row_of = {item["brief_id"]: row for row, item in enumerate(self.items)}
+        self._postings = None
+        self._ann = None
+        if meta and meta.get("format") != "sparse":
+            self._convert_dense()
+
+    def _discard_partial_append(self):
+        """Drop rows written after the last meta.json update (e.g. a crash)."""
+        if len(self.items) > self.count:
+            self.items = self.items[: self.count]
+            with open(self.items_file, "w") as f:
+                for item in self.items:
+                    f.write(json.dumps(item) + "\n")
+        for path, size in (
+            (self.offsets_file, self.count * 8),
+            (self.buckets_file, self.nnz * 2),
+            (self.values_file, self.nnz * 4),
+        ):
+            if path.exists() and path.stat().st_size != size:
+                os.truncate(path, size)
+
+    def _convert_dense(self):
+        """Re-embed an index written as a dense ``vectors.f32`` matrix in the sparse format."""
+        import numpy as np
+
+        items = self.items
+        self.items, self.row_of, self.count, self.nnz = [], {}, 0, 0
+        self.df = np.zeros(self.dim, dtype=np.int64)
+        for path in (self.offsets_file, self.buckets_file, self.values_file, self.items_file):
+            path.unlink(missing_ok=True)
+        self.add(items)
+        (self.index_dir / "vectors.f32").unlink(missing_ok=True)
+
+    def matrix(self):
+        """Read the stored vectors as a SciPy CSR matrix, one row per indexed brief."""
+        import numpy as np
+        from scipy import sparse
+
+        offsets = np.zeros(self.count + 1, dtype=np.int64)
+        if self.count:
+            offsets[1:] = np.fromfile(self.offsets_file, dtype=np.int64, count=self.count)
+            buckets = np.fromfile(self.buckets_file, dtype=np.uint16, count=self.nnz).astype(np.int32)
+            values = np.fromfile(self.values_file, dtype=np.float32, count=self.nnz)
+        else:
+            buckets, values = np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        return sparse.csr_matrix((values, buckets, offsets), shape=(self.count, self.dim))
+
+    @property
+    def postings(self):
+        """Bucket-major CSR matrix: row b lists the indexed briefs with bucket b and their values."""
+        if self._postings is None:
+            self._postings = self.matrix().T.tocsr()
+        return self._postings
+
+    def __len__(self):
+        return len(self.row_of)
+
+    def add(self, items):
+        """Append items (dicts with brief_id, brief and taglines) to the index."""
+        import numpy as np
+
+        items = list(items)
+        if not items:
+            return 0
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+
+        lengths, buckets, values = embed_sparse([item["brief"] for item in items], self.dim)
+        self.df += np.bincount(buckets, minlength=self.dim)
+
+        with open(self.offsets_file, "ab") as f:
+            f.write((self.nnz + np.cumsum(lengths)).astype(np.int64).tobytes())
+        with open(self.buckets_file, "ab") as f:
+            f.write(buckets.tobytes())
+        with open(self.values_file, "ab") as f:
+            f.write(values.tobytes())
+        with open(self.items_file, "a") as f:
+            for item in items:
+                f.write(json.dumps(item) + "\n")
+        np.save(self.df_file, self.df)
+
+        for item in items:
+            self.row_of[item["brief_id"]] = len(self.items)
+            self.items.append(item)
+        self.count = len(self.items)
+        self.nnz += len(buckets)
+        # meta.json is written last so a crash never exposes a partial row
+        self.meta_file.write_text(json.dumps(
+            {"format": "sparse", "dim": self.dim, "count": self.count, "nnz": self.nnz}
+        ))
+
+        self._postings = None
+        self._ann = None
+        return len(items)
+
+    def _query_vector(self, brief):
+        import numpy as np
+
+        query = embed([brief], self.dim)[0]
+        idf = np.log((1.0 + self.count) / (1.0 + self.df)) + 1.0
+        query *= idf
+        norm = np.linalg.norm(query)
+        return query / norm if norm else query
+
+    def scores(self, query):
+        """Dot product of every row with a dense query, from the query buckets' postings."""
+        import numpy as np
+
+        buckets = np.flatnonzero(query)
+        return self.postings[buckets].T @ query[buckets].astype(np.float32)
+
+    def build_ann(self):
+        """Build an HNSW index with faiss (optional dependency)."""
+        import faiss
+        import numpy as np
+
+        ann = faiss.IndexHNSWFlat(self.dim, 32, faiss.METRIC_INNER_PRODUCT)
+        matrix = self.matrix()
+        for start in range(0, self.count, ANN_CHUNK):
+            ann.add(np.ascontiguousarray(matrix[start:start + ANN_CHUNK].toarray(), dtype=np.float32))
+        self._ann = ann
+        return ann
+
+    def search(self, brief, k=3, exclude_ids=()):
+        """Return up to ``k`` ``(score, item)`` pairs for the most similar briefs."""
+        import numpy as np
+
+        if not self.row_of:
+            return []
+
+        query = self._query_vector(brief)
+        # Over-fetch so superseded and excluded rows can be skipped
+        n_candidates = min(self.count, k + len(exclude_ids) + (self.count - len(self.row_of)))
+
+        if self._ann is not None:
+            scores, rows = self._ann.search(query[None, :].astype(np.float32), n_candidates)
+            candidates = [(float(score), int(row)) for score, row in zip(scores[0], rows[0]) if row >= 0]
+        else:
+            scores = self.scores(query)
+            rows = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+            rows = rows[np.argsort(-scores[rows])]
+            candidates = [(float(scores[row]), int(row)) for row in rows]
+
+        results = []
+        exclude_ids = set(exclude_ids)
+        for score, row in candidates:
+            item = self.items[row]
+            if self.row_of.get(item["brief_id"]) != row or item["brief_id"] in exclude_ids:
+                continue
+            results.append((score, item))
+            if len(results) == k:
+                break
+        return results
+
+    def few_shot_examples(self, brief, k=3, exclude_ids=()):
+        """Return the top-ranked taglines of the ``k`` most similar past briefs."""
+        return [
+            {"brief": item["brief"], "taglines": item["taglines"]}
+            for _, item in self.search(brief, k, exclude_ids)
+        ]
+
+
+def ranked_items(table, top=TOP_TAGLINES):
+    """Yield index items from the long tagline table, best taglines first."""
+    import pyarrow.compute as pc
+
+    ranked = table.filter(pc.less_equal(table["rank"], top))
+    ranked = ranked.sort_by([("brief_id", "ascending"), ("rank", "ascending")])
+    items = {}
+    for brief_id, brief, tagline in zip(
+        ranked["brief_id"].to_pylist(), ranked["brief"].to_pylist(), ranked["tagline"].to_pylist()
+    ):
+        item = items.setdefault(brief_id, {"brief_id": brief_id, "brief": brief, "taglines": []})
+        item["taglines"].append(tagline)
+    return items.values()
+
+
+def update_index(data_dir=DATA_DIR, index_dir=None, rebuild=False):
+    """Add briefs ranked since the last update; return the number added.
+
+    A brief whose top taglines changed is appended again and its old row is
+    ignored from then on.
+    """
+    import shutil
+    from tagline_store import load_taglines
+
+    index_dir = Path(index_dir) if index_dir else Path(data_dir) / DEFAULT_INDEX_DIR.name
+    if rebuild and index_dir.exists():
+        shutil.rmtree(index_dir)
+
+    index = RetrievalIndex(index_dir)
+    current = {item["brief_id"]: item for item in (index.items[row] for row in index.row_of.values())}
+    new_items = [
+        item for item in ranked_items(load_taglines(data_dir))
+        if current.get(item["brief_id"]) != item
+    ]
+    return index.add(new_items)
+
+
+def few_shot_block(examples):
+    """Format retrieved examples for the user prompt."""
+    lines = ["Taglines our ECD ranked highest for similar briefs:"]
+    for example in examples:
+        lines.append(f"- Brief: {example['brief']}")
+        lines.extend(f"  * {tagline}" for tagline in example["taglines"])
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and query the few-shot retrieval index.")
+    parser.add_argument("--index-dir", default=str(DEFAULT_INDEX_DIR))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    update_parser = subparsers.add_parser("update", help="index briefs ranked since the last update")
+    update_parser.add_argument("--rebuild", action="store_true", help="discard and rebuild the index")
+
+    query_parser = subparsers.add_parser("query", help="show the nearest ranked briefs for a brief")
+    query_parser.add_argument("brief")
+    query_parser.add_argument("-k", type=int, default=3)
+    query_parser.add_argument("--ann", action="store_true", help="search with a faiss HNSW index")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "update":
+        added = update_index(DATA_DIR, args.index_dir, rebuild=args.rebuild)
+        print(f"Indexed {added} briefs ({len(RetrievalIndex(args.index_dir))} total)")
+    elif args.command == "query":
+        import time
+
+        index = RetrievalIndex(args.index_dir)
+        if args.ann:
+            index.build_ann()
+        else:
+            index.postings  # Built once per process; not part of a search
+        start = time.perf_counter()
+        results = index.search(args.brief, args.k)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        for score, item in results:
+            print(f"{score:.3f}  [{item['brief_id']}] {item['brief']}")
+            for tagline in item["taglines"]:
+                print(f"         {tagline}")
+        print(f"Searched {len(index)} briefs in {elapsed_ms:.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
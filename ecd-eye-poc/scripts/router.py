@@ -0,0 +1,263 @@
+"""
+Cost- and latency-aware routing of tagline requests across models.
+
+Every brief is first sent to the cheapest model. Its taglines are checked
+locally (word limit, duplicates, banned phrases) and only briefs that come
+back short of valid taglines are escalated to the next, stronger model, e.g.
+``gpt-4o-mini`` -> ``gpt-4o`` -> a fine-tuned model. Escalations wait in a
+priority queue, worst briefs and cheaper tiers first, so that when the per-run
+budget runs out it has been spent where it matters most.
+"""
+
+import heapq
+import re
+import time
+
+from prompts import cached_tokens
+from resilience import RunAborted
+
+MAX_WORDS = 7
+
+BANNED_PHRASES = (
+    "unleash", "elevate your", "game changer", "game-changer", "next level",
+    "revolutionize", "like never before", "redefine",
+)
+
+# USD per 1M (prompt, completion) tokens; matched by longest model-name prefix
+MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "ft:gpt-3.5-turbo": (3.00, 6.00),
+    "ft:gpt-4o-mini": (0.30, 1.20),
+    "ft:gpt-4o": (3.75, 15.00),
+}
+
+# Share of the prompt price charged for tokens served from the provider's
+# prompt cache (half or less, depending on the model)
+CACHED_PROMPT_RATE = 0.5
+
+# Token usage assumed for a model before any of its responses have been seen
+DEFAULT_USAGE = (200, 60)
+
+NUMBERING_RE = re.compile(r"^\s*(?:\d+[.)]|[-*•])\s*")
+NORMALISE_RE = re.compile(r"[^a-z0-9 ]+")
+
+
+class BudgetExceeded(Exception):
+    """Raised when a first-pass request would exceed the run budget."""
+
+
+def price(model):
+    """Return ``(prompt, completion)`` USD per 1M tokens for a model.
+
+    Unknown models are priced like the most expensive known one so that the
+    budget is never underestimated.
+    """
+    matches = [prefix for prefix in MODEL_PRICES if model.startswith(prefix)]
+    if matches:
+        return MODEL_PRICES[max(matches, key=len)]
+    return max(MODEL_PRICES.values(), key=sum)
+
+
+def request_cost(model, prompt_tokens, completion_tokens, cached=0):
+    """USD for a request; ``cached`` of the prompt tokens were cache hits."""
+    prompt_price, completion_price = price(model)
+    prompt_cost = (prompt_tokens - cached + cached * CACHED_PROMPT_RATE) * prompt_price
+    return (prompt_cost + completion_tokens * completion_price) / 1e6
+
+
+def clean_tagline(tagline):
+    """Strip list numbering, bullets and surrounding quotes."""
+    return NUMBERING_RE.sub("", tagline).strip().strip('"“”').strip()
+
+
+def normalise(tagline):
+    """Lower-case a tagline and drop punctuation for duplicate checks."""
+    return " ".join(NORMALISE_RE.sub(" ", tagline.lower().replace("-", " ")).split())
+
+
+def tagline_problem(tagline, seen=(), max_words=MAX_WORDS, banned=BANNED_PHRASES):
+    """Return why a tagline fails the local checks, or None if it passes.
+
+    ``seen`` holds normalised taglines already accepted for the same brief.
+    """
+    if not tagline:
+        return "empty"
+    if len(tagline.split()) > max_words:
+        return "too long"
+    normalised = normalise(tagline)
+    if normalised in seen:
+        return "duplicate"
+    for phrase in banned:
+        if normalise(phrase) in normalised:
+            return f"banned phrase: {phrase}"
+    return None
+
+
+class Router:
+    """Route briefs through ``models`` (cheapest first) under a USD budget.
+
+    ``request(brief, model)`` must return ``(lines, usage)`` where ``usage``
+    has ``prompt_tokens`` and ``completion_tokens`` (an OpenAI usage object or
+    None). ``brief`` is whatever the caller submitted and is passed through
+    untouched. Exceptions from ``request`` count as a failed tier.
+    """
+
+    def __init__(self, models, request, need=5, budget=None,
+                 max_words=MAX_WORDS, banned=BANNED_PHRASES):
+        if not models:
+            raise ValueError("Router needs at least one model")
+        self.models = list(models)
+        self.request = request
+        self.need = need
+        self.budget = budget
+        self.max_words = max_words
+        self.banned = banned
+        self.spent = 0.0
+        self.stats = {
+            model: {"requests": 0, "errors": 0, "cost": 0.0, "latency": 0.0, "accepted": 0}
+            for model in self.models
+        }
+        self._queue = []
+        self._seq = 0
+
+    def estimate(self, model):
+        """Expected cost of one request, from the model's average so far."""
+        stats = self.stats[model]
+        if stats["requests"]:
+            return stats["cost"] / stats["requests"]
+        return request_cost(model, *DEFAULT_USAGE)
+
+    def affordable(self, model):
+        return self.budget is None or self.spent + self.estimate(model) <= self.budget
+
+    def _call(self, brief, model):
+        """Request taglines from one model; return the raw lines (or [] on error)."""
+        stats = self.stats[model]
+        start = time.perf_counter()
+        try:
+            lines, usage = self.request(brief, model)
+            if usage is not None:
+                cost = request_cost(model, usage.prompt_tokens, usage.completion_tokens, cached_tokens(usage))
+            else:
+                cost = request_cost(model, *DEFAULT_USAGE)
+        except RunAborted:
+            raise
+        except Exception as e:
+            print(f"Error generating taglines with {model}: {e}")
+            lines, cost = [], 0.0
+            stats["errors"] += 1
+        stats["latency"] += time.perf_counter() - start
+        stats["requests"] += 1
+        stats["cost"] += cost
+        self.spent += cost
+        return lines
+
+    def _merge(self, accepted, rejected, lines, model):
+        """Add valid new lines to ``accepted`` and failing ones to ``rejected``."""
+        seen = {normalise(tagline) for tagline, _ in accepted}
+        for line in lines:
+            tagline = clean_tagline(line)
+            if len(accepted) >= self.need:
+                break
+            if tagline_problem(tagline, seen, self.max_words, self.banned) is None:
+                accepted.append((tagline, model))
+                seen.add(normalise(tagline))
+            elif tagline:
+                rejected.append(tagline)
+
+    def _attempt(self, item, tier):
+        brief, accepted, rejected = item
+        model = self.models[tier]
+        self._merge(accepted, rejected, self._call(brief, model), model)
+        return len(accepted) >= self.need
+
+    def submit(self, brief):
+        """Run the first-pass model on a brief.
+
+        Returns the final taglines if they all pass, otherwise None and the
+        brief is queued for escalation. Raises BudgetExceeded if the budget
+        cannot cover the request.
+        """
+        if not self.affordable(self.models[0]):
+            raise BudgetExceeded(
+                f"Budget of ${self.budget:.4f} cannot cover another {self.models[0]} request "
+                f"(spent ${self.spent:.4f})"
+            )
+        item = (brief, [], [])
+        if self._attempt(item, 0):
+            return self._finish(item)
+        self._push(item, 1)
+        return None
+
+    def _push(self, item, tier):
+        # Cheaper tiers first, then the briefs with the fewest valid taglines
+        self._seq += 1
+        heapq.heappush(self._queue, (tier, len(item[1]), self._seq, item))
+
+    def escalate(self):
+        """Drain the escalation queue; yield ``(brief, taglines)`` per brief.
+
+        Briefs that run out of tiers or budget are finished best-effort: valid
+        taglines first, then the least-bad rejected ones, which may still be
+        fewer than needed. Briefs for which every request failed yield None.
+        """
+        while self._queue:
+            tier, _, _, item = heapq.heappop(self._queue)
+            if tier < len(self.models) and self.affordable(self.models[tier]):
+                if not self._attempt(item, tier):
+                    self._push(item, tier + 1)
+                    continue
+            yield item[0], self._finish(item)
+
+    def route(self, brief):
+        """Route a single brief through as many tiers as it needs, synchronously.
+
+        For interactive use; the escalation queue must be empty.
+        """
+        taglines = self.submit(brief)
+        if taglines is None:
+            for _, taglines in self.escalate():
+                pass
+        return taglines
+
+    def _finish(self, item):
+        _, accepted, rejected = item
+        if not accepted and not rejected:
+            return None
+        for _, model in accepted:
+            self.stats[model]["accepted"] += 1
+        taglines = [tagline for tagline, _ in accepted]
+        seen = {normalise(tagline) for tagline in taglines}
+        fallback = {normalise(tagline): tagline for tagline in reversed(rejected)}
+        fallback = sorted(
+            (tagline for key, tagline in fallback.items() if key not in seen),
+            key=lambda tagline: len(tagline.split()),
+        )
+        return taglines + fallback[: self.need - len(taglines)]
+
+    def summary(self):
+        """Return a plain-text report of spend and latency per model."""
+        lines = [f"{'model':<32} {'requests':>8} {'errors':>6} {'accepted':>8} {'cost $':>9} {'avg s':>7}"]
+        total_accepted = 0
+        total_latency = 0.0
+        for model, stats in self.stats.items():
+            avg_latency = stats["latency"] / stats["requests"] if stats["requests"] else 0.0
+            lines.append(
+                f"{model:<32} {stats['requests']:>8} {stats['errors']:>6} {stats['accepted']:>8} "
+                f"{stats['cost']:>9.4f} {avg_latency:>7.2f}"
+            )
+            total_accepted += stats["accepted"]
+            total_latency += stats["latency"]
+        if total_accepted:
+            lines.append(
+                f"Per accepted tagline: ${self.spent / total_accepted:.6f}, "
+                f"{total_latency / total_accepted:.3f} s"
+            )
+        budget = f" of ${self.budget:.4f}" if self.budget is not None else ""
+        lines.append(f"Spent ${self.spent:.4f}{budget}")
+        return "\n".join(lines)
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Local learned tagline scorer.
+
+A linear model over signed feature-hashing vectors of each tagline's words,
+word bigrams and length, trained as a pairwise ranker (logistic loss on the
+score difference of every better/worse pair in the ECD rankings, see
+``prepare_finetune.py --pairs``). A batch is featurised and scored in a
+handful of NumPy passes: once the model is loaded, 100,000 taglines take
+100-200 ms (500 to 1,000 a millisecond; the first large batch also builds the
+hash power tables).
+
+The ranking form shows each brief's taglines best-predicted first with the
+predicted ranks preselected, so the ECD mostly confirms; ``generate_baseline.py
+--overgenerate S`` asks for S sets of five and keeps the five best scored.
+
+The model is saved to ``data/scorer.npz``; ``train`` holds out a tenth of the
+ranked briefs and reports how often the model agrees with the ECD.
+"""
+
+import argparse
+import json
+import re
+import sys
+import threading
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+DEFAULT_MODEL_FILE = DATA_DIR / "scorer.npz"
+
+DEFAULT_DIM = 1 << 16
+DEFAULT_L2 = 1e-3
+HOLDOUT = 10  # One brief in HOLDOUT is held out for evaluation
+MAX_LENGTH_FEATURE = 12
+
+# Byte table for the batch text: word characters are kept (letters lowercased),
+# newlines separate taglines and everything else becomes a space
+_WORD_BYTES = b"abcdefghijklmnopqrstuvwxyz0123456789'"
+BYTE_TABLE = bytes(
+    c if c in _WORD_BYTES else c + 32 if 65 <= c <= 90 else 10 if c == 10 else 32 for c in range(256)
+)
+SPACE, NEWLINE = 32, 10
+
+POLY = 0x100000001B3  # Odd, so invertible modulo 2**64
+POLY_INVERSE = pow(POLY, -1, 1 << 64)
+BIGRAM_MULTIPLIER = 0x9E3779B97F4A7C15
+LENGTH_TAG = 0x4C454E47 << 32
+
+# (POLY**i, POLY**-i) for i below the length of the longest batch so far
+_powers = None
+_powers_lock = threading.Lock()
+
+
+def _poly_powers(n):
+    import numpy as np
+
+    global _powers
+    with _powers_lock:
+        if _powers is None or len(_powers[0]) < n:
+            size = max(n, 2 * len(_powers[0]) if _powers else 1 << 16)
+            with np.errstate(over="ignore"):
+                _powers = tuple(
+                    np.cumprod(np.r_[np.uint64(1), np.full(size - 1, base, dtype=np.uint64)])
+                    for base in (POLY, POLY_INVERSE)
+                )
+        return _powers
+
+
+def _mix(h):
+    """Hash uint64s to 32 bits (the splitmix64 finaliser, keeping the high half)."""
+    import numpy as np
+
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return (h ^ (h >> np.uint64(31))) >> np.uint64(32)
+
+
+def feature_hashes(taglines):
+    """Return ``(rows, hashes)``: the 32-bit hashes of every tagline's features.
+
+    Features are words, word bigrams and the word count. The batch is hashed
+    as one byte buffer with NumPy: each word's polynomial hash is a difference
+    of prefix sums, so no Python code runs per tagline or per word.
+    """
+    import numpy as np
+
+    with np.errstate(over="ignore"):
+        text = "\n".join(taglines)
+        if text.count("\n") != len(taglines) - 1:
+            text = "\n".join(tagline.replace("\n", " ") for tagline in taglines)
+        data = np.frombuffer(f" {text}\n".encode("utf-8").translate(BYTE_TABLE), dtype=np.uint8)
+
+        is_word = (data != SPACE) & (data != NEWLINE)
+        starts = np.flatnonzero(is_word[1:] & ~is_word[:-1]) + 1
+        ends = np.flatnonzero(is_word[:-1] & ~is_word[1:])
+        line = np.searchsorted(np.flatnonzero(data == NEWLINE), starts)
+
+        # Word hash sum(c_j * POLY**(end - j)) from prefix sums of c_j * POLY**-j
+        powers, inverse_powers = _poly_powers(len(data))
+        prefix = np.cumsum(data * inverse_powers[:len(data)])
+        words = (prefix[ends] - prefix[starts - 1]) * powers[ends]
+
+        pairs = line[1:] == line[:-1]
+        bigrams = words[:-1][pairs] * np.uint64(BIGRAM_MULTIPLIER) + words[1:][pairs]
+        lengths = np.minimum(np.bincount(line, minlength=len(taglines)), MAX_LENGTH_FEATURE)
+
+        rows = np.concatenate([line, line[:-1][pairs], np.arange(len(taglines))])
+        hashes = _mix(np.concatenate([words, bigrams, lengths.astype(np.uint64) + np.uint64(LENGTH_TAG)]))
+    return rows, hashes
+
+
+def feature_matrix(taglines, dim=DEFAULT_DIM):
+    """Return ``(rows, buckets, signs)`` of the taglines' signed hashed features."""
+    import numpy as np
+
+    rows, hashes = feature_hashes(taglines)
+    signs = np.where((hashes >> np.uint64(31)) & np.uint64(1), 1.0, -1.0).astype(np.float32)
+    return rows, (hashes % np.uint64(dim)).astype(np.int64), signs
+
+
+def sparse_matrix(taglines, dim=DEFAULT_DIM):
+    from scipy import sparse
+
+    rows, buckets, signs = feature_matrix(taglines, dim)
+    return sparse.csr_matrix((signs, (rows, buckets)), shape=(len(taglines), dim))
+
+
+class Scorer:
+    """Scores taglines; higher is better."""
+
+    def __init__(self, weights, meta=None):
+        self.weights = weights
+        self.dim = len(weights)
+        self.meta = meta or {}
+
+    @classmethod
+    def load(cls, path=DEFAULT_MODEL_FILE):
+        import numpy as np
+
+        with np.load(path) as data:
+            return cls(data["weights"], json.loads(str(data["meta"])))
+
+    def save(self, path=DEFAULT_MODEL_FILE):
+        import numpy as np
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp.npz")
+        np.savez(tmp_path, weights=self.weights, meta=json.dumps(self.meta))
+        tmp_path.replace(path)
+        return path
+
+    def score(self, taglines):
+        """Return a float32 array of scores for ``taglines``."""
+        import numpy as np
+
+        if not len(taglines):
+            return np.zeros(0, dtype=np.float32)
+        rows, buckets, signs = feature_matrix(taglines, self.dim)
+        return np.bincount(rows, weights=self.weights[buckets] * signs, minlength=len(taglines)).astype(np.float32)
+
+    def order(self, taglines):
+        """Indices of ``taglines``, best predicted first (ties keep their order)."""
+        import numpy as np
+
+        return np.argsort(-self.score(taglines), kind="stable").tolist()
+
+    def top(self, taglines, k):
+        """The ``k`` best-scored distinct non-empty taglines, best first."""
+        from router import normalise
+
+        unique = {}
+        for tagline in taglines:
+            if tagline.strip():
+                unique.setdefault(normalise(tagline), tagline)
+        candidates = list(unique.values())
+        return [candidates[index] for index in self.order(candidates)[:k]]
+
+
+_scorers = {}
+_scorers_lock = threading.Lock()
+
+
+def get_scorer(path=DEFAULT_MODEL_FILE):
+    """Return the shared scorer saved at ``path``, or None if none is trained."""
+    path = Path(path)
+    with _scorers_lock:
+        key = (str(path), path.stat().st_mtime_ns if path.exists() else None)
+        if key not in _scorers:
+            _scorers[key] = Scorer.load(path) if path.exists() else None
+        return _scorers[key]
+
+
+def training_pairs(table, dim=DEFAULT_DIM):
+    """Return ``(X, ranks, better rows, worse rows, held-out briefs)`` from the tagline store.
+
+    ``X`` has a row per (brief, slot) tagline and ``ranks`` a row per brief
+    (NaN where unranked); a tenth of the briefs, picked by text so the split
+    is stable across runs, are marked as held out.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    from prepare_finetune import preference_pairs, ranked_chunks
+
+    blocks, rank_blocks, better_rows, worse_rows, held = [], [], [], [], []
+    n_rows = 0
+    for briefs, taglines, ranks in ranked_chunks(table):
+        rows, better, worse, _ = preference_pairs(taglines, ranks)
+        n_slots = taglines.shape[1]
+        blocks.append(sparse_matrix(taglines.ravel().tolist(), dim))
+        rank_blocks.append(ranks)
+        better_rows.append(n_rows + rows * n_slots + better)
+        worse_rows.append(n_rows + rows * n_slots + worse)
+        held.append(np.array([zlib.crc32(brief.encode("utf-8")) % HOLDOUT == 0 for brief in briefs], dtype=bool))
+        n_rows += taglines.size
+    if not blocks:
+        return None
+    return (
+        sparse.vstack(blocks, format="csr"), np.concatenate(rank_blocks),
+        np.concatenate(better_rows), np.concatenate(worse_rows), np.concatenate(held),
+    )
+
+
+def fit(X, better, worse, l2=DEFAULT_L2):
+    """Fit weights minimising the mean pairwise logistic loss plus an L2 penalty."""
+    import numpy as np
+    from scipy import sparse
+    from scipy.optimize import minimize
+
+    n_pairs = len(better)
+    # D maps tagline scores to score differences, one row per pair
+    pair_index = np.arange(n_pairs)
+    D = sparse.csr_matrix(
+        (np.r_[np.ones(n_pairs), -np.ones(n_pairs)], (np.r_[pair_index, pair_index], np.r_[better, worse])),
+        shape=(n_pairs, X.shape[0]),
+    )
+    DX = (D @ X).tocsr()
+
+    def loss(weights):
+        margins = DX @ weights
+        value = np.logaddexp(0, -margins).mean() + 0.5 * l2 * weights @ weights
+        # d/dm log(1 + e^-m) = -1 / (1 + e^m)
+        gradient = DX.T @ (-0.5 * (1 - np.tanh(margins / 2))) / n_pairs + l2 * weights
+        return value, gradient
+
+    result = minimize(loss, np.zeros(X.shape[1]), jac=True, method="L-BFGS-B", options={"maxiter": 200})
+    return result.x.astype(np.float32)
+
+
+def agreement(scores, ranks, better, worse):
+    """Return ``(pairwise accuracy, top-1 accuracy)`` of tagline scores against ECD ranks.
+
+    Pairwise accuracy is over the ``better``/``worse`` row pairs; top-1 is how
+    often a brief's best-scored tagline is the one the ECD ranked first.
+    """
+    import numpy as np
+
+    pairwise = float((scores[better] > scores[worse]).mean()) if len(better) else None
+    predicted = np.where(np.isnan(ranks), -np.inf, scores.reshape(ranks.shape))
+    has_first = (ranks == 1).any(axis=1)
+    if not has_first.any():
+        return pairwise, None
+    chosen = ranks[has_first, np.argmax(predicted[has_first], axis=1)]
+    return pairwise, float((chosen == 1).mean())
+
+
+def train(data_dir=DATA_DIR, model_file=None, dim=DEFAULT_DIM, l2=DEFAULT_L2):
+    """Train on the database's rankings; return the scorer, or None without rankings."""
+    import numpy as np
+
+    from db import open_db
+    from tagline_store import load_taglines
+
+    data_dir = Path(data_dir)
+    with open_db(data_dir=data_dir) as db:
+        if not db.count_rankings():
+            return None
+        version = db.taglines_version()
+    data = training_pairs(load_taglines(data_dir), dim)
+    if data is None:
+        return None
+    X, ranks, better, worse, held = data
+    n_slots = ranks.shape[1]
+    held_pairs = held[better // n_slots]
+
+    # Evaluate on the held-out briefs, then train on everything
+    scores = X @ fit(X, better[~held_pairs], worse[~held_pairs], l2)
+    rows = np.flatnonzero(np.repeat(held, n_slots))
+    remap = np.full(X.shape[0], -1)
+    remap[rows] = np.arange(len(rows))
+    pairwise, top1 = agreement(
+        scores[rows], ranks[held], remap[better[held_pairs]], remap[worse[held_pairs]]
+    )
+    scorer = Scorer(fit(X, better, worse, l2), {
+        "trained_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "taglines_version": version,
+        "briefs": int((~np.isnan(ranks)).any(axis=1).sum()),
+        "pairs": int(len(better)),
+        "holdout_pairs": int(held_pairs.sum()),
+        "holdout_pairwise_accuracy": pairwise,
+        "holdout_top1_accuracy": top1,
+        "dim": dim,
+        "l2": l2,
+    })
+    scorer.save(model_file or data_dir / DEFAULT_MODEL_FILE.name)
+    return scorer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=str(DEFAULT_MODEL_FILE), help="model file (default: data/scorer.npz)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = subparsers.add_parser("train", help="train on the ECD rankings in the database")
+    train_parser.add_argument("--dim", type=int, default=DEFAULT_DIM,
+                              help=f"hash buckets (default: {DEFAULT_DIM})")
+    train_parser.add_argument("--l2", type=float, default=DEFAULT_L2,
+                              help=f"L2 penalty (default: {DEFAULT_L2})")
+
+    score_parser = subparsers.add_parser("score", help="score taglines, best first")
+    score_parser.add_argument("taglines", nargs="*", help="taglines to score (default: one per line on stdin)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        scorer = train(DATA_DIR, args.model, args.dim, args.l2)
+        if scorer is None:
+            print("Error: No rankings found; rank some taglines first")
+            return 1
+        meta = scorer.meta
+        print(f"Trained on {meta['pairs']} pairs from {meta['briefs']} ranked briefs")
+        if meta["holdout_pairwise_accuracy"] is not None:
+            top1 = meta["holdout_top1_accuracy"]
+            print(f"Held-out briefs: {meta['holdout_pairwise_accuracy']:.1%} of pairs ordered like the ECD, "
+                  f"top pick matches {'-' if top1 is None else f'{top1:.1%}'}")
+        print(f"Scorer saved to {args.model}")
+    elif args.command == "score":
+        import time
+
+        if not Path(args.model).exists():
+            print(f"Error: {args.model} not found; run 'scorer.py train' first")
+            return 1
+        scorer = Scorer.load(args.model)
+        taglines = args.taglines or [line.strip() for line in sys.stdin if line.strip()]
+        start = time.perf_counter()
+        scores = scorer.score(taglines)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        for index in scorer.order(taglines):
+            print(f"{scores[index]:+.3f}  {taglines[index]}")
+        print(f"Scored {len(taglines)} taglines in {elapsed_ms:.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
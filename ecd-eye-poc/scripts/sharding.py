@@ -0,0 +1,102 @@
+"""
+Stable brief sharding and deterministic merging of partial CSV outputs.
+
+A brief always lands in the same shard for a given shard count, whichever
+process or machine computes it, so workers can split a run without
+coordinating beyond a shared output directory.
+"""
+
+import csv
+import hashlib
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def parse_shard(value):
+    """Parse an ``INDEX/COUNT`` shard spec such as ``0/4``."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard {value!r}; expected INDEX/COUNT, e.g. 0/4")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard {value!r}; INDEX must be in 0..COUNT-1")
+    return index, count
+
+
+def shard_of(brief_id, count):
+    """Return the shard index for a brief id (stable across processes)."""
+    digest = hashlib.sha1(str(brief_id).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count
+
+
+def shard_file(shard_dir, stem, index, count):
+    return Path(shard_dir) / f"{stem}.shard-{index}-of-{count}.csv"
+
+
+@contextmanager
+def atomic_csv_writer(path, header):
+    """Yield a CSV writer whose file only appears at ``path`` once complete."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + f".tmp-{os.getpid()}")
+    try:
+        with open(tmp_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            yield writer
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def merge_shards(shard_files, expected_ids, out_file, optional_ids=()):
+    """Merge partial CSVs into ``out_file`` in ``expected_ids`` order.
+
+    Raises ValueError if a shard file is missing, if any id appears more than
+    once, or if any expected id has no row (ids in ``optional_ids`` may be
+    absent). Nothing is written in that case.
+    """
+    missing_files = [str(path) for path in shard_files if not Path(path).exists()]
+    if missing_files:
+        raise ValueError(f"Missing shard files: {', '.join(missing_files)}")
+
+    header = None
+    rows_by_id = {}
+    duplicates = set()
+    for path in shard_files:
+        with open(path, "r", newline="") as f:
+            reader = csv.reader(f)
+            shard_header = next(reader)
+            if header is None:
+                header = shard_header
+            elif shard_header != header:
+                raise ValueError(f"Header mismatch in {path}")
+            for row in reader:
+                brief_id = int(row[0])
+                if brief_id in rows_by_id:
+                    duplicates.add(brief_id)
+                rows_by_id[brief_id] = row
+
+    expected_ids = [int(brief_id) for brief_id in expected_ids]
+    optional_ids = {int(brief_id) for brief_id in optional_ids}
+    missing = [
+        brief_id for brief_id in expected_ids
+        if brief_id not in rows_by_id and brief_id not in optional_ids
+    ]
+    unexpected = sorted(set(rows_by_id) - set(expected_ids))
+    problems = []
+    if duplicates:
+        problems.append(f"duplicate ids {sorted(duplicates)}")
+    if missing:
+        problems.append(f"missing ids {missing}")
+    if unexpected:
+        problems.append(f"unexpected ids {unexpected}")
+    if problems:
+        raise ValueError("Cannot merge shards: " + "; ".join(problems))
+
+    present_ids = [brief_id for brief_id in expected_ids if brief_id in rows_by_id]
+    with atomic_csv_writer(out_file, header) as writer:
+        writer.writerows(rows_by_id[brief_id] for brief_id in present_ids)
+    return len(present_ids)
@@ -1,37 +1,63 @@
 #!/usr/bin/env python3
 """
 Submit fine-tuning job to OpenAI.
+
+With ``--incremental``, upload only the delta from
+``prepare_finetune.py --incremental`` and continue training from the current
+fine-tuned model instead of the base model.
+
+The job and the resulting model are recorded in the pipeline database.
 """
 
-import os
-import json
-import time
+import argparse
+import sys
 from pathlib import Path
-from dotenv import load_dotenv
-import openai
 
-# Load environment variables
-load_dotenv()
+import config
+import finetune_state
+import profiling
+from db import open_db
+from profiling import add_profile_argument, profile_run, span
 
-# Configure OpenAI API
-openai.api_key = os.getenv("OPENAI_API_KEY")
-MODEL = os.getenv("FINETUNE_MODEL", "gpt-3.5-turbo-0125")
-N_EPOCHS = int(os.getenv("FINETUNE_EPOCHS", "3"))
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_profile_argument(parser)
+    parser.add_argument("--incremental", action="store_true",
+                        help="train fine_tune_delta.jsonl on top of the current fine-tuned model")
+    args = parser.parse_args(argv)
+    
+    with profile_run("submit_finetune", args.profile):
+        return run(args.incremental)
 
-def main():
+def run(incremental=False):
+    openai = config.openai_api()
+    model = config.finetune_model()
+    n_epochs = int(config.get("FINETUNE_EPOCHS", "3"))
+    
     # Create data directory if it doesn't exist
     data_dir = Path(__file__).parent.parent / "data"
     data_dir.mkdir(exist_ok=True)
     
     # Check if fine-tuning data exists
     finetune_file = data_dir / "fine_tune.jsonl"
+    if incremental:
+        finetune_file = finetune_state.DELTA_FILE
+        if not finetune_state.PENDING_FILE.exists():
+            print("Error: No pending delta; run prepare_finetune.py --incremental first")
+            return 1
+        
+        # Continue from the latest fine-tuned model if there is one
+        with open_db(data_dir=data_dir) as db:
+            model = db.current_model() or model
+        print(f"Continuing training from {model}")
+    
     if not finetune_file.exists():
         print(f"Error: Fine-tuning data not found at {finetune_file}")
-        return
+        return 1
     
     # Upload file to OpenAI
     print(f"Uploading fine-tuning data to OpenAI...")
-    with open(finetune_file, "rb") as f:
+    with span("upload"), open(finetune_file, "rb") as f:
         response = openai.files.create(
             file=f,
             purpose="fine-tune"
@@ -43,56 +69,72 @@ def main():
     # Wait for file to be processed
     print("Waiting for file to be processed...")
     while True:
-        file_info = openai.files.retrieve(file_id)
+        with span("network"):
+            file_info = openai.files.retrieve(file_id)
         if file_info.status == "processed":
             break
         print(".", end="", flush=True)
-        time.sleep(1)
+        profiling.sleep(1)
     
     print("\nFile processed. Creating fine-tuning job...")
     
     # Create fine-tuning job
-    response = openai.fine_tuning.jobs.create(
-        training_file=file_id,
-        model=MODEL,
-        suffix="ecd-eye",
-        hyperparameters={
-            "n_epochs": N_EPOCHS
-        }
-    )
+    with span("network"):
+        response = openai.fine_tuning.jobs.create(
+            training_file=file_id,
+            model=model,
+            suffix="ecd-eye",
+            hyperparameters={
+                "n_epochs": n_epochs
+            }
+        )
     
     job_id = response.id
     print(f"Fine-tuning job created with ID: {job_id}")
     
-    # Save job ID to file
-    with open(data_dir / "job_id.txt", "w") as f:
-        f.write(job_id)
+    # Record the job
+    db = open_db(data_dir=data_dir)
+    db.record_job(job_id, finetune_file.name, model, response.status)
     
     # Monitor job status
     print("Monitoring job status...")
     while True:
-        job_info = openai.fine_tuning.jobs.retrieve(job_id)
+        with span("network"):
+            job_info = openai.fine_tuning.jobs.retrieve(job_id)
         status = job_info.status
         
         print(f"Status: {status}")
+        # Also registers the fine-tuned model once the job succeeds
+        db.update_job(job_id, status, job_info.fine_tuned_model)
         
         if status in ["succeeded", "failed", "cancelled"]:
             break
         
-        time.sleep(10)
+        profiling.sleep(10)
+    db.close()
     
     if job_info.status == "succeeded":
         model_id = job_info.fine_tuned_model
         print(f"Fine-tuning completed successfully!")
         print(f"Fine-tuned model ID: {model_id}")
         
-        # Save model ID to file
-        with open(data_dir / "model_id.txt", "w") as f:
-            f.write(model_id)
+        if incremental:
+            n_trained = finetune_state.commit_pending(model_id, job_id, model)
+            print(f"Recorded {n_trained} newly trained examples in {finetune_state.STATE_FILE}")
+        elif finetune_state.FULL_PENDING_FILE.exists():
+            n_trained = finetune_state.commit_pending(
+                model_id, job_id, model, finetune_state.FULL_PENDING_FILE, full=True
+            )
+            print(f"Recorded the {n_trained} trained examples in {finetune_state.STATE_FILE}")
+        else:
+            print(f"Warning: {finetune_state.FULL_PENDING_FILE} not found; "
+                  "the next --incremental run will treat every example as new")
     else:
         print(f"Fine-tuning failed with status: {job_info.status}")
         if hasattr(job_info, "error") and job_info.error:
             print(f"Error: {job_info.error}")
+        return 1
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
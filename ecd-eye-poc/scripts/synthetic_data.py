@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic datasets for benchmarks and load tests.
+
+Streams seeded briefs, taglines, rankings from several simulated raters and
+judged evaluation pairs, from a thousand to ten million rows, in the project's
+file formats (``briefs.json``, ``baseline.csv``, ``rankings.csv``,
+``evaluation.csv``, ``evaluation_results.csv``). Further raters get
+``rankings.<rater>.csv`` files in the same format. ``--load`` also builds the
+SQLite database for the directory, so the pipeline can run against it offline.
+
+Every brief draws from its own RNG seeded by ``(seed, brief_id)``, so output
+is identical across runs and sizes (the first N briefs of a larger dataset
+match a smaller one) and nothing is held in memory between briefs.
+
+Simulated raters prefer shorter taglines without banned phrases, each with
+their own amount of noise, and the simulated judge prefers the fine-tuned
+tagline by ``--advantage``.
+"""
+
+import argparse
+import csv
+import json
+import math
+import random
+import sys
+import time
+from pathlib import Path
+
+from profiling import add_profile_argument, profile_run, span
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+DEFAULT_OUTPUT_DIR = DATA_DIR / "synthetic"
+
+N_SLOTS = 5
+BASELINE_MODEL = "synthetic-baseline"
+FINETUNED_MODEL = "ft:synthetic"
+
+VERBS = ["Write", "Create", "Develop", "Craft", "Pitch"]
+ADJECTIVES = [
+    "premium", "sustainable", "affordable", "smart", "handmade", "electric", "organic", "minimalist",
+    "family-friendly", "luxury", "independent", "plant-based", "subscription", "local", "award-winning",
+]
+PRODUCTS = [
+    "coffee brand", "fitness app", "electric vehicle", "streaming service", "skincare line", "travel platform",
+    "home security system", "meal kit service", "banking app", "co-working space", "headphone brand",
+    "fashion label", "energy drink", "language course", "pet food brand", "bike shop", "VR platform",
+    "productivity tool", "furniture store", "craft brewery",
+]
+BENEFITS = [
+    "emphasizes sustainability", "focuses on ease of use", "highlights taste", "promises peace of mind",
+    "saves people time", "celebrates local makers", "puts privacy first", "makes experts of beginners",
+    "delivers globally sourced quality", "fits any budget", "is built to last", "brings families together",
+]
+AUDIENCES = [
+    "young professionals", "parents", "students", "retirees", "creatives", "remote workers",
+    "athletes", "first-time buyers", "small businesses", "city dwellers",
+]
+
+NOUNS = [
+    "future", "planet", "journey", "taste", "world", "moment", "home", "style", "mind", "story",
+    "craft", "day", "city", "sound", "comfort", "energy", "roots", "voice", "work", "weekend",
+]
+TAGLINE_ADJECTIVES = [
+    "bold", "pure", "simple", "brighter", "honest", "fresh", "quiet", "wild", "real", "better",
+    "smarter", "kinder", "endless", "local", "timeless",
+]
+TAGLINE_VERBS = ["Drive", "Taste", "Discover", "Build", "Own", "Live", "Protect", "Share", "Explore", "Shape"]
+BANNED = ["Unleash", "Elevate", "Redefine"]
+
+
+def parse_size(text):
+    """Parse sizes such as ``1000``, ``1e6``, ``50k`` or ``2M``."""
+    text = text.strip().lower()
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    if multiplier > 1:
+        text = text[:-1]
+    value = int(float(text) * multiplier)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"size must be at least 1, got {text!r}")
+    return value
+
+
+def brief_rng(seed, brief_id):
+    return random.Random(f"{seed}:{brief_id}")
+
+
+def make_brief(rng):
+    adjective = rng.choice(ADJECTIVES)
+    article = "an" if adjective[0] in "aeiou" else "a"
+    return (
+        f"{rng.choice(VERBS)} a tagline for {article} {adjective} {rng.choice(PRODUCTS)} "
+        f"that {rng.choice(BENEFITS)}, aimed at {rng.choice(AUDIENCES)}."
+    )
+
+
+def make_tagline(rng):
+    """Return ``(tagline, quality)``; shorter taglines without clichés score higher."""
+    pattern = rng.randrange(6)
+    noun, noun2 = rng.choice(NOUNS), rng.choice(NOUNS)
+    adjective, adjective2 = rng.choice(TAGLINE_ADJECTIVES), rng.choice(TAGLINE_ADJECTIVES)
+    verb, verb2 = rng.choice(TAGLINE_VERBS), rng.choice(TAGLINE_VERBS)
+    if pattern == 0:
+        tagline = f"{verb} {noun}. {verb2} {noun2}."
+    elif pattern == 1:
+        tagline = f"{adjective.capitalize()} {noun}, {adjective2} {noun2}."
+    elif pattern == 2:
+        tagline = f"Your {noun}, {adjective}."
+    elif pattern == 3:
+        tagline = f"The {adjective} way to {verb.lower()} your {noun}."
+    elif pattern == 4:
+        # Over the seven-word limit
+        tagline = f"{verb} a {adjective} {noun} for everyone who loves {adjective2} {noun2} every day."
+    else:
+        tagline = f"{rng.choice(BANNED)} your {noun}."
+    quality = rng.gauss(0, 1) - 0.15 * len(tagline.split()) - (1.5 if pattern == 5 else 0)
+    return tagline, quality
+
+
+def rater_names(n_raters):
+    return ["ecd"] + [f"rater{index}" for index in range(1, n_raters)]
+
+
+def rank(qualities, rng, noise):
+    """Rank slots by noisy quality; returns ranks in slot order (1 = best)."""
+    scores = [quality + rng.gauss(0, noise) for quality in qualities]
+    order = sorted(range(len(scores)), key=lambda slot: -scores[slot])
+    ranks = [0] * len(scores)
+    for position, slot in enumerate(order, start=1):
+        ranks[slot] = position
+    return ranks
+
+
+def training_rows(seed, n_briefs, n_raters, ranked_fraction):
+    """Yield ``(brief_id, brief, taglines, {rater: ranks} or None)`` per training brief."""
+    raters = rater_names(n_raters)
+    for brief_id in range(1, n_briefs + 1):
+        rng = brief_rng(seed, brief_id)
+        brief = make_brief(rng)
+        taglines, qualities = zip(*(make_tagline(rng) for _ in range(N_SLOTS)))
+        rankings = None
+        if rng.random() < ranked_fraction:
+            rankings = {
+                rater: rank(qualities, rng, noise=0.5 + 0.3 * index)
+                for index, rater in enumerate(raters)
+            }
+        yield brief_id, brief, list(taglines), rankings
+
+
+def evaluation_rows(seed, n_briefs, n_eval, advantage):
+    """Yield judged evaluation pairs (dicts) for the evaluation briefs."""
+    for brief_id in range(n_briefs + 1, n_briefs + n_eval + 1):
+        rng = brief_rng(seed, brief_id)
+        brief = make_brief(rng)
+        baseline_tagline, baseline_quality = make_tagline(rng)
+        finetuned_tagline, finetuned_quality = make_tagline(rng)
+        finetuned_better = finetuned_quality + advantage + rng.gauss(0, 0.5) > baseline_quality
+        yield {
+            "brief_id": brief_id,
+            "brief": brief,
+            "baseline_model": BASELINE_MODEL,
+            "finetuned_model": FINETUNED_MODEL,
+            "baseline_tagline": baseline_tagline,
+            "finetuned_tagline": finetuned_tagline,
+            "is_a_baseline": rng.random() < 0.5,
+            "preferred_model": "finetuned" if finetuned_better else "baseline",
+        }
+
+
+def write_files(output_dir, seed, n_briefs, n_eval, n_raters, ranked_fraction, advantage):
+    """Stream every file; return the paths written."""
+    from db import BASELINE_HEADER, EVALUATION_HEADER, RANKINGS_HEADER, RESULTS_HEADER
+
+    raters = rater_names(n_raters)
+    briefs_file = output_dir / "briefs.json"
+    baseline_file = output_dir / "baseline.csv"
+    rankings_files = {
+        rater: output_dir / ("rankings.csv" if rater == "ecd" else f"rankings.{rater}.csv") for rater in raters
+    }
+    evaluation_file = output_dir / "evaluation.csv"
+    results_file = output_dir / "evaluation_results.csv"
+
+    handles = []
+
+    def open_csv(path, header):
+        f = open(path, "w", newline="")
+        handles.append(f)
+        writer = csv.writer(f)
+        writer.writerow(header)
+        return writer
+
+    try:
+        briefs_out = open(briefs_file, "w")
+        handles.append(briefs_out)
+        baseline_out = open_csv(baseline_file, BASELINE_HEADER)
+        rankings_out = {rater: open_csv(path, RANKINGS_HEADER) for rater, path in rankings_files.items()}
+        evaluation_out = open_csv(evaluation_file, EVALUATION_HEADER)
+        results_out = open_csv(results_file, RESULTS_HEADER)
+
+        with span("training"):
+            briefs_out.write('{\n  "training_briefs": [')
+            for brief_id, brief, taglines, rankings in training_rows(seed, n_briefs, n_raters, ranked_fraction):
+                briefs_out.write(("\n" if brief_id == 1 else ",\n") + "    " + json.dumps({"id": brief_id, "brief": brief}))
+                baseline_out.writerow([brief_id, brief] + taglines)
+                if rankings:
+                    for rater, ranks in rankings.items():
+                        rankings_out[rater].writerow([brief_id, brief] + ranks)
+
+        with span("evaluation"):
+            briefs_out.write('\n  ],\n  "evaluation_briefs": [')
+            for pair in evaluation_rows(seed, n_briefs, n_eval, advantage):
+                first = pair["brief_id"] == n_briefs + 1
+                briefs_out.write(("\n" if first else ",\n") + "    " + json.dumps({"id": pair["brief_id"], "brief": pair["brief"]}))
+                if pair["is_a_baseline"]:
+                    pair["randomized_a"], pair["randomized_b"] = pair["baseline_tagline"], pair["finetuned_tagline"]
+                else:
+                    pair["randomized_a"], pair["randomized_b"] = pair["finetuned_tagline"], pair["baseline_tagline"]
+                evaluation_out.writerow([pair[column] for column in EVALUATION_HEADER])
+                pair["preferred_tagline"] = pair[f"{pair['preferred_model']}_tagline"]
+                results_out.writerow([pair[column] for column in RESULTS_HEADER])
+            briefs_out.write("\n  ]\n}\n")
+    finally:
+        for f in handles:
+            f.close()
+
+    return [briefs_file, baseline_file, *rankings_files.values(), evaluation_file, results_file]
+
+
+def load_db(output_dir, files, seed, n_briefs, n_eval, n_raters, advantage):
+    """Build the directory's database from the files just written.
+
+    Training data is streamed from the CSVs; the (smaller) evaluation stream
+    is replayed from the seed.
+    """
+    from brief_store import BriefStore
+    from db import DB_NAME, Database
+
+    db_file = output_dir / DB_NAME
+    for path in (db_file, db_file.with_name(DB_NAME + "-wal"), db_file.with_name(DB_NAME + "-shm")):
+        path.unlink(missing_ok=True)
+
+    rankings_files = [path for path in files if path.name.startswith("rankings")]
+    with Database(db_file) as db:
+        with span("load.generations"):
+            # Also adds the training briefs
+            db.import_generations_csv(output_dir / "baseline.csv", BASELINE_MODEL)
+        for rater, path in zip(rater_names(n_raters), rankings_files):
+            with span("load.rankings", rater=rater):
+                db.import_rankings_csv(path, rater)
+        with span("load.judgments"):
+            db.ensure_briefs(
+                ((pair["brief_id"], pair["brief"]) for pair in evaluation_rows(seed, n_briefs, n_eval, advantage)),
+                "eval",
+            )
+            db.add_model(FINETUNED_MODEL, BASELINE_MODEL)
+            db.save_evaluations(evaluation_rows(seed, n_briefs, n_eval, advantage))
+            db.save_judgments(
+                (
+                    (pair["brief_id"], pair["preferred_model"])
+                    for pair in evaluation_rows(seed, n_briefs, n_eval, advantage)
+                ),
+                FINETUNED_MODEL,
+                judge="synthetic",
+            )
+        # The files hold the same data, so open_db must not re-import them
+        db.mark_synced(*(path for path in files if path.suffix == ".csv"))
+
+    with BriefStore(db_file) as store:
+        store.mark_imported(output_dir / "briefs.json")
+    return db_file
+
+
+def run(output_dir=DEFAULT_OUTPUT_DIR, briefs=1000, eval_briefs=None, raters=3, ranked_fraction=1.0,
+        advantage=0.3, seed=0, load=False):
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    eval_briefs = eval_briefs or max(1, briefs // 10)
+
+    start = time.perf_counter()
+    files = write_files(output_dir, seed, briefs, eval_briefs, raters, ranked_fraction, advantage)
+    elapsed = time.perf_counter() - start
+    n_rows = briefs * N_SLOTS
+    print(f"Wrote {briefs} training briefs ({n_rows} taglines, {raters} raters) and "
+          f"{eval_briefs} evaluation pairs to {output_dir} in {elapsed:.1f}s "
+          f"({n_rows / max(elapsed, 1e-9):,.0f} taglines/s)")
+    for path in files:
+        print(f"  {path.name:<28} {path.stat().st_size / 1e6:>10.2f} MB")
+
+    if load:
+        start = time.perf_counter()
+        db_file = load_db(output_dir, files, seed, briefs, eval_briefs, raters, advantage)
+        print(f"Loaded {db_file} in {time.perf_counter() - start:.1f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_profile_argument(parser)
+    parser.add_argument("--briefs", type=parse_size, default=1000,
+                        help="training briefs, e.g. 1000, 50k, 2M; each has 5 taglines (default: 1000)")
+    parser.add_argument("--eval-briefs", type=parse_size, default=None,
+                        help="evaluation pairs (default: a tenth of --briefs)")
+    parser.add_argument("--raters", type=int, default=3, help="simulated raters, the first is 'ecd' (default: 3)")
+    parser.add_argument("--ranked-fraction", type=float, default=1.0,
+                        help="share of training briefs that are ranked (default: 1.0)")
+    parser.add_argument("--advantage", type=float, default=0.3,
+                        help="quality edge of fine-tuned taglines in evaluation pairs (default: 0.3)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+    parser.add_argument("--output", default=str(DEFAULT_OUTPUT_DIR), help="output directory (default: data/synthetic)")
+    parser.add_argument("--load", action="store_true", help="also build the SQLite database in the output directory")
+    args = parser.parse_args(argv)
+
+    if args.raters < 1:
+        parser.error("--raters must be at least 1")
+    if not 0 <= args.ranked_fraction <= 1 or math.isnan(args.ranked_fraction):
+        parser.error("--ranked-fraction must be between 0 and 1")
+    if Path(args.output).resolve() == DATA_DIR.resolve():
+        parser.error("refusing to overwrite the real data directory; choose another --output")
+
+    with profile_run("synthetic_data", args.profile):
+        run(args.output, args.briefs, args.eval_briefs, args.raters, args.ranked_fraction,
+            args.advantage, args.seed, args.load)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
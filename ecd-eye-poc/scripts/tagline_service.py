@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Async HTTP service for tagline generation.
+
+Internal tools can ask for taglines without running the batch scripts::
+
+    POST /taglines  {"brief": "...", "model": "gpt-3.5-turbo-0125"}
+    -> {"brief": ..., "model": ..., "taglines": [5 taglines], "coalesced": false, "batch_size": 3}
+    GET /health     -> queue depth and request counters
+
+Requests go through a ``batching.Generator``, which coalesces identical
+in-flight requests, micro-batches distinct briefs into multi-brief prompts
+(``--window``, ``--max-batch``) and bounds each model's queue
+(``--queue-size``) and the number of upstream calls (``--concurrency``). When
+a queue is full, requests get ``503`` with ``Retry-After`` instead of piling
+up. ``--backend`` (or ``GENERATION_BACKEND``) answers from an offline backend
+instead of the hosted API (see backends.py). Transient API errors are retried
+with backoff behind the shared circuit breaker (see resilience.py); other
+errors are returned as ``502``.
+
+asyncio and the generator are imported when the server starts, so ``--help``
+stays fast.
+"""
+
+import argparse
+import json
+import sys
+
+import config
+from backends import BACKENDS
+from profiling import add_profile_argument, profile_run
+
+MAX_BODY = 64 * 1024
+
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    502: "Bad Gateway",
+    503: "Service Unavailable",
+}
+
+
+class Service:
+    """Minimal HTTP/1.1 front end (keep-alive, JSON bodies) for a Generator."""
+
+    def __init__(self, generator, default_model):
+        self.generator = generator
+        self.default_model = default_model
+
+    async def route(self, method, path, body):
+        """Return ``(status, payload)`` for a request."""
+        from batching import Overloaded
+
+        path = path.split("?", 1)[0]
+        if path == "/health":
+            if method != "GET":
+                return 405, {"error": "use GET"}
+            return 200, self.generator.health()
+        if path != "/taglines":
+            return 404, {"error": f"no route for {path}"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            return 400, {"error": "body is not valid JSON"}
+        if not isinstance(request, dict):
+            return 400, {"error": "body must be a JSON object"}
+        brief = request.get("brief")
+        model = request.get("model") or self.default_model
+        if not isinstance(brief, str) or not brief.strip():
+            return 400, {"error": "'brief' must be a non-empty string"}
+        if not isinstance(model, str):
+            return 400, {"error": "'model' must be a string"}
+
+        try:
+            taglines, batch_size, coalesced = await self.generator.generate(brief.strip(), model)
+        except Overloaded as e:
+            return 503, {"error": str(e)}
+        except Exception as e:
+            return 502, {"error": f"{type(e).__name__}: {e}"}
+        return 200, {
+            "brief": brief.strip(),
+            "model": model,
+            "taglines": taglines,
+            "coalesced": coalesced,
+            "batch_size": batch_size,
+        }
+
+    async def handle(self, reader, writer):
+        import asyncio
+
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY:
+                    await self.respond(writer, 413, {"error": f"body over {MAX_BODY} bytes"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload = await self.route(method, path, body)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive=True):
+        body = json.dumps(payload).encode()
+        headers = [
+            f"HTTP/1.1 {status} {STATUS_TEXT[status]}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if status == 503:
+            headers.append("Retry-After: 1")
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode() + body)
+        await writer.drain()
+
+
+async def serve(host, port, window, max_batch, queue_size, concurrency, model=None, backend=None):
+    import asyncio
+
+    from batching import Generator
+    from resilience import CircuitBreaker
+
+    remote = backend is None or backend.remote
+    generator = Generator(
+        window=window,
+        max_batch=max_batch,
+        queue_size=queue_size,
+        concurrency=concurrency,
+        # Retries are handled by call_with_retry_async
+        client=config.async_openai_client(max_retries=0) if remote else None,
+        backend=None if remote else backend,
+        breaker=CircuitBreaker() if remote else None,
+    )
+    service = Service(generator, model or config.baseline_model())
+    server = await asyncio.start_server(service.handle, host, port)
+    print(f"Serving taglines on http://{host}:{port} from the {backend.name if backend else 'openai'} backend "
+          f"(window {window * 1000:.0f} ms, "
+          f"batches of up to {max_batch}, {concurrency} concurrent calls, queue {queue_size})")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve tagline generation over HTTP.")
+    add_profile_argument(parser)
+    parser.add_argument("--host", default="127.0.0.1", help="address to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on (default: 8080)")
+    parser.add_argument("--model", help="model for requests that don't name one (default: BASELINE_MODEL)")
+    parser.add_argument("--window", type=float, default=0.02, metavar="SECONDS",
+                        help="how long to collect briefs into a batch (default: 0.02)")
+    parser.add_argument("--max-batch", type=int, default=8, help="most briefs in one prompt (default: 8)")
+    parser.add_argument("--queue-size", type=int, default=256,
+                        help="queued briefs per model before rejecting with 503 (default: 256)")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent upstream calls (default: 4)")
+    parser.add_argument("--backend", choices=sorted(BACKENDS),
+                        help="generation backend (default: GENERATION_BACKEND, or openai)")
+    args = parser.parse_args(argv)
+
+    if args.max_batch < 1 or args.queue_size < 1 or args.concurrency < 1:
+        parser.error("--max-batch, --queue-size and --concurrency must be at least 1")
+    if args.backend:
+        config.use_generation_backend(args.backend)
+
+    import asyncio
+
+    from backends import get_backend
+
+    try:
+        backend = get_backend()
+    except (ValueError, RuntimeError) as e:
+        print(f"Error: {e}")
+        return 1
+
+    with profile_run("tagline_service", args.profile):
+        try:
+            asyncio.run(serve(args.host, args.port, args.window, args.max_batch, args.queue_size,
+                              args.concurrency, args.model, backend))
+        except KeyboardInterrupt:
+            print("Stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
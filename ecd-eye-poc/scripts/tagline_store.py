@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Long-format columnar store for taglines and rankings.
+
+Generations and rankings live in the pipeline database (see db.py); the
+legacy ``baseline.csv`` and ``rankings.csv`` are wide (``tagline_1..5``,
+``rank_1..5``) and repeat the brief text on every row. This module turns
+either into one Arrow table with a row per tagline::
+
+    brief_id  int64
+    slot      int8     1-5, the tagline column it came from
+    tagline   string
+    rank      int8     ECD rank (1 = best), null until ranked
+    brief     dictionary<int32, string>   each brief text stored once
+
+The table is cached as an Arrow IPC file (``data/taglines.arrow``) that is
+memory-mapped on read. When the database's generations or rankings have
+changed since it was written, only the changed briefs are re-read and patched
+in; new briefs above the cached ones are simply appended.
+Parquet is available for compact archives, and CSV export stays available for
+humans.
+"""
+
+import argparse
+import csv
+import sys
+from pathlib import Path
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+DEFAULT_STORE_FILE = DATA_DIR / "taglines.arrow"
+
+# Schema metadata key recording the database version a cached table was built from;
+# caches written before the database logged changed briefs lack it and are rebuilt
+VERSION_KEY = b"ecd_eye_taglines_changes_version"
+
+N_SLOTS = 5
+TAGLINE_COLUMNS = [f"tagline_{slot}" for slot in range(1, N_SLOTS + 1)]
+RANK_COLUMNS = [f"rank_{slot}" for slot in range(1, N_SLOTS + 1)]
+
+
+def _read_wide_csv(path, value_columns, value_type):
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+
+    column_types = {"brief_id": pa.int64(), "brief": pa.string()}
+    column_types.update({column: value_type for column in value_columns})
+    return pa_csv.read_csv(
+        path,
+        convert_options=pa_csv.ConvertOptions(
+            column_types=column_types,
+            strings_can_be_null=False,
+        ),
+    )
+
+
+def _interleave(columns, n_rows):
+    """Turn K columns of n rows into one array ordered row-major (row, column)."""
+    import numpy as np
+    import pyarrow as pa
+
+    combined = pa.concat_arrays([column.combine_chunks() for column in columns])
+    order = (np.arange(len(columns)) * n_rows)[None, :] + np.arange(n_rows)[:, None]
+    return combined.take(pa.array(order.ravel()))
+
+
+def from_wide(baseline_file, rankings_file=None):
+    """Build the long table from baseline.csv and (optionally) rankings.csv."""
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    baseline = _read_wide_csv(baseline_file, TAGLINE_COLUMNS, pa.string())
+    n_briefs = baseline.num_rows
+
+    taglines = _interleave([baseline[column] for column in TAGLINE_COLUMNS], n_briefs)
+
+    if rankings_file is not None and Path(rankings_file).exists():
+        rankings = _read_wide_csv(rankings_file, RANK_COLUMNS, pa.int8())
+        # Row of each brief in rankings.csv, or null if it hasn't been ranked
+        positions = pc.index_in(baseline["brief_id"], value_set=rankings["brief_id"])
+        ranks = _interleave(
+            [pc.take(rankings[column], positions) for column in RANK_COLUMNS], n_briefs
+        )
+    else:
+        ranks = pa.nulls(n_briefs * N_SLOTS, pa.int8())
+
+    brief_index = np.repeat(np.arange(n_briefs, dtype=np.int32), N_SLOTS)
+    # Distinct briefs can share a text; the dictionary must hold each text once
+    encoded = baseline["brief"].combine_chunks().dictionary_encode()
+    briefs = pa.DictionaryArray.from_arrays(
+        pc.take(encoded.indices, pa.array(brief_index)), encoded.dictionary
+    )
+
+    return pa.table({
+        "brief_id": pc.take(baseline["brief_id"], pa.array(brief_index)),
+        "slot": pa.array(np.tile(np.arange(1, N_SLOTS + 1, dtype=np.int8), n_briefs)),
+        "tagline": taglines,
+        "rank": ranks,
+        "brief": briefs,
+    })
+
+
+def from_db(database, rater="ecd", since=None):
+    """Build the long table from the database's generations and rankings.
+
+    With ``since``, only the briefs changed after that taglines_version counter.
+    """
+    import pyarrow as pa
+
+    rows = database.tagline_rows(rater, since).fetchall()
+    brief_ids, slots, taglines, ranks, briefs = zip(*rows) if rows else ((),) * 5
+
+    return pa.table({
+        "brief_id": pa.array(brief_ids, pa.int64()),
+        "slot": pa.array(slots, pa.int8()),
+        "tagline": pa.array(taglines, pa.string()),
+        "rank": pa.array(ranks, pa.int8()),
+        # Distinct briefs can share a text; the dictionary holds each text once
+        "brief": pa.array(briefs, pa.string()).dictionary_encode(),
+    })
+
+
+def _apply_changes(table, database, since, rater="ecd"):
+    """Replace the briefs changed after ``since`` in a cached table with their current rows."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    changed = database.changed_briefs(since)
+    if not changed:
+        return table
+    fresh = from_db(database, rater, since)
+    if table.num_rows and changed[0] > pc.max(table["brief_id"]).as_py():
+        # Only new briefs: append them after the cached ones
+        combined = pa.concat_tables([table, fresh])
+    else:
+        kept = table.filter(pc.invert(pc.is_in(table["brief_id"], value_set=pa.array(changed, pa.int64()))))
+        combined = pa.concat_tables([kept, fresh]).sort_by([("brief_id", "ascending"), ("slot", "ascending")])
+    return combined.unify_dictionaries().combine_chunks()
+
+
+def write(table, path=DEFAULT_STORE_FILE):
+    """Write the table as Arrow IPC (``.arrow``) or Parquet (``.parquet``)."""
+    import pyarrow as pa
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+        pq.write_table(table, tmp_path, compression="zstd")
+    else:
+        with pa.OSFile(str(tmp_path), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    tmp_path.replace(path)
+    return path
+
+
+def read(path=DEFAULT_STORE_FILE, memory_map=True):
+    """Read a stored table; Arrow IPC files are memory-mapped (zero-copy)."""
+    import pyarrow as pa
+
+    path = Path(path)
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+        return pq.read_table(path, memory_map=memory_map)
+    source = pa.memory_map(str(path), "r") if memory_map else pa.OSFile(str(path), "rb")
+    return pa.ipc.open_file(source).read_all()
+
+
+def load_taglines(data_dir=DATA_DIR, store_file=None):
+    """Return the long table, rebuilding the cached store if the database changed."""
+    from db import open_db
+
+    data_dir = Path(data_dir)
+    store_file = Path(store_file) if store_file else data_dir / DEFAULT_STORE_FILE.name
+
+    with open_db(data_dir=data_dir) as database:
+        version = database.taglines_version().encode()
+        table = None
+        if store_file.exists():
+            cached = read(store_file)
+            cached_version = (cached.schema.metadata or {}).get(VERSION_KEY)
+            if cached_version == version:
+                return cached
+            db_id, _, counter = version.partition(b":")
+            cached_db_id, _, cached_counter = (cached_version or b"").partition(b":")
+            if cached_db_id == db_id and cached_counter.isdigit() and int(cached_counter) <= int(counter):
+                table = _apply_changes(cached, database, int(cached_counter))
+
+        if table is None:
+            table = from_db(database)
+        if table.num_rows == 0:
+            raise FileNotFoundError(f"No generated taglines in {database.path}; run generate_baseline.py first")
+
+    table = table.replace_schema_metadata({VERSION_KEY: version})
+    write(table, store_file)
+    return table
+
+
+def taglines_by_brief(table):
+    """Return ``{brief_id: [tagline_1, ..., tagline_5]}`` in slot order."""
+    brief_ids = table["brief_id"].to_pylist()
+    taglines = table["tagline"].to_pylist()
+    slots = table["slot"].to_pylist()
+    grouped = {}
+    for brief_id, slot, tagline in zip(brief_ids, slots, taglines):
+        grouped.setdefault(brief_id, [""] * N_SLOTS)[slot - 1] = tagline
+    return grouped
+
+
+def to_wide_rows(table, value_column):
+    """Yield wide CSV rows (brief_id, brief, values for slots 1-5)."""
+    values = {}
+    briefs = {}
+    for brief_id, brief, slot, value in zip(
+        table["brief_id"].to_pylist(),
+        table["brief"].to_pylist(),
+        table["slot"].to_pylist(),
+        table[value_column].to_pylist(),
+    ):
+        briefs[brief_id] = brief
+        values.setdefault(brief_id, [None] * N_SLOTS)[slot - 1] = value
+    for brief_id, row in values.items():
+        if value_column == "rank" and None in row:
+            continue  # Not ranked yet
+        yield [brief_id, briefs[brief_id]] + row
+
+
+def export_csv(table, baseline_out=None, rankings_out=None):
+    """Write the wide baseline / rankings CSV layout for humans."""
+    for out, column, header in (
+        (baseline_out, "tagline", TAGLINE_COLUMNS),
+        (rankings_out, "rank", RANK_COLUMNS),
+    ):
+        if out:
+            with open(out, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["brief_id", "brief"] + header)
+                writer.writerows(to_wide_rows(table, column))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and export the long-format tagline store.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="build the store from the database")
+    build_parser.add_argument("--output", default=str(DEFAULT_STORE_FILE),
+                              help="output file; use a .parquet suffix for Parquet")
+    build_parser.add_argument("--from-csv", action="store_true",
+                              help="build from baseline.csv / rankings.csv instead of the database")
+
+    export_parser = subparsers.add_parser("export", help="export the store as wide CSV")
+    export_parser.add_argument("--input", default=str(DEFAULT_STORE_FILE))
+    export_parser.add_argument("--baseline", help="baseline CSV to write")
+    export_parser.add_argument("--rankings", help="rankings CSV to write")
+
+    info_parser = subparsers.add_parser("info", help="print the store schema and size")
+    info_parser.add_argument("--input", default=str(DEFAULT_STORE_FILE))
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        if args.from_csv:
+            table = from_wide(DATA_DIR / "baseline.csv", DATA_DIR / "rankings.csv")
+        else:
+            from db import open_db
+            with open_db() as database:
+                table = from_db(database)
+        path = write(table, args.output)
+        print(f"Wrote {table.num_rows} taglines to {path}")
+    elif args.command == "export":
+        if not (args.baseline or args.rankings):
+            parser.error("export needs --baseline and/or --rankings")
+        export_csv(read(args.input), args.baseline, args.rankings)
+        print("Exported " + ", ".join(path for path in (args.baseline, args.rankings) if path))
+    elif args.command == "info":
+        table = read(args.input)
+        print(table.schema)
+        print(f"{table.num_rows} taglines, {table.nbytes / 1e6:.2f} MB in memory")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,10 +4,15 @@ Set up the ECD-Eye POC project in a production-ready state.
 """
 
 import os
+import sys
 import json
 import csv
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).parent / "ecd-eye-poc" / "scripts"))
+from blind_page import load_pairs, write_page
+from prompts import messages
+
 def main():
     # Create directory structure
     print("Creating directory structure...")
@@ -112,15 +117,7 @@ DEBUG=false
     finetune_data = []
     for i in range(1, 13):
         finetune_example = {
-            "messages": [
-                {
-                    "role": "system",
-                    "content": "You are a punchy award-winning copywriter."
-                },
-                {
-                    "role": "user",
-                    "content": f"Write a punchy tagline (≤7 words) for: {briefs_data['training_briefs'][i-1]['brief']}"
-                },
+            "messages": messages("tagline", briefs_data['training_briefs'][i-1]['brief'], version="v1") + [
                 {
                     "role": "assistant",
                     "content": baseline_data[i][2]  # Use the first tagline as the best one
@@ -170,240 +167,13 @@ DEBUG=false
     
     # Create HTML version of blind evaluation form
     print("Creating blind_evaluation.html...")
-    with open("data/blind_evaluation.html", "w") as f:
-        f.write("""<!DOCTYPE html>
-<html>
-<head>
-    <title>ECD-Eye Blind Evaluation</title>
-    <style>
-        body {
-            font-family: Arial, sans-serif;
-            max-width: 800px;
-            margin: 0 auto;
-            padding: 20px;
-        }
-        h1 {
-            color: #2c3e50;
-            text-align: center;
-        }
-        .brief {
-            background-color: #f8f9fa;
-            padding: 15px;
-            margin-bottom: 20px;
-            border-radius: 5px;
-            border-left: 5px solid #3498db;
-        }
-        .taglines {
-            display: flex;
-            gap: 20px;
-            margin-bottom: 20px;
-        }
-        .tagline {
-            flex: 1;
-            padding: 15px;
-            background-color: #fff;
-            border: 1px solid #ddd;
-            border-radius: 5px;
-        }
-        .preference {
-            margin-bottom: 30px;
-        }
-        button {
-            background-color: #3498db;
-            color: white;
-            border: none;
-            padding: 10px 15px;
-            border-radius: 5px;
-            cursor: pointer;
-            margin-right: 10px;
-        }
-        button:hover {
-            background-color: #2980b9;
-        }
-        .results {
-            margin-top: 30px;
-            padding: 20px;
-            background-color: #e8f4f8;
-            border-radius: 5px;
-            display: none;
-        }
-        table {
-            width: 100%;
-            border-collapse: collapse;
-            margin-top: 20px;
-        }
-        th, td {
-            padding: 10px;
-            border: 1px solid #ddd;
-            text-align: left;
-        }
-        th {
-            background-color: #f2f2f2;
-        }
-    </style>
-</head>
-<body>
-    <h1>🔍 ECD-Eye Blind Evaluation</h1>
-    
-    <p>For each brief, select which tagline you prefer (A or B).</p>
-    
-    <div id="briefs-container">
-        <!-- Briefs will be loaded here -->
-    </div>
-    
-    <button id="submit-btn">Submit Evaluation</button>
-    
-    <div id="results" class="results">
-        <h2>Results</h2>
-        <div id="results-content"></div>
-    </div>
-    
-    <script>
-        // Load evaluation data
-        const evaluationData = [
-            {
-                "brief_id": 13,
-                "brief": "Write a tagline for a sustainable fashion brand that uses recycled materials.",
-                "tagline_a": "Wear the change you wish to see.",
-                "tagline_b": "Fashion forward, planet first."
-            },
-            {
-                "brief_id": 14,
-                "brief": "Create a tagline for a premium headphone brand focusing on immersive sound quality.",
-                "tagline_a": "Sound that transports you elsewhere.",
-                "tagline_b": "Hear every note, feel every beat."
-            },
-            {
-                "brief_id": 15,
-                "brief": "Develop a tagline for a meal kit delivery service emphasizing fresh, local ingredients.",
-                "tagline_a": "From local farms to your table.",
-                "tagline_b": "Fresh ingredients, unforgettable meals, zero waste."
-            },
-            {
-                "brief_id": 16,
-                "brief": "Write a tagline for a virtual reality gaming platform that promises new worlds to explore.",
-                "tagline_a": "Worlds beyond imagination await you.",
-                "tagline_b": "Reality is just the beginning."
-            },
-            {
-                "brief_id": 17,
-                "brief": "Create a tagline for a productivity app that helps users manage their time better.",
-                "tagline_a": "Master your minutes, own your day.",
-                "tagline_b": "Time management made effortless."
-            }
-        ];
-        
-        // Create HTML for each brief
-        const briefsContainer = document.getElementById('briefs-container');
-        evaluationData.forEach((item, index) => {
-            const briefDiv = document.createElement('div');
-            briefDiv.className = 'brief';
-            briefDiv.innerHTML = `
-                <h3>Brief ${item.brief_id}</h3>
-                <p><strong>${item.brief}</strong></p>
-                
-                <div class="taglines">
-                    <div class="tagline">
-                        <h4>Option A</h4>
-                        <p><em>${item.tagline_a}</em></p>
-                    </div>
-                    
-                    <div class="tagline">
-                        <h4>Option B</h4>
-                        <p><em>${item.tagline_b}</em></p>
-                    </div>
-                </div>
-                
-                <div class="preference">
-                    <p>Which tagline do you prefer?</p>
-                    <button onclick="selectPreference(${index}, 'A')">Option A</button>
-                    <button onclick="selectPreference(${index}, 'B')">Option B</button>
-                </div>
-                
-                <div id="preference-${index}" style="display: none;"></div>
-            `;
-            briefsContainer.appendChild(briefDiv);
-        });
-        
-        // Handle preference selection
-        function selectPreference(index, option) {
-            const preferenceDiv = document.getElementById(`preference-${index}`);
-            preferenceDiv.textContent = option;
-            preferenceDiv.style.display = 'block';
-            
-            // Update UI to show selection
-            const briefDiv = preferenceDiv.parentElement;
-            const buttons = briefDiv.querySelectorAll('.preference button');
-            buttons.forEach(button => {
-                if (button.textContent === `Option ${option}`) {
-                    button.style.backgroundColor = '#27ae60';
-                } else {
-                    button.style.backgroundColor = '#3498db';
-                }
-            });
-        }
-        
-        // Handle submission
-        document.getElementById('submit-btn').addEventListener('click', () => {
-            // Collect preferences
-            const preferences = [];
-            for (let i = 0; i < evaluationData.length; i++) {
-                const preferenceDiv = document.getElementById(`preference-${i}`);
-                if (preferenceDiv.textContent) {
-                    preferences.push({
-                        brief_id: evaluationData[i].brief_id,
-                        preference: preferenceDiv.textContent
-                    });
-                }
-            }
-            
-            // Check if all briefs have been evaluated
-            if (preferences.length < evaluationData.length) {
-                alert('Please select a preference for all briefs before submitting.');
-                return;
-            }
-            
-            // Calculate results
-            const baselineCount = preferences.filter(p => p.preference === 'A').length;
-            const finetunedCount = preferences.filter(p => p.preference === 'B').length;
-            
-            // Display results
-            const resultsDiv = document.getElementById('results');
-            const resultsContent = document.getElementById('results-content');
-            
-            resultsContent.innerHTML = `
-                <p><strong>Baseline Preferred:</strong> ${baselineCount}/${preferences.length} (${(baselineCount/preferences.length*100).toFixed(1)}%)</p>
-                <p><strong>Fine-tuned Preferred:</strong> ${finetunedCount}/${preferences.length} (${(finetunedCount/preferences.length*100).toFixed(1)}%)</p>
-                
-                <h3>Your Selections</h3>
-                <table>
-                    <tr>
-                        <th>Brief</th>
-                        <th>Your Preference</th>
-                    </tr>
-                    ${preferences.map(p => {
-                        const brief = evaluationData.find(item => item.brief_id === p.brief_id);
-                        return `
-                            <tr>
-                                <td>${brief.brief}</td>
-                                <td>Option ${p.preference}</td>
-                            </tr>
-                        `;
-                    }).join('')}
-                </table>
-            `;
-            
-            resultsDiv.style.display = 'block';
-        });
-    </script>
-</body>
-</html>""")
+    write_page(load_pairs("data/evaluation.csv"), "data/blind_evaluation.html")
     
     print("Setup complete! The project is now in a production-ready state.")
     print("\nTo use the application:")
     print("1. Open data/blind_evaluation.html in your browser")
-    print("2. For each brief, select which tagline you prefer (A or B)")
-    print("3. Click the 'Submit Evaluation' button to see the results")
+    print("2. For each brief, click the tagline you prefer (A or B); choices are saved as you go")
+    print("3. Click 'Export results CSV' to download evaluation_results.csv and see the results")
 
 if __name__ == "__main__":
     main()